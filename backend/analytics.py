@@ -0,0 +1,162 @@
+"""
+Incremental daily analytics rollup.
+
+Orders are folded into per-wholesaler daily rows of the analytics table.
+rollup_state remembers the highest order id already counted, so each run
+only reads orders placed since the previous one and the dashboard endpoint
+reads nothing but the rollup table. Distinct customers cannot be summed
+across runs, so the (wholesaler, day, vendor) triples are kept in
+analytics_customers and active_customers is recounted from there for the
+days a run touches.
+
+Orders are counted once, when they are first seen; later status changes do
+not alter the rollup. Rebuild from scratch with:
+
+    python analytics.py backfill
+"""
+
+import sys
+from datetime import date, timedelta
+
+import jobs
+
+ROLLUP_NAME = 'analytics'
+# Orders folded per transaction, so a long backfill never holds the write
+# lock for more than a moment at a time
+BATCH_SIZE = 50000
+ROLLUP_INTERVAL = 60
+DEFAULT_RANGE_DAYS = 30
+
+
+def rollup_statements():
+    """Migration steps for the rollup bookkeeping tables."""
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            last_order_id INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        f"INSERT OR IGNORE INTO rollup_state (name, last_order_id) VALUES ('{ROLLUP_NAME}', 0)",
+        '''
+        CREATE TABLE IF NOT EXISTS analytics_customers (
+            wholesaler_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            vendor_id INTEGER NOT NULL,
+            PRIMARY KEY (wholesaler_id, date, vendor_id)
+        ) WITHOUT ROWID
+        ''',
+        # Nothing wrote to analytics before the rollup existed. Clearing it lets
+        # the unique index build, and the first run starts from order 0 anyway
+        'DELETE FROM analytics',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_analytics_wholesaler_date ON analytics (wholesaler_id, date)',
+    ]
+
+
+def rollup(conn, batch_size=BATCH_SIZE):
+    """Fold orders newer than the high-water mark; returns orders processed."""
+    processed = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            low = conn.execute('SELECT last_order_id FROM rollup_state WHERE name = ?',
+                               (ROLLUP_NAME,)).fetchone()[0]
+            high, count = conn.execute('''
+                SELECT MAX(id), COUNT(*)
+                FROM (SELECT id FROM orders WHERE id > ? ORDER BY id LIMIT ?)
+            ''', (low, batch_size)).fetchone()
+            if high is None:
+                conn.rollback()
+                return processed
+            window = (low, high)
+
+            conn.execute('''
+                INSERT OR IGNORE INTO analytics_customers (wholesaler_id, date, vendor_id)
+                SELECT DISTINCT wholesaler_id, date(created_at), vendor_id
+                FROM orders WHERE id > ? AND id <= ? AND vendor_id IS NOT NULL
+            ''', window)
+            conn.execute('''
+                INSERT INTO analytics (wholesaler_id, date, total_orders, total_revenue, active_customers)
+                SELECT wholesaler_id, date(created_at), COUNT(*), COALESCE(SUM(total_amount), 0), 0
+                FROM orders WHERE id > ? AND id <= ?
+                GROUP BY wholesaler_id, date(created_at)
+                ON CONFLICT (wholesaler_id, date) DO UPDATE SET
+                    total_orders = total_orders + excluded.total_orders,
+                    total_revenue = total_revenue + excluded.total_revenue
+            ''', window)
+            conn.execute('''
+                UPDATE analytics SET active_customers = (
+                    SELECT COUNT(*) FROM analytics_customers c
+                    WHERE c.wholesaler_id = analytics.wholesaler_id AND c.date = analytics.date
+                )
+                WHERE (wholesaler_id, date) IN (
+                    SELECT DISTINCT wholesaler_id, date(created_at)
+                    FROM orders WHERE id > ? AND id <= ?
+                )
+            ''', window)
+            conn.execute('''
+                UPDATE rollup_state SET last_order_id = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE name = ?
+            ''', (high, ROLLUP_NAME))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        processed += count
+
+
+def backfill(conn, batch_size=BATCH_SIZE):
+    """Discard the rollup and rebuild it from the full order history."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM analytics')
+        conn.execute('DELETE FROM analytics_customers')
+        conn.execute('UPDATE rollup_state SET last_order_id = 0 WHERE name = ?', (ROLLUP_NAME,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return rollup(conn, batch_size)
+
+
+@jobs.every(ROLLUP_INTERVAL, name='analytics-rollup')
+def scheduled_rollup(conn):
+    rollup(conn)
+
+
+def parse_range(args, today=None):
+    """Validate ?from=&to= (YYYY-MM-DD), defaulting to the last 30 days."""
+    today = today or date.today()
+    try:
+        end = date.fromisoformat(args['to']) if args.get('to') else today
+        start = (date.fromisoformat(args['from']) if args.get('from')
+                 else end - timedelta(days=DEFAULT_RANGE_DAYS - 1))
+    except ValueError:
+        raise ValueError('from and to must be dates in YYYY-MM-DD format')
+    if start > end:
+        raise ValueError('from must not be after to')
+    return start, end
+
+
+def daily_analytics(conn, wholesaler_id, start, end):
+    return conn.execute('''
+        SELECT date, total_orders, total_revenue, active_customers
+        FROM analytics
+        WHERE wholesaler_id = ? AND date BETWEEN ? AND ?
+        ORDER BY date
+    ''', (wholesaler_id, start.isoformat(), end.isoformat())).fetchall()
+
+
+if __name__ == '__main__':
+    import db
+    from app import init_db
+
+    init_db()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'rollup'
+    if command not in ('rollup', 'backfill'):
+        print('Usage: python analytics.py [rollup|backfill]')
+        sys.exit(2)
+    with db.pool.connection() as conn:
+        count = backfill(conn) if command == 'backfill' else rollup(conn)
+    print(f'✅ Folded {count} orders into analytics')
@@ -1,4 +1,4 @@
-from flask import Flask, render_template, redirect, url_for, request, flash, session, send_file, jsonify, send_from_directory
+from flask import Flask, render_template, redirect, url_for, request, flash, session, send_file, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 import sqlite3
 import os
@@ -6,17 +6,57 @@ from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
 import uuid
 import json
+import csv
+
+import db
+from db import get_db
+from config import get_config
+from migrations import apply_migrations
+from catalog import MAX_PAGE_SIZE, MAX_STREAM_PAGE_SIZE, PRODUCT_COLUMNS, parse_product_filters, product_page
+from streaming import async_aware, iter_batches, iter_cursor, response_format, stream_list
+from columnar import Column, columnar_list
+from cache import cached, response_cache
+import search
+import analytics
+import jobs
+import catalog_io
+import group_buy
+from counters import product_counters
+import static_assets
+import uploads
+import metrics
+import geo
+import credit
+import reviews
+import events
+import checkout
+import batch
+import reorder
+import budget
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # Change this in production
+# SECRET_KEY, DEBUG and server/pool sizing come from config.py (FLASK_ENV)
+app.config.from_object(get_config())
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
+# Identity and licence documents; never served over HTTP
+app.config['PRIVATE_UPLOAD_FOLDER'] = 'private_uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['DATABASE'] = db.DATABASE
+
+# Every route borrows its connection from the shared pool
+db.init_app(app)
+# Request timings and per-statement query stats for /api/metrics
+metrics.init_app(app)
 
 # Enable CORS for React frontend and local development
 CORS(app, origins=["http://localhost:8080", "http://localhost:5000", "http://127.0.0.1:5000"])
 
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Wake the SSE broadcaster as soon as a write request finishes
+events.init_app(app)
+
+# Ensure upload directories exist
+uploads.init_app(app)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx'}
 
@@ -25,7 +65,12 @@ def allowed_file(filename):
 
 # Database setup
 def init_db():
-    conn = sqlite3.connect('vendor_clubs.db')
+    with db.pool.connection() as conn:
+        _create_schema(conn)
+        # Indexes and later schema changes are versioned in migrations.py
+        apply_migrations(conn)
+
+def _create_schema(conn):
     cursor = conn.cursor()
     
     # Vendors table
@@ -157,57 +202,137 @@ def init_db():
         cursor.executemany('INSERT INTO products (wholesaler_id, name, category, price, stock, group_buy_eligible, image_path, views, likes, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', products_data)
     
     conn.commit()
-    conn.close()
 
 # API Routes for React frontend
+VENDOR_LIST_COLUMNS = (
+    Column('id', 'id'),
+    Column('name', 'name'),
+    Column('email', 'email'),
+    Column('phone', 'phone'),
+    Column('location', 'location', dictionary=True),
+)
+
 @app.route('/api/vendors')
+@cached('vendors')
 def get_vendors():
-    conn = sqlite3.connect('vendor_clubs.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM vendors WHERE is_approved = 1')
-    vendors = cursor.fetchall()
-    conn.close()
+    cursor = get_db().execute('SELECT * FROM vendors WHERE is_approved = 1')
+    if response_format() == 'columnar':
+        names = [column[0] for column in cursor.description]
+        return columnar_list('vendors', names, iter_batches(cursor), VENDOR_LIST_COLUMNS)
     
-    vendor_list = []
-    for vendor in vendors:
-        vendor_list.append({
-            'id': vendor[0],
-            'name': vendor[1],
-            'email': vendor[2],
-            'phone': vendor[3],
-            'location': vendor[5]
-        })
+    vendor_list = ({
+        'id': vendor[0],
+        'name': vendor[1],
+        'email': vendor[2],
+        'phone': vendor[3],
+        'location': vendor[5]
+    } for vendor in iter_cursor(cursor))
     
-    return jsonify({'vendors': vendor_list})
+    return stream_list('vendors', vendor_list)
+
+def estimated_savings(price):
+    return int(price * 0.1)  # 10% savings estimate
+
+def serialize_product(product):
+    return {
+        'id': product['id'],
+        'name': product['name'],
+        'category': product['category'],
+        'price': product['price'],
+        'stock': product['stock'],
+        'wholesaler': product['wholesaler_name'],
+        'imageUrl': uploads.url_for_key(product['image_path']),
+        'thumbnailUrl': uploads.url_for_key(product['image_path'], 'thumb'),
+        'rating': reviews.listing_rating(product['review_count'], product['rating_sum']),
+        'reviewCount': product['review_count'] or 0,
+        'inStock': product['stock'] > 0,
+        'estimatedSavings': estimated_savings(product['price'])
+    }
+
+# serialize_product's fields, computed a column at a time
+PRODUCT_LIST_COLUMNS = (
+    Column('id', 'id'),
+    Column('name', 'name'),
+    Column('category', 'category', dictionary=True),
+    Column('price', 'price'),
+    Column('stock', 'stock'),
+    Column('wholesaler', 'wholesaler_name', dictionary=True),
+    Column('imageUrl', 'image_path', lambda keys: [uploads.url_for_key(key) for key in keys]),
+    Column('thumbnailUrl', 'image_path',
+           lambda keys: [uploads.url_for_key(key, 'thumb') for key in keys]),
+    Column('rating', ('review_count', 'rating_sum'),
+           lambda counts, sums: list(map(reviews.listing_rating, counts, sums))),
+    Column('reviewCount', 'review_count', lambda counts: [count or 0 for count in counts]),
+    Column('inStock', 'stock', lambda stock: [units > 0 for units in stock]),
+    Column('estimatedSavings', 'price', lambda prices: list(map(estimated_savings, prices))),
+)
 
 @app.route('/api/products')
+@cached('products', 'wholesalers', 'reviews')
 def get_products():
-    conn = sqlite3.connect('vendor_clubs.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT p.*, w.name as wholesaler_name 
-        FROM products p 
-        JOIN wholesalers w ON p.wholesaler_id = w.id 
-        WHERE w.is_approved = 1
-    ''')
-    products = cursor.fetchall()
-    conn.close()
-    
-    product_list = []
-    for product in products:
-        product_list.append({
-            'id': product[0],
-            'name': product[2],
-            'category': product[3],
-            'price': product[4],
-            'stock': product[5],
-            'wholesaler': product[13],
-            'rating': 4.5,  # Default rating
-            'inStock': product[5] > 0,
-            'estimatedSavings': int(product[4] * 0.1)  # 10% savings estimate
-        })
+    """Approved products, filtered and sorted in SQL and paged by cursor"""
+    body_format = response_format()
+    # NDJSON and columnar pages may be much larger
+    max_limit = MAX_PAGE_SIZE if body_format == 'json' else MAX_STREAM_PAGE_SIZE
+    try:
+        filters = parse_product_filters(request.args, max_limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    page = product_page(get_db(), **filters)
+    if body_format == 'columnar':
+        return columnar_list('items', page.column_names, page.batches(), PRODUCT_LIST_COLUMNS,
+                             lambda: {'nextCursor': page.next_cursor})
+    product_list = (serialize_product(product) for product in page)
     
-    return jsonify({'items': product_list})
+    return stream_list('items', product_list, lambda: {'nextCursor': page.next_cursor})
+
+@app.route('/api/products/<int:product_id>')
+def get_product(product_id):
+    """One approved product with live view/like counts; records a view"""
+    product = get_db().execute(f'''
+        SELECT {PRODUCT_COLUMNS}
+        FROM products p
+        JOIN wholesalers w ON p.wholesaler_id = w.id
+        LEFT JOIN wholesaler_ratings r ON r.wholesaler_id = p.wholesaler_id
+        WHERE p.id = ? AND w.is_approved = 1
+    ''', (product_id,)).fetchone()
+    if product is None:
+        return jsonify({"error": "Not found"}), 404
+
+    product_counters.incr(product_id, 'views')
+    pending_views, pending_likes = product_counters.pending(product_id)
+    item = serialize_product(product)
+    item['views'] = product['views'] + pending_views
+    item['likes'] = product['likes'] + pending_likes
+    return jsonify(item)
+
+@app.route('/api/products/<int:product_id>/like', methods=['POST'])
+def like_product(product_id):
+    # Unknown ids would sit in the counter shards until the next flush
+    exists = get_db().execute('''
+        SELECT 1 FROM products p JOIN wholesalers w ON p.wholesaler_id = w.id
+        WHERE p.id = ? AND w.is_approved = 1
+    ''', (product_id,)).fetchone()
+    if exists is None:
+        return jsonify({"error": "Not found"}), 404
+    # Counted in memory and written to SQLite by the counter flush job
+    product_counters.incr(product_id, 'likes')
+    return jsonify({'success': True})
+
+@app.route('/api/search')
+@cached('products', 'wholesalers', 'reviews')
+def search_catalog():
+    """Ranked product search for the voice search bar"""
+    query = request.args.get('q', '').strip()
+    try:
+        limit = int(request.args.get('limit', search.DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    limit = max(1, min(limit, search.MAX_LIMIT))
+
+    products = search.search_products(get_db(), query, limit)
+    return jsonify({'query': query, 'items': [serialize_product(p) for p in products]})
 
 # Authentication routes
 @app.route('/api/login', methods=['POST'])
@@ -217,8 +342,8 @@ def login():
     password = data.get('password')
     user_type = data.get('user_type')  # 'vendor' or 'wholesaler'
     
-    conn = sqlite3.connect('vendor_clubs.db')
-    cursor = conn.cursor()
+    # Released by the pool's teardown hook on every return path
+    cursor = get_db().cursor()
     
     if user_type == 'vendor':
         cursor.execute('SELECT id, name, is_approved FROM vendors WHERE phone = ? AND password = ?', (phone, password))
@@ -238,7 +363,6 @@ def login():
             session['user_type'] = 'wholesaler'
             return jsonify({'success': True, 'user_type': 'wholesaler', 'user': {'id': user[0], 'name': user[1]}})
     
-    conn.close()
     return jsonify({'success': False, 'message': 'Invalid credentials or account not approved'})
 
 @app.route('/api/logout', methods=['POST'])
@@ -259,13 +383,207 @@ def get_user():
         })
     return jsonify({'success': False})
 
+def current_user_id(user_type):
+    """Id of the logged-in user if they are a `user_type`, else None"""
+    if session.get('user_type') == user_type:
+        return session.get('user_id')
+    return None
+
+# Wholesaler catalog import/export
+@app.route('/api/wholesaler/products/import', methods=['POST'])
+def import_wholesaler_products():
+    """Bulk-load products from a streamed CSV or NDJSON request body"""
+    wholesaler_id = current_user_id('wholesaler')
+    if wholesaler_id is None:
+        return jsonify({'success': False, 'message': 'Wholesaler login required'}), 401
+    if request.mimetype not in (catalog_io.CSV_MIMETYPE, catalog_io.NDJSON_MIMETYPE):
+        return jsonify({'success': False, 'message': 'Send text/csv or application/x-ndjson'}), 415
+
+    # request.stream is capped at MAX_CONTENT_LENGTH and read incrementally
+    rows = catalog_io.iter_upload(request.stream, request.mimetype)
+    try:
+        summary = catalog_io.import_products(get_db(), wholesaler_id, rows)
+    except UnicodeDecodeError:
+        return jsonify({'success': False, 'message': 'Upload must be UTF-8 encoded'}), 400
+    except csv.Error as e:
+        return jsonify({'success': False, 'message': f'Malformed CSV: {e}'}), 400
+    return jsonify({'success': True, **summary})
+
+@app.route('/api/wholesaler/products/export')
+def export_wholesaler_products():
+    """Stream the logged-in wholesaler's products as CSV, JSON or NDJSON"""
+    wholesaler_id = current_user_id('wholesaler')
+    if wholesaler_id is None:
+        return jsonify({'success': False, 'message': 'Wholesaler login required'}), 401
+
+    rows = catalog_io.export_rows(get_db(), wholesaler_id)
+    if request.args.get('format', 'csv') == 'csv':
+        response = Response(stream_with_context(catalog_io.csv_chunks(rows)), mimetype='text/csv')
+        response.headers['Content-Disposition'] = 'attachment; filename=products.csv'
+        return response
+    return stream_list('products', (dict(row) for row in rows))
+
+# Wholesaler uploads
+@app.route('/api/wholesaler/uploads/<kind>', methods=['POST'])
+def upload_wholesaler_file(kind):
+    """Store a product image, profile photo or verification document"""
+    wholesaler_id = current_user_id('wholesaler')
+    if wholesaler_id is None:
+        return jsonify({'success': False, 'message': 'Wholesaler login required'}), 401
+    if kind not in uploads.TARGETS:
+        return jsonify({'success': False, 'message': f"Unknown upload type '{kind}'"}), 404
+
+    product_id = None
+    if kind == 'product-image':
+        product_id = request.args.get('product_id', type=int)
+        if product_id is None:
+            return jsonify({'success': False, 'message': 'product_id is required'}), 400
+
+    # Multipart forms are spooled to a temporary file by Werkzeug; raw bodies
+    # are read straight off the (MAX_CONTENT_LENGTH capped) request stream
+    if request.mimetype == 'multipart/form-data':
+        file = request.files.get('file')
+        if file is None or not file.filename:
+            return jsonify({'success': False, 'message': 'No file provided'}), 400
+        stream, ext = file.stream, uploads.extension_for(secure_filename(file.filename), file.mimetype)
+    else:
+        stream = request.stream
+        ext = uploads.extension_for(secure_filename(request.args.get('filename', '')), request.mimetype)
+
+    try:
+        key, deduplicated = uploads.store(get_db(), kind, wholesaler_id, stream, ext, product_id)
+    except uploads.UploadError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    private = uploads.TARGETS[kind][2]
+    return jsonify({
+        'success': True,
+        'key': key,
+        'deduplicated': deduplicated,
+        'url': None if private else uploads.url_for_key(key),
+        'thumbnailUrl': None if private else uploads.url_for_key(key, 'thumb'),
+    })
+
+@app.route('/uploads/<key>')
+@app.route('/uploads/<variant>/<key>')
+def serve_upload(key, variant=None):
+    """Serve a stored image or one of its resized variants"""
+    response = uploads.send_upload(key, variant)
+    if response is None:
+        return jsonify({"error": "Not found"}), 404
+    return response
+
+# Group buying
+@app.route('/api/group-buy/join', methods=['POST'])
+def join_group_buy():
+    """Pledge a quantity of a product to the vendor's local group-buy pool"""
+    vendor_id = current_user_id('vendor')
+    if vendor_id is None:
+        return jsonify({'success': False, 'message': 'Vendor login required'}), 401
+    data = request.get_json(silent=True) or {}
+    try:
+        product_id = int(data.get('product_id'))
+        quantity = int(data.get('quantity'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'product_id and quantity must be integers'}), 400
+
+    conn = get_db()
+    try:
+        pool_id = group_buy.join_pool(conn, vendor_id, product_id, quantity)
+    except group_buy.GroupBuyError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    pool = conn.execute('SELECT * FROM group_pools WHERE id = ?', (pool_id,)).fetchone()
+    return jsonify({'success': True, 'pool': group_buy.serialize_pool(conn, pool)})
+
+@app.route('/api/group-buy/products/<int:product_id>/pool')
+def get_group_buy_pool(product_id):
+    """Open pool for a product in a location (defaults to the vendor's own)"""
+    conn = get_db()
+    location = request.args.get('location')
+    if not location:
+        vendor_id = current_user_id('vendor')
+        row = conn.execute('SELECT location FROM vendors WHERE id = ?', (vendor_id,)).fetchone()
+        location = row['location'] if row else None
+    if not location:
+        return jsonify({"error": "location is required"}), 400
+
+    pool = group_buy.open_pool(conn, product_id, location)
+    return jsonify({'pool': group_buy.serialize_pool(conn, pool) if pool else None})
+
+@app.route('/api/wholesalers/nearby')
+def get_nearby_wholesalers():
+    """Approved wholesalers within ?radius= km of ?lat=&lon= (or the vendor's own pin)"""
+    try:
+        lat, lon, radius, limit = geo.parse_nearby_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_db()
+    if lat is None:
+        vendor_id = current_user_id('vendor')
+        row = conn.execute('SELECT latitude, longitude FROM vendors WHERE id = ?', (vendor_id,)).fetchone()
+        if row is None or row['latitude'] is None:
+            return jsonify({"error": "lat and lon are required"}), 400
+        lat, lon = row['latitude'], row['longitude']
+
+    wholesalers = [{
+        'id': row['id'],
+        'name': row['name'],
+        'shopName': row['shop_name'],
+        'location': row['location'],
+        'latitude': row['latitude'],
+        'longitude': row['longitude'],
+        'distanceKm': round(distance, 2),
+        'trustScore': reviews.trust_score(row['review_count'], row['rating_sum'], row['trust_score']),
+        'rating': reviews.listing_rating(row['review_count'], row['rating_sum']),
+        'reviewCount': row['review_count'] or 0,
+        'responseRate': row['response_rate'],
+        'deliveryRate': row['delivery_rate']
+    } for distance, row in geo.nearby_wholesalers(conn, lat, lon, radius, limit)]
+
+    return jsonify({
+        'origin': {'latitude': lat, 'longitude': lon},
+        'radiusKm': radius,
+        'wholesalers': wholesalers
+    })
+
 # Existing API routes for compatibility
 @app.route('/api/budget-items')
 def get_budget_items():
-    return get_products()  # Reuse products endpoint
+    # maxBudget, category, sortBy, limit and cursor are applied by get_products
+    return get_products()
+
+@app.route('/api/budget/optimize', methods=['POST'])
+def optimize_budget():
+    """Cheapest basket for a shopping list ({items, budget}) across all wholesalers"""
+    if not budget.available():
+        return jsonify({"error": "Budget optimizer is unavailable: numpy is not installed"}), 503
+    try:
+        items, max_budget, supplier_cost, max_suppliers = budget.parse_request(request.get_json(silent=True))
+    except budget.BudgetError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_db()
+    # Group-buy prices use the open pools at the vendor's location
+    location = None
+    vendor_id = current_user_id('vendor')
+    if vendor_id is not None:
+        row = conn.execute('SELECT location FROM vendors WHERE id = ?', (vendor_id,)).fetchone()
+        location = row['location'] if row else None
+    return jsonify(budget.optimize(conn, items, max_budget, supplier_cost, max_suppliers, location))
 
 @app.route('/api/recent-orders')
 def get_recent_orders():
+    """A logged-in vendor's items due for reordering; sample items otherwise"""
+    vendor_id = current_user_id('vendor')
+    if vendor_id is not None:
+        return jsonify({"orders": [{
+            'id': str(item['productId']),
+            'productId': item['productId'],
+            'itemName': item['name'],
+            'orderCount': item['orderCount'],
+            'quantity': item['typicalQuantity'],
+        } for item in reorder.suggestions(get_db(), vendor_id)]})
     return jsonify({
         "orders": [
             {"id": "1", "itemName": "Organic Tomatoes (5kg)", "orderCount": 12},
@@ -275,24 +593,103 @@ def get_recent_orders():
         ]
     })
 
+@app.route('/api/vendor/<int:vendor_id>/reorder-suggestions')
+def get_reorder_suggestions(vendor_id):
+    """Items the vendor is due to reorder, from precomputed purchase statistics"""
+    current = current_user_id('vendor')
+    if current is None:
+        return jsonify({"error": "Vendor login required"}), 401
+    if current != vendor_id:
+        return jsonify({"error": "Not allowed to view another vendor's suggestions"}), 403
+    try:
+        days, limit = reorder.parse_options(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"suggestions": reorder.suggestions(get_db(), vendor_id, days, limit)})
+
+# Reviews
 @app.route('/api/reviews')
 def get_reviews():
-    return jsonify({
-        "reviews": [
-            {
-                "id": "1", "vendorName": "Rajesh Sharma", "wholesalerName": "Fresh Valley Wholesalers",
-                "rating": 5, "comment": "Excellent quality vegetables and timely delivery.", 
-                "date": "2 days ago", "orderValue": 2500
-            },
-            {
-                "id": "2", "vendorName": "Priya Patel", "wholesalerName": "Spice Garden Suppliers",
-                "rating": 4, "comment": "Good variety of spices. Overall satisfied.",
-                "date": "1 week ago", "orderValue": 1800
-            }
-        ]
-    })
+    """Reviews newest first, optionally for one wholesaler or vendor; page with ?before_id="""
+    try:
+        filters = reviews.parse_list_args(request.args)
+    except reviews.ReviewError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_db()
+    rows = reviews.list_reviews(conn, **filters)
+    body = {
+        'reviews': [reviews.serialize_review(row) for row in rows],
+        'nextBeforeId': rows[-1]['id'] if len(rows) == filters['limit'] else None
+    }
+    if filters['wholesaler_id'] is not None:
+        body['summary'] = reviews.rating_summary(conn, filters['wholesaler_id'])
+    return jsonify(body)
+
+@app.route('/api/wholesalers/<int:wholesaler_id>/rating')
+def get_wholesaler_rating(wholesaler_id):
+    """Average rating, review count and star histogram, from the aggregate row"""
+    return jsonify(reviews.rating_summary(get_db(), wholesaler_id))
+
+@app.route('/api/reviews', methods=['POST'])
+def create_review():
+    vendor_id = current_user_id('vendor')
+    if vendor_id is None:
+        return jsonify({'success': False, 'message': 'Vendor login required'}), 401
+    data = request.get_json(silent=True) or {}
+    try:
+        wholesaler_id = int(data.get('wholesaler_id'))
+        order_id = int(data['order_id']) if data.get('order_id') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'wholesaler_id and order_id must be integers'}), 400
+
+    conn = get_db()
+    try:
+        review_id = reviews.create_review(conn, vendor_id, wholesaler_id, data.get('rating'),
+                                          data.get('comment'), order_id)
+    except reviews.ReviewError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'review': reviews.serialize_review(reviews.get_review(conn, review_id))}), 201
+
+@app.route('/api/reviews/<int:review_id>', methods=['PATCH', 'DELETE'])
+def change_review(review_id):
+    """Edit or delete the logged-in vendor's own review"""
+    vendor_id = current_user_id('vendor')
+    if vendor_id is None:
+        return jsonify({'success': False, 'message': 'Vendor login required'}), 401
+
+    conn = get_db()
+    try:
+        if request.method == 'DELETE':
+            reviews.delete_review(conn, vendor_id, review_id)
+            return jsonify({'success': True})
+        data = request.get_json(silent=True) or {}
+        reviews.update_review(conn, vendor_id, review_id, data.get('rating'), data.get('comment'))
+    except reviews.ReviewNotFound as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except reviews.ReviewError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'review': reviews.serialize_review(reviews.get_review(conn, review_id))})
+
+@app.route('/api/reviews/<int:review_id>/reply', methods=['POST'])
+def reply_to_review(review_id):
+    """Set the logged-in wholesaler's reply to a review of them; an empty reply clears it"""
+    wholesaler_id = current_user_id('wholesaler')
+    if wholesaler_id is None:
+        return jsonify({'success': False, 'message': 'Wholesaler login required'}), 401
+    data = request.get_json(silent=True) or {}
+
+    conn = get_db()
+    try:
+        reviews.reply_to_review(conn, wholesaler_id, review_id, data.get('reply'))
+    except reviews.ReviewNotFound as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except reviews.ReviewError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'review': reviews.serialize_review(reviews.get_review(conn, review_id))})
 
 @app.route('/api/categories')
+@cached()
 def get_categories():
     categories = [
         {"id": "fruits-vegetables", "title": "Fruits & Vegetables"},
@@ -305,6 +702,7 @@ def get_categories():
     return jsonify({"categories": categories})
 
 @app.route('/api/inventory')
+@cached()
 def get_inventory():
     inventory = [
         {"id": "1", "name": "Fresh Fruits", "category": "Produce"},
@@ -316,25 +714,269 @@ def get_inventory():
     ]
     return jsonify({"inventory": inventory})
 
+# Checkout
+@app.route('/api/checkout', methods=['POST'])
+def checkout_cart():
+    """Place orders for a cart ({items}) or a held reservation ({reservation_id})"""
+    vendor_id = current_user_id('vendor')
+    if vendor_id is None:
+        return jsonify({'success': False, 'message': 'Vendor login required'}), 401
+    data = request.get_json(silent=True) or {}
+    payment_method = data.get('paymentMethod', 'cod')
+
+    conn = get_db()
+    try:
+        if data.get('reservation_id') is not None:
+            try:
+                reservation_id = int(data['reservation_id'])
+            except (TypeError, ValueError):
+                raise checkout.CheckoutError('reservation_id must be an integer')
+            order_ids = checkout.confirm(conn, vendor_id, reservation_id, payment_method)
+            failed = []
+        else:
+            order_ids, failed = checkout.checkout(conn, vendor_id, checkout.parse_cart(data.get('items')),
+                                                  payment_method)
+    except (checkout.CheckoutError, credit.CreditError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    orders = checkout.serialize_orders(conn, order_ids)
+    body = {
+        'success': bool(orders),
+        'orders': orders,
+        'failed': failed,
+        'total': round(sum(order['totalAmount'] for order in orders), 2),
+        'paymentMethod': payment_method
+    }
+    if not orders:
+        body['message'] = 'None of the items are available'
+    return jsonify(body), 200 if orders else 409
+
+@app.route('/api/checkout/reservations', methods=['POST'])
+def reserve_cart():
+    """Hold stock for a cart for a few minutes while the vendor pays"""
+    vendor_id = current_user_id('vendor')
+    if vendor_id is None:
+        return jsonify({'success': False, 'message': 'Vendor login required'}), 401
+    data = request.get_json(silent=True) or {}
+
+    conn = get_db()
+    try:
+        reservation_id, failed = checkout.reserve(conn, vendor_id, checkout.parse_cart(data.get('items')))
+    except checkout.CheckoutError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if reservation_id is None:
+        return jsonify({'success': False, 'message': 'None of the items are available',
+                        'failed': failed}), 409
+
+    reservation = conn.execute('SELECT id, expires_at FROM stock_reservations WHERE id = ?',
+                               (reservation_id,)).fetchone()
+    return jsonify({
+        'success': True,
+        'reservationId': reservation_id,
+        'expiresAt': reservation['expires_at'],
+        'items': [{
+            'productId': line['product_id'],
+            'name': line['name'],
+            'quantity': line['quantity'],
+            'unitPrice': line['unit_price']
+        } for line in checkout.reservation_lines(conn, reservation_id)],
+        'failed': failed
+    }), 201
+
+@app.route('/api/checkout/reservations/<int:reservation_id>', methods=['DELETE'])
+def release_reservation(reservation_id):
+    vendor_id = current_user_id('vendor')
+    if vendor_id is None:
+        return jsonify({'success': False, 'message': 'Vendor login required'}), 401
+    try:
+        checkout.release(get_db(), vendor_id, reservation_id)
+    except checkout.CheckoutError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    return jsonify({'success': True})
+
+# Pay Later credit
 @app.route('/api/pay-later')
 def get_pay_later():
+    """The vendor's credit limit and balance, read from their account snapshot"""
+    vendor_id = current_user_id('vendor')
+    if vendor_id is None:
+        return jsonify({"error": "Vendor login required"}), 401
+    return jsonify(credit.serialize_account(credit.account(get_db(), vendor_id)))
+
+@app.route('/api/pay-later/enroll', methods=['POST'])
+def enroll_pay_later():
+    vendor_id = current_user_id('vendor')
+    if vendor_id is None:
+        return jsonify({'success': False, 'message': 'Vendor login required'}), 401
+    data = request.get_json(silent=True) or {}
+    conn = get_db()
+    try:
+        credit.enroll(conn, vendor_id, data.get('aadhar'), data.get('pan'))
+    except credit.CreditError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'account': credit.serialize_account(credit.account(conn, vendor_id))})
+
+@app.route('/api/pay-later/draw', methods=['POST'])
+def draw_pay_later():
+    """Spend against the credit limit; refused if it would exceed it"""
+    vendor_id = current_user_id('vendor')
+    if vendor_id is None:
+        return jsonify({'success': False, 'message': 'Vendor login required'}), 401
+    data = request.get_json(silent=True) or {}
+    conn = get_db()
+    try:
+        credit.draw(conn, vendor_id, data.get('amount'), data.get('description'), data.get('reference'))
+    except credit.CreditError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'account': credit.serialize_account(credit.account(conn, vendor_id))})
+
+@app.route('/api/pay-later/repay', methods=['POST'])
+def repay_pay_later():
+    vendor_id = current_user_id('vendor')
+    if vendor_id is None:
+        return jsonify({'success': False, 'message': 'Vendor login required'}), 401
+    data = request.get_json(silent=True) or {}
+    method = data.get('paymentMethod')
+    if method not in (None, 'upi', 'bank_transfer', 'cash'):
+        return jsonify({'success': False, 'message': 'paymentMethod must be upi, bank_transfer or cash'}), 400
+    conn = get_db()
+    try:
+        credit.repay(conn, vendor_id, data.get('amount'), data.get('reference'), method)
+    except credit.CreditError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'account': credit.serialize_account(credit.account(conn, vendor_id))})
+
+@app.route('/api/pay-later/transactions')
+def get_pay_later_transactions():
+    """Ledger entries, newest first; pass ?before_id= to page back"""
+    vendor_id = current_user_id('vendor')
+    if vendor_id is None:
+        return jsonify({"error": "Vendor login required"}), 401
+    try:
+        limit = min(int(request.args.get('limit', credit.DEFAULT_HISTORY_LIMIT)), credit.MAX_HISTORY_LIMIT)
+        before_id = int(request.args['before_id']) if request.args.get('before_id') else None
+    except ValueError:
+        return jsonify({"error": "limit and before_id must be integers"}), 400
+
+    rows = credit.history(get_db(), vendor_id, max(limit, 1), before_id)
+    return jsonify({
+        'transactions': [credit.serialize_entry(row) for row in rows],
+        'nextBeforeId': rows[-1]['id'] if len(rows) == max(limit, 1) else None
+    })
+
+@app.route('/api/wholesaler/<int:wholesaler_id>/analytics')
+def get_wholesaler_analytics(wholesaler_id):
+    """Daily orders, revenue and customers, read from the rollup table only"""
+    current = current_user_id('wholesaler')
+    if current is None:
+        return jsonify({"error": "Wholesaler login required"}), 401
+    if current != wholesaler_id:
+        return jsonify({"error": "Not allowed to view another wholesaler's analytics"}), 403
+    try:
+        start, end = analytics.parse_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    rows = analytics.daily_analytics(get_db(), wholesaler_id, start, end)
+    days = [{
+        'date': row['date'],
+        'totalOrders': row['total_orders'],
+        'totalRevenue': row['total_revenue'],
+        'activeCustomers': row['active_customers']
+    } for row in rows]
+
     return jsonify({
-        "vendorId": "vendor123", "totalCreditLimit": 3000, "usedCredit": 1200,
-        "dueDate": "2025-08-25", "interestRate": 0.05, "isEnrolled": True, "isBlocked": False,
-        "bankDetails": {"aadhar": "XXXX XXXX XXXX", "pan": "ABCDE1234F"}
+        'wholesalerId': wholesaler_id,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'days': days,
+        'totals': {
+            'orders': sum(day['totalOrders'] for day in days),
+            'revenue': sum(day['totalRevenue'] for day in days)
+        }
     })
 
+# Server-Sent Events
+@app.route('/api/events')
+def stream_events():
+    """SSE stream of changes to ?topics=product:<id>,wholesaler:<id>:orders,vendor:<id>:orders"""
+    try:
+        topics = events.parse_topics(request.args.get('topics'))
+        # EventSource sends Last-Event-ID when it reconnects; the query
+        # parameter lets a fresh page resume too
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    for topic in topics:
+        owner = events.topic_owner(topic)
+        if owner is not None and current_user_id(owner[0]) != owner[1]:
+            return jsonify({"error": f"Not allowed to subscribe to {topic}"}), 403
+
+    conn = get_db()
+    if last_event_id is None:
+        last_event_id = events.current_id(conn)
+    subscription = events.broadcaster.subscribe(conn, topics)
+    try:
+        missed = events.replay(conn, topics, last_event_id)
+    except Exception:
+        events.broadcaster.unsubscribe(subscription)
+        raise
+    args = (subscription, missed or (), missed is None, last_event_id)
+    # The async server waits for events on its event loop instead of a thread
+    response = Response(async_aware(events.stream(*args), events.stream_async(*args)),
+                        mimetype='text/event-stream')
+    # The body's own cleanup never runs if it is not iterated (HEAD requests)
+    response.call_on_close(lambda: events.broadcaster.unsubscribe(subscription))
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Batched requests
+@app.route('/api/batch', methods=['POST'])
+def run_batch():
+    """Several GET requests in one round trip: {requests: [{id, path}]}"""
+    try:
+        parts = batch.parse_parts(request.get_json(silent=True))
+    except batch.BatchError as e:
+        return jsonify({"error": str(e)}), 400
+    return batch.respond(app, parts)
+
+@app.route('/api/dashboard')
+def get_dashboard():
+    """Everything the vendor dashboard loads, fetched concurrently in one response"""
+    return batch.respond(app, batch.dashboard_parts(request.args))
+
 @app.route('/api/health')
 def health_check():
-    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
+    return jsonify({
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "db_pool": db.pool.stats(),
+        "response_cache": response_cache.stats()
+    })
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Request, query, pool and cache metrics in Prometheus text format"""
+    gauges = {f'db_pool_{name}': value for name, value in db.pool.stats().items()}
+    gauges.update({f'response_cache_{name}': value for name, value in response_cache.stats().items()
+                   if isinstance(value, (int, float))})
+    gauges.update({f'events_{name}': value for name, value in events.broadcaster.stats().items()})
+    return Response(metrics.render(gauges), content_type=metrics.PROMETHEUS_MIMETYPE)
 
 # Frontend serving routes
+# dist/ is scanned (and precompressed) once at startup; rebuild the frontend
+# and restart (or send the production master SIGHUP) to pick up changes
+static_assets.refresh()
+
 @app.route('/')
 def serve_frontend():
     """Serve the React frontend"""
-    dist_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'dist')
-    if os.path.exists(os.path.join(dist_path, 'index.html')):
-        return send_from_directory(dist_path, 'index.html')
+    response = static_assets.send_asset('index.html')
+    if response is not None:
+        return response
     else:
         return jsonify({
             "message": "Sahaayak Backend is running",
@@ -346,24 +988,36 @@ def serve_frontend():
 @app.route('/<path:path>')
 def serve_frontend_routes(path):
     """Serve React frontend routes and static files"""
-    dist_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'dist')
-
     # Check if it's a static file
-    if os.path.exists(os.path.join(dist_path, path)):
-        return send_from_directory(dist_path, path)
+    response = static_assets.send_asset(path)
+    if response is not None:
+        return response
 
     # For React Router, serve index.html for non-API routes
     if not path.startswith('api/'):
-        if os.path.exists(os.path.join(dist_path, 'index.html')):
-            return send_from_directory(dist_path, 'index.html')
+        response = static_assets.send_asset('index.html')
+        if response is not None:
+            return response
 
     # 404 for other cases
     return jsonify({"error": "Not found"}), 404
 
 if __name__ == '__main__':
+    if not app.config['DEBUG']:
+        # Production: pre-forked multi-process server (see serve.py)
+        try:
+            import serve
+        except ImportError:
+            print("⚠️ gunicorn is not installed (it does not run on Windows); "
+                  "falling back to the single-process server")
+        else:
+            serve.run()
+            raise SystemExit(0)
+
     print("🗄️ Initializing database...")
     init_db()
     print("✅ Database ready")
+    jobs.start()
     print("🌐 Starting Sahaayak server on http://localhost:5000")
     print("📱 Access the app at: http://localhost:5000")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=app.config['DEBUG'], host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,251 @@
+"""
+ASGI entry point: the same Flask app served from an asyncio event loop.
+
+In the default (sync) server each connection occupies a worker thread for
+its whole life, including the time spent receiving a slow upload, writing a
+large response to a slow client, or holding an SSE stream open. Here the
+event loop owns every connection and does all of that waiting itself; a
+request only takes a thread from a bounded executor (WORKER_THREADS per
+process, matching the database pool) while Flask is actually running it:
+
+    receive the body          event loop (spooled to disk past SPOOL_BYTES)
+    dispatch + SQLite work    executor thread, awaited by the loop
+    send the response         event loop, one executor hop per streamed chunk
+
+Every executor hop of a request runs in that request's own contextvars
+context, so Flask's request and app contexts, and the pooled connection a
+streamed listing keeps checked out, behave exactly as under WSGI.
+
+Views can hand the server an async body instead (streaming.async_aware);
+SSE streams use this to wait for events on the loop, so open dashboards cost
+no threads at all and one process can hold thousands of them.
+
+Run by serve.py when SERVER_MODE=async, or directly with any ASGI server:
+
+    SERVER_MODE=async FLASK_ENV=production python serve.py
+"""
+
+import asyncio
+import contextvars
+import functools
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+from streaming import ASYNC_BODY
+
+# Request bodies larger than this are buffered in a temporary file
+SPOOL_BYTES = 1024 * 1024
+DEFAULT_THREADS = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        # Created on first use so each pre-forked worker gets its own threads
+        if _executor is None:
+            _executor = ThreadPoolExecutor(app.config.get('THREADS', DEFAULT_THREADS),
+                                           thread_name_prefix='asgi')
+        return _executor
+
+
+async def _read_body(receive):
+    """The whole request body, capped just past MAX_CONTENT_LENGTH.
+
+    Stopping one byte over the limit is enough for Flask to answer 413 as
+    it would under WSGI.
+    """
+    limit = app.config.get('MAX_CONTENT_LENGTH')
+    body = tempfile.SpooledTemporaryFile(SPOOL_BYTES)
+    size = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None, 0
+        chunk = message.get('body', b'')
+        if chunk and (limit is None or size <= limit):
+            body.write(chunk)
+            size += len(chunk)
+        more_body = message.get('more_body', False)
+    body.seek(0)
+    return body, size
+
+
+def _environ(scope, body, size):
+    """PEP 3333 environ for an ASGI http scope."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        # WSGI carries the raw path bytes as latin-1
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        # The body is already buffered, so its length is known
+        'CONTENT_LENGTH': str(size),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        # Lets views pass an async body back to us (see streaming.async_aware)
+        ASYNC_BODY: None,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = name if name == 'CONTENT_TYPE' else f'HTTP_{name}'
+        if key in environ:
+            separator = '; ' if key == 'HTTP_COOKIE' else ','
+            value = environ[key] + separator + value
+        environ[key] = value
+    return environ
+
+
+def _dispatch(environ, start_response):
+    """Run the app and fetch the first two chunks of its body (executor thread).
+
+    A body of one chunk, as most are, is then complete after a single hop.
+    """
+    app_iter = app(environ, start_response)
+    if environ[ASYNC_BODY] is not None:
+        return app_iter, None, None, None
+    iterator = iter(app_iter)
+    chunk = _next_chunk(app_iter, iterator)
+    following = _next_chunk(app_iter, iterator) if chunk is not None else None
+    return app_iter, iterator, chunk, following
+
+
+def _next_chunk(app_iter, iterator):
+    """The next non-empty chunk, or None once the body is exhausted and closed."""
+    for chunk in iterator:
+        if chunk:
+            return chunk
+    _close(app_iter)
+    return None
+
+
+def _close(app_iter):
+    # Runs call_on_close hooks (request metrics) and ends streamed bodies,
+    # returning their pooled connection
+    close = getattr(app_iter, 'close', None)
+    if close is not None:
+        close()
+
+
+class _Request:
+    """One HTTP request: its executor hops all run in a single context."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.context = contextvars.copy_context()
+        self.running = None
+        self.status = None
+        self.headers = None
+
+    def start_response(self, status, headers, exc_info=None):
+        self.status, self.headers = status, headers
+        return self._write
+
+    @staticmethod
+    def _write(data):
+        raise NotImplementedError('write() is not supported; return the body instead')
+
+    async def call(self, fn, *args):
+        """Run ``fn`` on the executor in this request's context and await it."""
+        self.running = self.loop.run_in_executor(
+            _get_executor(), functools.partial(self.context.run, fn, *args))
+        # A cancelled request (client gone) must not abandon the hop midway:
+        # the context cannot be entered again until it has finished
+        return await asyncio.shield(self.running)
+
+    async def settle(self):
+        """Wait for a hop still running after this request was cancelled."""
+        if self.running is not None and not self.running.done():
+            await asyncio.wait([self.running])
+
+    async def start(self, send):
+        status = int(self.status.split(' ', 1)[0])
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                   for name, value in self.headers]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+
+
+async def _http(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    body, size = await _read_body(receive)
+    if body is None:
+        return
+    environ = _environ(scope, body, size)
+    request = _Request(loop)
+    app_iter = None
+    done = False
+    try:
+        app_iter, iterator, chunk, following = await request.call(
+            _dispatch, environ, request.start_response)
+        await request.start(send)
+
+        async_body = environ[ASYNC_BODY]
+        if async_body is not None:
+            # Waits on the event loop, not in a thread
+            try:
+                async for chunk in async_body:
+                    await send({'type': 'http.response.body', 'more_body': True,
+                                'body': chunk.encode() if isinstance(chunk, str) else chunk})
+            finally:
+                await async_body.aclose()
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        # Reading one chunk ahead lets the last one go out with more_body
+        # False: a client that knows the Content-Length may send its next
+        # keep-alive request as soon as it has the body, and it must not
+        # arrive while this response is still open
+        while following is not None:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk, following = following, await request.call(_next_chunk, app_iter, iterator)
+        done = True
+        await send({'type': 'http.response.body', 'body': chunk or b''})
+    finally:
+        if app_iter is not None and not done:
+            await request.settle()
+            await request.call(_close, app_iter)
+        body.close()
+
+
+async def _lifespan(receive, send):
+    # Startup work (migrations, background jobs) is done by serve.py's
+    # gunicorn hooks, as for the sync server
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI 3 application wrapping the Flask app."""
+    if scope['type'] == 'http':
+        await _http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    else:
+        raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
@@ -0,0 +1,174 @@
+"""
+Batched GET requests: several API calls in one round trip.
+
+A batch is a list of sub-requests ({id, path}) dispatched through the app
+itself, so every part gets exactly the response, caching and session
+handling the standalone endpoint would. Parts are independent reads and run
+concurrently in up to MAX_LANES lanes: the calling thread runs one lane and
+a small shared thread pool runs the rest, each lane taking the next part
+until none are left. Each lane checks out a single pooled connection and
+its parts share it in turn, so a batch holds at most MAX_LANES connections
+however many parts it has. When the pool is busy with other batches, the
+calling thread simply runs more of the parts itself.
+
+The vendor dashboard's seven calls are available as the named bundle
+DASHBOARD_PARTS.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from flask import Response, request
+from werkzeug.test import EnvironBuilder
+
+logger = logging.getLogger(__name__)
+
+MAX_PARTS = 20
+MAX_LANES = 4
+# Headers a part inherits from the batch request
+FORWARDED_HEADERS = ('Cookie', 'Accept-Language', 'Authorization', 'User-Agent')
+# Paths that must not be batched: streams, and batches themselves
+EXCLUDED_PATHS = ('/api/batch', '/api/dashboard', '/api/events')
+
+DASHBOARD_PARTS = (
+    ('vendors', '/api/vendors'),
+    ('budgetItems', '/api/budget-items'),
+    ('recentOrders', '/api/recent-orders'),
+    ('reviews', '/api/reviews'),
+    ('categories', '/api/categories'),
+    ('inventory', '/api/inventory'),
+    ('payLater', '/api/pay-later'),
+)
+# Dashboard query parameters passed on to the budget items part
+BUDGET_ITEM_ARGS = ('maxBudget', 'category', 'sortBy', 'limit')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class BatchError(Exception):
+    """A malformed batch, with a client-facing message."""
+
+
+def parse_parts(data):
+    """[{id, path}, ...] from a batch request body; raises BatchError."""
+    parts = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(parts, list) or not parts:
+        raise BatchError('requests must be a non-empty list')
+    if len(parts) > MAX_PARTS:
+        raise BatchError(f'At most {MAX_PARTS} requests per batch')
+    parsed, seen = [], set()
+    for index, part in enumerate(parts):
+        if not isinstance(part, dict) or not isinstance(part.get('path'), str):
+            raise BatchError('Each request needs a path')
+        part_id = str(part.get('id', index))
+        if part_id in seen:
+            raise BatchError(f'Duplicate request id {part_id!r}')
+        seen.add(part_id)
+        parsed.append((part_id, part['path']))
+    return parsed
+
+
+def dashboard_parts(args):
+    parts = []
+    for part_id, path in DASHBOARD_PARTS:
+        if part_id == 'budgetItems':
+            query = urlencode([(name, args[name]) for name in BUDGET_ITEM_ARGS if args.get(name)])
+            path = f'{path}?{query}' if query else path
+        parts.append((part_id, path))
+    return parts
+
+
+def _check_path(path):
+    url = urlsplit(path)
+    if url.scheme or url.netloc or not url.path.startswith('/api/'):
+        return 'path must be an /api/ path on this server'
+    if url.path.rstrip('/') in EXCLUDED_PATHS:
+        return f'{url.path} cannot be batched'
+    return None
+
+
+def _run_part(app, headers, part_id, path):
+    started = time.perf_counter()
+    problem = _check_path(path)
+    if problem is not None:
+        return part_id, 400, 0.0, json.dumps({'error': problem}).encode()
+
+    url = urlsplit(path)
+    environ = EnvironBuilder(path=url.path, query_string=url.query, method='GET',
+                             headers=headers).get_environ()
+    try:
+        with app.request_context(environ):
+            response = app.full_dispatch_request()
+            try:
+                status, data = response.status_code, response.get_data()
+                mimetype = response.mimetype
+            finally:
+                # Runs call_on_close hooks (request metrics)
+                response.close()
+    except Exception:
+        logger.exception('Batched request %s failed', path)
+        status, data, mimetype = 500, b'{"error":"Internal server error"}', 'application/json'
+
+    # JSON bodies are spliced into the batch response as they are, without
+    # decoding and re-encoding them
+    if mimetype != 'application/json' or not data:
+        data = json.dumps(data.decode('utf-8', 'replace') if data else None).encode()
+    return part_id, status, round((time.perf_counter() - started) * 1000, 2), data
+
+
+def _run_lane(app, headers, pending):
+    results = []
+    # A fresh app context gives the lane its own g, so its parts share the
+    # one connection get_db() checks out; it is returned when the lane ends
+    with app.app_context():
+        while True:
+            try:
+                part_id, path = pending.popleft()
+            except IndexError:
+                return results
+            results.append(_run_part(app, headers, part_id, path))
+
+
+def run(app, parts):
+    """Dispatch ``parts`` concurrently; returns [(id, status, ms, JSON body)] in order."""
+    global _executor
+    headers = [(name, request.headers[name]) for name in FORWARDED_HEADERS if name in request.headers]
+    pending = deque(parts)
+
+    futures = []
+    helpers = min(MAX_LANES, len(parts)) - 1
+    if helpers:
+        with _executor_lock:
+            # Created on first use so each pre-forked worker gets its own threads
+            if _executor is None:
+                _executor = ThreadPoolExecutor(MAX_LANES - 1, thread_name_prefix='batch')
+        futures = [_executor.submit(_run_lane, app, headers, pending) for _ in range(helpers)]
+
+    results = _run_lane(app, headers, pending)
+    for future in futures:
+        # Lanes still queued behind other batches have nothing left to do
+        if not future.cancel():
+            results.extend(future.result())
+    # In the order the parts were given
+    order = {part_id: index for index, (part_id, _) in enumerate(parts)}
+    return sorted(results, key=lambda result: order[result[0]])
+
+
+def respond(app, parts):
+    """Run ``parts`` and combine them: {responses: {id: {status, timeMs, body}}, timeMs}."""
+    started = time.perf_counter()
+    results = run(app, parts)
+    chunks = [b'{"responses":{']
+    for index, (part_id, status, elapsed, body) in enumerate(results):
+        prefix = b',' if index else b''
+        chunks.append(prefix + json.dumps(part_id).encode()
+                      + f':{{"status":{status},"timeMs":{elapsed},"body":'.encode() + body + b'}')
+    elapsed = round((time.perf_counter() - started) * 1000, 2)
+    chunks.append(f'}},"timeMs":{elapsed}}}'.encode())
+    return Response(b''.join(chunks), mimetype='application/json')
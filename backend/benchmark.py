@@ -0,0 +1,537 @@
+"""
+Endpoint benchmark suite.
+
+Drives every /api/* route, either in-process through the Flask test client
+or against a running server, with a number of concurrent clients, and
+reports throughput and p50/p95/p99 latency per endpoint. Build a dataset
+with datagen.py first; the ids, logins and filters used are sampled from it.
+
+    python datagen.py --scale 0.1 --output bench.db
+    python benchmark.py --db bench.db --output before.json
+    DATABASE_PATH=bench.db FLASK_ENV=production python app.py &
+    python benchmark.py --db bench.db --live http://localhost:5000 --concurrency 16
+
+--serve sync,async starts the production server (serve.py) in each mode in
+turn on a local port and benchmarks it live, then compares the modes.
+--idle-streams N holds N SSE connections open meanwhile, like that many
+open dashboards; in sync mode each one occupies a worker thread:
+
+    python benchmark.py --db bench.db --serve sync,async --concurrency 32 --idle-streams 64
+
+Results are saved as JSON (with the git commit they were taken at), and
+--compare old.json prints the change per endpoint and exits non-zero if any
+p95 got worse by more than --threshold. Write endpoints (likes, group-buy
+pledges, catalog imports, uploads) modify the database, so benchmark a
+generated copy rather than real data.
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+from datagen import VENDOR_PASSWORD, WHOLESALER_PASSWORD
+
+DEFAULT_REQUESTS = 200
+DEFAULT_CONCURRENCY = 4
+DEFAULT_WARMUP = 10
+DEFAULT_THRESHOLD = 1.2
+DEFAULT_TIMEOUT = 30
+# Idle streams can tie up every sync worker, so requests that would block
+# are given up on (and counted as errors) sooner
+IDLE_STREAMS_TIMEOUT = 5
+DEFAULT_SERVER_WORKERS = 2
+SERVER_MODES = ('sync', 'async')
+
+SEARCH_WORDS = ('tom', 'onion', 'rice', 'dal', 'pan', 'mirch', 'aloo', 'palak', 'fresh', 'oil')
+SORT_KEYS = ('default', 'name', 'price-low', 'price-high', 'savings')
+
+# A 1x1 PNG for the upload endpoint
+TINY_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010802000000907753de'
+    '0000000c49444154789c6338a1a1010002d4011905508fa40000000049454e44ae426082')
+
+
+class Dataset:
+    """Ids and logins sampled from a generated database."""
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise SystemExit(f'{path} does not exist; create it with datagen.py')
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            self.counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                           for table in ('vendors', 'wholesalers', 'products', 'orders', 'reviews')}
+            # Products of approved wholesalers, the only ones the API shows
+            self.product_ids = [row[0] for row in conn.execute('''
+                SELECT p.id FROM products p JOIN wholesalers w ON p.wholesaler_id = w.id
+                WHERE w.is_approved = 1 ORDER BY random() LIMIT 5000
+            ''')]
+            self.group_buy_ids = [row[0] for row in conn.execute('''
+                SELECT p.id FROM products p JOIN wholesalers w ON p.wholesaler_id = w.id
+                WHERE w.is_approved = 1 AND p.group_buy_eligible = 1 ORDER BY random() LIMIT 5000
+            ''')]
+            self.product_names = [row[0] for row in conn.execute(
+                'SELECT DISTINCT name FROM products WHERE name IS NOT NULL LIMIT 1000')]
+            self.categories = [row[0] for row in conn.execute(
+                'SELECT DISTINCT category FROM products WHERE category IS NOT NULL')]
+            self.locations = [row[0] for row in conn.execute(
+                'SELECT DISTINCT location FROM vendors WHERE location IS NOT NULL')]
+            self.wholesaler_ids = [row[0] for row in conn.execute(
+                'SELECT id FROM wholesalers WHERE is_approved = 1')]
+            self.vendor_phones = [row[0] for row in conn.execute('''
+                SELECT phone FROM vendors WHERE is_approved = 1 AND password = ?
+                ORDER BY id DESC LIMIT 200
+            ''', (VENDOR_PASSWORD,))]
+            # The vendor benchmark clients log in as
+            self.vendor_id = conn.execute('SELECT id FROM vendors WHERE phone = ?',
+                                          (self.vendor_phones[0],)).fetchone()[0]
+            wholesaler = conn.execute('''
+                SELECT w.id, w.phone FROM wholesalers w
+                WHERE w.is_approved = 1 AND w.password = ?
+                  AND EXISTS (SELECT 1 FROM products p WHERE p.wholesaler_id = w.id)
+                ORDER BY w.id DESC LIMIT 1
+            ''', (WHOLESALER_PASSWORD,)).fetchone()
+            # The wholesaler benchmark clients log in as
+            self.wholesaler_id, self.wholesaler_phone = wholesaler['id'], wholesaler['phone']
+            self.own_products = [dict(row) for row in conn.execute('''
+                SELECT id, name, category, price, stock FROM products
+                WHERE wholesaler_id = ? LIMIT 50
+            ''', (wholesaler['id'],))]
+        finally:
+            conn.close()
+
+
+def _import_body(data):
+    # Rewrites the wholesaler's own products, so repeated runs do not grow the catalog
+    lines = ['id,name,category,price,stock']
+    lines += [f"{p['id']},{p['name']},{p['category']},{p['price']},{p['stock']}"
+              for p in data.own_products]
+    return '\n'.join(lines).encode()
+
+
+def _shopping_list(rng, data):
+    names = rng.sample(data.product_names, min(len(data.product_names), rng.choice((10, 50, 200))))
+    return json.dumps({
+        'items': [{'name': name, 'quantity': rng.randint(1, 20),
+                   'substitutes': rng.sample(data.product_names, 2)} for name in names],
+        'budget': rng.choice((500, 2000, 10000)),
+    }).encode()
+
+
+def _products_query(rng, data):
+    args = {'sortBy': rng.choice(SORT_KEYS)}
+    if rng.random() < 0.5:
+        args['category'] = rng.choice(data.categories)
+    if rng.random() < 0.3:
+        args['maxBudget'] = rng.choice((20, 50, 100, 500))
+    return urlencode(args)
+
+
+# name -> (login as, build(rng, data) -> (method, path, body, content type[, headers]))
+ENDPOINTS = {
+    'vendors': (None, lambda rng, d: ('GET', '/api/vendors', None, None)),
+    'products': (None, lambda rng, d: ('GET', f'/api/products?{_products_query(rng, d)}', None, None)),
+    'products_ndjson': (None, lambda rng, d: (
+        'GET', f'/api/products?limit=1000&{_products_query(rng, d)}', None, None,
+        {'Accept': 'application/x-ndjson'})),
+    'products_columnar': (None, lambda rng, d: (
+        'GET', f'/api/products?limit=1000&{_products_query(rng, d)}', None, None,
+        {'Accept': 'application/vnd.sahaayak.columnar+json'})),
+    'product': (None, lambda rng, d: ('GET', f'/api/products/{rng.choice(d.product_ids)}', None, None)),
+    'product_like': (None, lambda rng, d: (
+        'POST', f'/api/products/{rng.choice(d.product_ids)}/like', None, None)),
+    'search': (None, lambda rng, d: ('GET', f'/api/search?q={rng.choice(SEARCH_WORDS)}', None, None)),
+    'login': (None, lambda rng, d: ('POST', '/api/login', json.dumps({
+        'phone': rng.choice(d.vendor_phones), 'password': VENDOR_PASSWORD, 'user_type': 'vendor'
+    }).encode(), 'application/json')),
+    'logout': (None, lambda rng, d: ('POST', '/api/logout', None, None)),
+    'user': ('vendor', lambda rng, d: ('GET', '/api/user', None, None)),
+    'catalog_import': ('wholesaler', lambda rng, d: (
+        'POST', '/api/wholesaler/products/import', _import_body(d), 'text/csv')),
+    'catalog_export': ('wholesaler', lambda rng, d: (
+        'GET', '/api/wholesaler/products/export?format=json', None, None)),
+    'upload': ('wholesaler', lambda rng, d: (
+        'POST', '/api/wholesaler/uploads/profile-photo', TINY_PNG, 'image/png')),
+    'group_buy_join': ('vendor', lambda rng, d: ('POST', '/api/group-buy/join', json.dumps({
+        'product_id': rng.choice(d.group_buy_ids), 'quantity': rng.randint(1, 10)
+    }).encode(), 'application/json')),
+    'checkout': ('vendor', lambda rng, d: ('POST', '/api/checkout', json.dumps({
+        'items': [{'product_id': product_id, 'quantity': rng.randint(1, 3)}
+                  for product_id in rng.sample(d.product_ids, 3)]
+    }).encode(), 'application/json')),
+    'group_buy_pool': (None, lambda rng, d: (
+        'GET', f'/api/group-buy/products/{rng.choice(d.group_buy_ids)}/pool?'
+               f'{urlencode({"location": rng.choice(d.locations)})}', None, None)),
+    'wholesalers_nearby': (None, lambda rng, d: (
+        'GET', f'/api/wholesalers/nearby?lat={rng.uniform(18.95, 19.25):.5f}'
+               f'&lon={rng.uniform(72.82, 72.99):.5f}&radius={rng.choice((2, 5, 10))}', None, None)),
+    'budget_items': (None, lambda rng, d: (
+        'GET', f'/api/budget-items?{_products_query(rng, d)}', None, None)),
+    'budget_optimize': (None, lambda rng, d: (
+        'POST', '/api/budget/optimize', _shopping_list(rng, d), 'application/json')),
+    'recent_orders': (None, lambda rng, d: ('GET', '/api/recent-orders', None, None)),
+    'reviews': (None, lambda rng, d: (
+        'GET', f'/api/reviews?wholesaler_id={rng.choice(d.wholesaler_ids)}', None, None)),
+    'wholesaler_rating': (None, lambda rng, d: (
+        'GET', f'/api/wholesalers/{rng.choice(d.wholesaler_ids)}/rating', None, None)),
+    'categories': (None, lambda rng, d: ('GET', '/api/categories', None, None)),
+    'inventory': (None, lambda rng, d: ('GET', '/api/inventory', None, None)),
+    'pay_later': ('vendor', lambda rng, d: ('GET', '/api/pay-later', None, None)),
+    'pay_later_transactions': ('vendor', lambda rng, d: ('GET', '/api/pay-later/transactions', None, None)),
+    'dashboard': ('vendor', lambda rng, d: ('GET', f'/api/dashboard?{_products_query(rng, d)}', None, None)),
+    'reorder_suggestions': ('vendor', lambda rng, d: (
+        'GET', f'/api/vendor/{d.vendor_id}/reorder-suggestions?days={rng.choice((0, 3, 7, 30))}',
+        None, None)),
+    'analytics': ('wholesaler', lambda rng, d: (
+        'GET', f'/api/wholesaler/{d.wholesaler_id}/analytics', None, None)),
+    'health': (None, lambda rng, d: ('GET', '/api/health', None, None)),
+}
+
+
+class TestClientTransport:
+    """In-process requests through the Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, content_type=None, headers=None):
+        response = self.client.open(path, method=method, data=body, content_type=content_type,
+                                    headers=headers)
+        # Drain streamed bodies so their cost is measured
+        response.get_data()
+        response.close()
+        return response.status_code
+
+
+class HTTPTransport:
+    """Requests over one keep-alive HTTP connection, with a session cookie."""
+
+    def __init__(self, base_url, timeout=DEFAULT_TIMEOUT):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.timeout = timeout
+        self.connection = None
+        self.cookie = None
+
+    def request(self, method, path, body=None, content_type=None, headers=None):
+        headers = dict(headers or {})
+        if content_type:
+            headers['Content-Type'] = content_type
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        for attempt in (1, 2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                response.read()
+                break
+            except socket.timeout:
+                # A saturated server, not a stale connection: retrying would
+                # only wait out the timeout again
+                self.connection.close()
+                self.connection = None
+                raise
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed an idle keep-alive connection; retry once
+                self.connection.close()
+                self.connection = None
+                if attempt == 2:
+                    raise
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status
+
+
+def _login(transport, role, data):
+    phone, password = ((data.wholesaler_phone, WHOLESALER_PASSWORD) if role == 'wholesaler'
+                       else (data.vendor_phones[0], VENDOR_PASSWORD))
+    transport.request('POST', '/api/login', json.dumps({
+        'phone': phone, 'password': password, 'user_type': role
+    }).encode(), 'application/json')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_endpoint(name, make_transport, data, requests, concurrency, warmup, seed):
+    role, build = ENDPOINTS[name]
+    latencies, statuses, failures = [], {}, []
+    lock = threading.Lock()
+    per_client = [requests // concurrency + (1 if i < requests % concurrency else 0)
+                  for i in range(concurrency)]
+    ready = threading.Barrier(concurrency + 1)
+
+    def client(index, count):
+        rng = random.Random(f'{seed}-{name}-{index}')
+        transport = make_transport()
+        try:
+            if role:
+                _login(transport, role, data)
+            for _ in range(warmup):
+                transport.request(*build(rng, data))
+        except Exception as e:
+            failures.append(repr(e))
+        ready.wait()
+        timings, codes = [], {}
+        for _ in range(count):
+            request = build(rng, data)
+            started = time.perf_counter()
+            try:
+                code = transport.request(*request)
+            except Exception as e:
+                code = type(e).__name__
+            timings.append((time.perf_counter() - started) * 1000)
+            codes[code] = codes.get(code, 0) + 1
+        with lock:
+            latencies.extend(timings)
+            for code, n in codes.items():
+                statuses[str(code)] = statuses.get(str(code), 0) + n
+
+    threads = [threading.Thread(target=client, args=(i, n)) for i, n in enumerate(per_client)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(n for code, n in statuses.items() if not code.isdigit() or int(code) >= 500)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': statuses,
+        'setup_failures': failures[:5],
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+        'p50_ms': round(percentile(latencies, 50), 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 3) if latencies else None,
+        'max_ms': round(latencies[-1], 3) if latencies else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _in_process_transport(db_path):
+    import db
+    from app import app
+    app.config['DATABASE'] = os.path.abspath(db_path)
+    db.configure(database=app.config['DATABASE'])
+    return lambda: TestClientTransport(app)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def running_server(mode, db_path, workers):
+    """Start serve.py in ``mode`` on a free local port; yields its URL."""
+    port = _free_port()
+    env = dict(os.environ, FLASK_ENV='production', SERVER_MODE=mode,
+               DATABASE_PATH=os.path.abspath(db_path), BIND=f'127.0.0.1:{port}',
+               WEB_CONCURRENCY=str(workers))
+    process = subprocess.Popen([sys.executable, 'serve.py'], env=env,
+                               cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            if process.poll() is not None:
+                raise SystemExit(f'{mode} server exited with status {process.returncode}')
+            try:
+                if HTTPTransport(url, timeout=5).request('GET', '/api/health') == 200:
+                    break
+            except (OSError, http.client.HTTPException):
+                pass
+            if time.monotonic() > deadline:
+                raise SystemExit(f'{mode} server did not start')
+            time.sleep(0.25)
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+@contextmanager
+def idle_streams(base_url, count, data):
+    """Hold ``count`` SSE connections open, never reading from them."""
+    url = urlsplit(base_url)
+    sockets = []
+    try:
+        for index in range(count):
+            sock = socket.create_connection((url.hostname, url.port or 80), timeout=5)
+            sockets.append(sock)
+            topic = f'product:{data.product_ids[index % len(data.product_ids)]}'
+            sock.sendall(f'GET /api/events?topics={topic} HTTP/1.1\r\nHost: {url.netloc}\r\n'
+                         f'Accept: text/event-stream\r\n\r\n'.encode())
+        yield
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def run_endpoints(names, make_transport, data, args):
+    return {name: run_endpoint(name, make_transport, data, args.requests, args.concurrency,
+                               args.warmup, args.seed)
+            for name in names}
+
+
+def print_results(results):
+    print(f"{'endpoint':<16}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, result in results.items():
+        print(f"{name:<16}{result['throughput_rps'] or 0:>10.1f}{result['p50_ms'] or 0:>10.2f}"
+              f"{result['p95_ms'] or 0:>10.2f}{result['p99_ms'] or 0:>10.2f}{result['errors']:>8}")
+
+
+def compare(results, baseline, threshold):
+    """Print p95 and throughput against a baseline; returns regressed endpoint names."""
+    regressed = []
+    print(f"\n{'endpoint':<16}{'p95 before':>12}{'p95 now':>10}{'change':>9}{'req/s change':>14}")
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before or not before.get('p95_ms') or not result['p95_ms']:
+            continue
+        ratio = result['p95_ms'] / before['p95_ms']
+        rps_ratio = (result['throughput_rps'] or 0) / (before['throughput_rps'] or 1)
+        flag = '  REGRESSED' if ratio > threshold else ''
+        print(f"{name:<16}{before['p95_ms']:>12.2f}{result['p95_ms']:>10.2f}{ratio - 1:>+9.0%}"
+              f"{rps_ratio - 1:>+14.0%}{flag}")
+        if flag:
+            regressed.append(name)
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--db', default='bench.db', help='dataset built by datagen.py')
+    parser.add_argument('--live', metavar='URL', help='benchmark a running server instead of in-process')
+    parser.add_argument('--serve', metavar='MODES',
+                        help=f"start and benchmark the server in each of: {', '.join(SERVER_MODES)}")
+    parser.add_argument('--workers', type=int, default=DEFAULT_SERVER_WORKERS,
+                        help='worker processes for --serve (default %(default)s)')
+    parser.add_argument('--idle-streams', type=int, default=0, metavar='N',
+                        help='SSE connections to hold open during --live/--serve runs')
+    parser.add_argument('--timeout', type=float,
+                        help=f'per-request timeout in seconds for --live/--serve runs (default '
+                             f'{DEFAULT_TIMEOUT}, or {IDLE_STREAMS_TIMEOUT} with --idle-streams)')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='timed requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP, help='untimed requests per client')
+    parser.add_argument('--endpoints', help=f"comma-separated subset of: {', '.join(ENDPOINTS)}")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--compare', metavar='JSON', help='results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='p95 ratio counted as a regression (default %(default)s)')
+    args = parser.parse_args(argv)
+
+    names = args.endpoints.split(',') if args.endpoints else list(ENDPOINTS)
+    unknown = [name for name in names if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+
+    modes = args.serve.split(',') if args.serve else []
+    if any(mode not in SERVER_MODES for mode in modes):
+        parser.error(f"--serve takes a comma-separated list of: {', '.join(SERVER_MODES)}")
+    if args.idle_streams and not (args.live or modes):
+        parser.error('--idle-streams needs --live or --serve')
+    if args.timeout is None:
+        args.timeout = IDLE_STREAMS_TIMEOUT if args.idle_streams else DEFAULT_TIMEOUT
+
+    data = Dataset(args.db)
+    servers = {}
+    if modes:
+        for mode in modes:
+            with running_server(mode, args.db, args.workers) as url:
+                with idle_streams(url, args.idle_streams, data):
+                    servers[mode] = run_endpoints(
+                        names, lambda: HTTPTransport(url, args.timeout), data, args)
+            print(f'\n{mode} server ({args.workers} workers, {args.idle_streams} idle streams)')
+            print_results(servers[mode])
+        if len(modes) > 1:
+            print(f'\n{modes[-1]} compared with {modes[0]}')
+            compare(servers[modes[-1]], {'results': servers[modes[0]]}, args.threshold)
+        results = servers[modes[-1]]
+    elif args.live:
+        with idle_streams(args.live, args.idle_streams, data):
+            results = run_endpoints(names, lambda: HTTPTransport(args.live, args.timeout), data, args)
+        print_results(results)
+    else:
+        results = run_endpoints(names, _in_process_transport(args.db), data, args)
+        print_results(results)
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'mode': 'serve' if modes else 'live' if args.live else 'test-client',
+            'target': args.live,
+            'servers': modes,
+            'workers': args.workers if modes else None,
+            'idle_streams': args.idle_streams,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'dataset': data.counts,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    if servers:
+        # results holds the last mode's, for --compare
+        report['server_results'] = servers
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('dataset') != data.counts:
+            print('\n⚠️ Baseline was taken on a different dataset')
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
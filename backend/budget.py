@@ -0,0 +1,500 @@
+"""
+Budget basket optimizer.
+
+Given a shopping list (item name, quantity, acceptable substitutes, optional
+priority) and a budget, picks which wholesaler's product to buy for every
+item: the cheapest basket overall, counting each extra supplier as costing
+supplierCost rupees (deliveries, trips), optionally capped at maxSuppliers.
+
+Every in-stock offer of an approved wholesaler is kept in an OfferBook of
+NumPy arrays grouped by normalized product name. The book is built once per
+process and rebuilt only when the products or wholesalers data version
+changes, so a product write invalidates it on every worker. A request then
+gathers its candidate offers with array indexing, prices them (group-buy
+eligible products at the tier their open pool would reach with this
+quantity), and reduces them to an items x suppliers cost matrix. Suppliers
+are chosen on that matrix by greedy addition then removal, the usual
+facility-location heuristic; if the basket still costs more than the budget,
+a bounded knapsack over item units decides what to buy, maximizing the share
+of each item bought weighted by its priority.
+
+Requires NumPy; without it the optimizer reports itself unavailable.
+"""
+
+import math
+import threading
+import time
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: no basket optimizer without it
+    np = None
+
+import group_buy
+from cache import table_versions
+
+MAX_ITEMS = 500
+MAX_SUBSTITUTES = 10
+MAX_QUANTITY = 10000
+DEFAULT_SUPPLIER_COST = 25.0
+# Budget resolution of the knapsack; costs are rounded up to whole steps, so
+# the basket it picks never goes over the budget
+KNAPSACK_STEPS = 4096
+# Lines around the greedy break point that the knapsack decides
+CORE_LINES = 32
+# Suppliers whose savings are recomputed together in the greedy search
+LAZY_BATCH = 32
+# Added to substitutes' costs so they only win on a lower price
+SUBSTITUTE_TIE = 1e-6
+# Tables whose writes invalidate the offer book
+BOOK_TABLES = ('products', 'wholesalers')
+
+Item = namedtuple('Item', 'name quantity substitutes priority')
+
+_book = None
+_book_lock = threading.Lock()
+
+
+class BudgetError(Exception):
+    """A shopping list that cannot be optimized, with a client-facing message."""
+
+
+def available():
+    return np is not None
+
+
+def normalize(name):
+    return ' '.join(name.lower().split())
+
+
+def _number(value, name, minimum=0.0):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise BudgetError(f'{name} must be a number')
+    if not math.isfinite(number) or number < minimum:
+        raise BudgetError(f'{name} must be at least {minimum:g}')
+    return number
+
+
+def parse_request(data):
+    """(items, budget, supplier cost, max suppliers) from a request body; raises BudgetError."""
+    if not isinstance(data, dict):
+        raise BudgetError('Expected a JSON object')
+    entries = data.get('items')
+    if not isinstance(entries, list) or not entries:
+        raise BudgetError('items must be a non-empty list')
+    if len(entries) > MAX_ITEMS:
+        raise BudgetError(f'At most {MAX_ITEMS} items per list')
+
+    items = []
+    for entry in entries:
+        name = entry.get('name') if isinstance(entry, dict) else None
+        if not isinstance(name, str) or not name.strip():
+            raise BudgetError('Each item needs a name')
+        try:
+            quantity = int(entry.get('quantity', 1))
+        except (TypeError, ValueError):
+            raise BudgetError('quantity must be an integer')
+        if not 1 <= quantity <= MAX_QUANTITY:
+            raise BudgetError(f'quantity must be between 1 and {MAX_QUANTITY}')
+        substitutes = entry.get('substitutes') or []
+        if not isinstance(substitutes, list) or not all(isinstance(s, str) for s in substitutes):
+            raise BudgetError('substitutes must be a list of product names')
+        if len(substitutes) > MAX_SUBSTITUTES:
+            raise BudgetError(f'At most {MAX_SUBSTITUTES} substitutes per item')
+        priority = _number(entry.get('priority', 1), 'priority', minimum=0.001)
+        items.append(Item(name.strip(), quantity, [s.strip() for s in substitutes if s.strip()],
+                          priority))
+
+    budget = _number(data.get('budget'), 'budget', minimum=0.01)
+    supplier_cost = _number(data.get('supplierCost', DEFAULT_SUPPLIER_COST), 'supplierCost')
+    max_suppliers = data.get('maxSuppliers')
+    if max_suppliers is not None:
+        try:
+            max_suppliers = int(max_suppliers)
+        except (TypeError, ValueError):
+            raise BudgetError('maxSuppliers must be an integer')
+        if max_suppliers < 1:
+            raise BudgetError('maxSuppliers must be at least 1')
+    return items, budget, supplier_cost, max_suppliers
+
+
+class OfferBook:
+    """Every in-stock offer of approved wholesalers, as arrays grouped by product name."""
+
+    def __init__(self, conn, versions):
+        self.versions = versions
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        self.supplier_names = dict(cursor.execute(
+            'SELECT id, name FROM wholesalers WHERE is_approved = 1').fetchall())
+        # A plain scan of products is twice as fast as walking the join per
+        # wholesaler; approval, stock and price are filtered on the arrays
+        rows = cursor.execute('''
+            SELECT id, COALESCE(name, ''), COALESCE(price, 0), COALESCE(stock, 0),
+                   COALESCE(group_buy_eligible, 0), COALESCE(wholesaler_id, 0)
+            FROM products
+        ''').fetchall()
+        product_ids, names, prices, stocks, eligible, wholesaler_ids = zip(*rows) if rows else ((),) * 6
+        count = len(rows)
+
+        # Names repeat across wholesalers, so each distinct one is normalized once
+        self.codes, code_of = {}, {}
+        for name in set(names):
+            code_of[name] = self.codes.setdefault(normalize(name), len(self.codes))
+        codes = np.fromiter(map(code_of.__getitem__, names), np.int64, count)
+        price = np.array(prices, np.float64)
+        stock = np.array(stocks, np.int64)
+        wholesaler = np.array(wholesaler_ids, np.int64)
+        keep = (price > 0) & (stock > 0) & np.isin(wholesaler, list(self.supplier_names))
+
+        # Offers sorted by name code; those of code c are starts[c]:starts[c + 1]
+        order = np.flatnonzero(keep)
+        order = order[np.argsort(codes[order], kind='stable')]
+        self.starts = np.searchsorted(codes[order], np.arange(len(self.codes) + 1))
+        self.product_id = np.array(product_ids, np.int64)[order]
+        self.price = price[order]
+        self.stock = stock[order]
+        self.eligible = np.array(eligible, bool)[order]
+        self.supplier_ids, self.supplier = np.unique(wholesaler[order], return_inverse=True)
+        # Display names stay in scan order; rows maps an offer back to them
+        self.rows, self._names = order, names
+        self.tiers = {}
+        for product_id, min_quantity, percent in conn.execute('''
+            SELECT product_id, min_quantity, discount_percent FROM group_buy_tiers
+            ORDER BY product_id, min_quantity
+        '''):
+            self.tiers.setdefault(product_id, []).append((min_quantity, percent))
+        self.custom_tiers = np.isin(self.product_id, list(self.tiers))
+        self.by_product = np.argsort(self.product_id)
+
+    def name(self, offer):
+        return self._names[self.rows[offer]]
+
+    def offer_mask(self, product_ids):
+        """Offers of ``product_ids``, as a boolean array over the book."""
+        product_ids = np.array(list(product_ids), np.int64)
+        ordered = self.product_id[self.by_product]
+        at = np.minimum(np.searchsorted(ordered, product_ids), max(len(ordered) - 1, 0))
+        mask = np.zeros(len(ordered), bool)
+        if len(ordered):
+            mask[self.by_product[at[ordered[at] == product_ids]]] = True
+        return mask
+
+    def group_prices(self, offers, quantities, pooled):
+        """Unit prices at the tier each offer's pool reaches with ``quantities`` more."""
+        base = self.price[offers]
+        reached = pooled + quantities
+        prices = np.round(base * (1 - _tier_discounts(reached) / 100), 2)
+        if self.tiers:
+            product_ids = self.product_id[offers]
+            for k in np.flatnonzero(np.isin(product_ids, list(self.tiers))).tolist():
+                prices[k] = group_buy.tier_price(base[k], self.tiers[int(product_ids[k])],
+                                                 int(reached[k]))[0]
+        return prices
+
+
+def offer_book(conn):
+    """The current OfferBook, rebuilt if products or wholesalers were written."""
+    global _book
+    versions = table_versions(conn, BOOK_TABLES)
+    book = _book
+    if book is not None and book.versions == versions:
+        return book
+    with _book_lock:
+        # Another thread may have built it while this one waited
+        if _book is None or _book.versions != versions:
+            _book = OfferBook(conn, versions)
+        return _book
+
+
+def _open_pools(conn, location):
+    """{product_id: pooled quantity} of the open pools at ``location``."""
+    if not location:
+        return {}
+    return dict(conn.execute('''
+        SELECT product_id, total_quantity FROM group_pools
+        WHERE status = 'open' AND location = ?
+    ''', (location,)).fetchall())
+
+
+def _tier_discounts(quantities):
+    """Default group-buy discount percent at each pooled quantity."""
+    mins, percents = (np.array(column) for column in zip(*group_buy.DEFAULT_TIERS))
+    return percents[np.searchsorted(mins, quantities, side='right') - 1]
+
+
+def _pooled(book, offers, pools):
+    pooled = np.zeros(len(offers), np.int64)
+    if pools:
+        pool_ids = np.array(sorted(pools), np.int64)
+        totals = np.array([pools[product_id] for product_id in pool_ids.tolist()], np.int64)
+        product_ids = book.product_id[offers]
+        at = np.minimum(np.searchsorted(pool_ids, product_ids), len(pool_ids) - 1)
+        found = pool_ids[at] == product_ids
+        pooled[found] = totals[at[found]]
+    return pooled
+
+
+def _candidates(book, items, quantities, pools):
+    """Arrays describing every offer of an item's names, priced for its quantity.
+
+    Offers without enough stock for the item are flagged rather than removed.
+    """
+    pair_item, pair_code, pair_substitute = [], [], []
+    for index, item in enumerate(items):
+        seen = set()
+        for rank, name in enumerate([item.name] + item.substitutes):
+            code = book.codes.get(normalize(name))
+            if code is not None and code not in seen:
+                seen.add(code)
+                pair_item.append(index)
+                pair_code.append(code)
+                pair_substitute.append(rank > 0)
+    pair_code = np.array(pair_code, np.int64)
+    first = book.starts[pair_code]
+    counts = book.starts[pair_code + 1] - first
+    # Concatenates every pair's slice of the book without a Python loop
+    offer = np.repeat(first - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+    item = np.repeat(np.array(pair_item, np.int64), counts)
+    substitute = np.repeat(np.array(pair_substitute, bool), counts)
+    in_stock = book.stock[offer] >= quantities[item]
+
+    # Without a pool or tiers of its own, an offer's group-buy tier only
+    # depends on the item's quantity; the rest are priced one by one
+    unit = book.price[offer]
+    group_price = np.round(unit * (1 - _tier_discounts(quantities)[item] / 100), 2)
+    special = book.custom_tiers[offer]
+    if pools:
+        special |= book.offer_mask(pools)[offer]
+    special = np.flatnonzero(special & book.eligible[offer])
+    if len(special):
+        group_price[special] = book.group_prices(offer[special], quantities[item[special]],
+                                                 _pooled(book, offer[special], pools))
+    group = book.eligible[offer] & (group_price < unit)
+    unit = np.where(group, group_price, unit)
+
+    matched = np.zeros(len(items), bool)
+    matched[pair_item] = True
+    return offer, item, substitute, unit, group, in_stock, matched
+
+
+def choose_suppliers(costs, supplier_cost, max_suppliers=None):
+    """Columns of an items x suppliers cost matrix to buy from.
+
+    Greedily adds the supplier that saves the most until no addition saves
+    more than supplier_cost (or max_suppliers is reached), then drops any
+    supplier whose items the others sell for less than supplier_cost more.
+    Items no supplier sells count as very expensive, so covering them comes
+    before any saving.
+    """
+    n_items, n_suppliers = costs.shape
+    limit = n_suppliers if max_suppliers is None else min(max_suppliers, n_suppliers)
+    finite = costs[np.isfinite(costs)]
+    best = np.full(n_items, finite.sum() + supplier_cost + 1)
+    by_supplier = np.ascontiguousarray(costs.T)
+    # A supplier's saving only shrinks as others are added, so stale savings
+    # are upper bounds: refresh the highest few at a time until the best
+    # fresh one beats every bound
+    bound = np.maximum(best[:, None] - costs, 0).sum(axis=0)
+    chosen = []
+    while len(chosen) < limit:
+        top = np.argsort(bound)[-LAZY_BATCH:]
+        bound[top] = np.maximum(best - by_supplier[top], 0).sum(axis=1)
+        bound[chosen] = -np.inf
+        column = int(top[bound[top].argmax()])
+        if bound[column] < bound.max():
+            continue
+        if bound[column] <= supplier_cost:
+            break
+        chosen.append(column)
+        bound[column] = -np.inf
+        best = np.minimum(best, by_supplier[column])
+
+    chosen = np.array(chosen, np.int64)
+    while len(chosen) > 1:
+        selected = costs[:, chosen]
+        cheapest = np.partition(selected, 1, axis=1)
+        with np.errstate(invalid='ignore'):
+            extra = cheapest[:, 1] - cheapest[:, 0]
+        # Items none of them sell are unaffected; items only one sells are not given up
+        extra[~np.isfinite(cheapest[:, 0])] = 0
+        increase = np.bincount(selected.argmin(axis=1), weights=extra, minlength=len(chosen))
+        drop = int(increase.argmin())
+        if increase[drop] > supplier_cost:
+            break
+        chosen = np.delete(chosen, drop)
+    return chosen
+
+
+def _knapsack(unit_costs, quantities, values, budget):
+    """Units of each line to buy: an exact bounded knapsack over budget steps.
+
+    Each line's units are split into pieces of 1, 2, 4, ... so every count up
+    to its quantity is a sum of pieces, and the pieces are packed as a 0/1
+    knapsack over KNAPSACK_STEPS budget steps, one vectorized pass per piece.
+    """
+    units = np.zeros(len(quantities), np.int64)
+    if budget <= 0 or not len(quantities):
+        return units
+    step = budget / KNAPSACK_STEPS
+    piece_line, piece_size = [], []
+    for line, quantity in enumerate(quantities.tolist()):
+        size = 1
+        while quantity > 0:
+            piece_line.append(line)
+            piece_size.append(min(size, quantity))
+            quantity -= size
+            size *= 2
+    piece_line = np.array(piece_line, np.int64)
+    piece_size = np.array(piece_size, np.int64)
+    weights = np.ceil(piece_size * unit_costs[piece_line] / step).astype(np.int64)
+    piece_values = piece_size * values[piece_line]
+
+    # best[b]: most value within b steps
+    best = np.zeros(KNAPSACK_STEPS + 1)
+    taken = np.zeros((len(piece_line), KNAPSACK_STEPS + 1), bool)
+    for piece, (weight, value) in enumerate(zip(weights.tolist(), piece_values.tolist())):
+        if weight > KNAPSACK_STEPS:
+            continue
+        candidate = best[:KNAPSACK_STEPS + 1 - weight] + value
+        taken[piece, weight:] = candidate > best[weight:]
+        np.maximum(best[weight:], candidate, out=best[weight:])
+
+    remaining = KNAPSACK_STEPS
+    for piece in range(len(piece_line) - 1, -1, -1):
+        if taken[piece, remaining]:
+            units[piece_line[piece]] += piece_size[piece]
+            remaining -= weights[piece]
+    return units
+
+
+def fit_budget(unit_costs, quantities, values, budget):
+    """Units of each line to buy, maximizing value within budget.
+
+    Lines are ranked by value per rupee. Those the greedy solution buys whole
+    well before the budget runs out are kept, those well after it dropped,
+    and only the CORE_LINES around the break are solved by _knapsack(), so
+    its budget steps stay fine. Budget still left is then spent on the
+    core and later lines in rank order.
+    """
+    order = np.argsort(-(values / unit_costs), kind='stable')
+    line_costs = unit_costs * quantities
+    whole = int(np.searchsorted(np.cumsum(line_costs[order]), budget, side='right'))
+    low, high = max(whole - CORE_LINES // 2, 0), whole + CORE_LINES // 2
+    fixed, core = order[:low], order[low:high]
+
+    units = np.zeros(len(quantities), np.int64)
+    units[fixed] = quantities[fixed]
+    remaining = budget - line_costs[fixed].sum()
+    units[core] = _knapsack(unit_costs[core], quantities[core], values[core], remaining)
+    remaining -= (unit_costs[core] * units[core]).sum()
+    # Including what rounding to budget steps left unspent in the core
+    for line in order[low:].tolist():
+        count = min(int(quantities[line] - units[line]), int(remaining // unit_costs[line]))
+        if count > 0:
+            units[line] += count
+            remaining -= count * unit_costs[line]
+    return units
+
+
+def optimize(conn, items, budget, supplier_cost=DEFAULT_SUPPLIER_COST, max_suppliers=None,
+             location=None):
+    """The cheapest basket for ``items`` within ``budget``; see the module docstring."""
+    started = time.perf_counter()
+    book = offer_book(conn)
+    pools = _open_pools(conn, location)
+    quantities = np.array([item.quantity for item in items], np.int64)
+    offer, item, substitute, unit, group, in_stock, matched = _candidates(book, items, quantities,
+                                                                         pools)
+
+    # Cheapest offer per (item, supplier): the cost matrix and its winners
+    n_items, n_suppliers = len(items), len(book.supplier_ids)
+    cell = item * n_suppliers + book.supplier[offer]
+    key = np.where(in_stock, unit * quantities[item] + substitute * SUBSTITUTE_TIE, np.inf)
+    cheapest = np.full(n_items * n_suppliers, np.inf)
+    np.minimum.at(cheapest, cell, key)
+    winner = np.full(n_items * n_suppliers, -1, np.int64)
+    hit = np.flatnonzero((key == cheapest[cell]) & in_stock)
+    winner[cell[hit]] = hit
+    columns = np.flatnonzero(np.isfinite(cheapest.reshape(n_items, n_suppliers)).any(axis=0))
+    costs = cheapest.reshape(n_items, n_suppliers)[:, columns]
+    winners = winner.reshape(n_items, n_suppliers)[:, columns]
+
+    # The average unit price of each item's offers, to show what was saved
+    counts = np.bincount(item, weights=in_stock, minlength=n_items)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        typical = np.bincount(item, weights=unit * in_stock, minlength=n_items) / counts
+
+    chosen = choose_suppliers(costs, supplier_cost, max_suppliers)
+    line_offer = np.full(n_items, -1, np.int64)
+    if len(chosen):
+        picked = costs[:, chosen].argmin(axis=1)
+        line_offer = winners[:, chosen][np.arange(n_items), picked]
+    lines = np.flatnonzero(line_offer >= 0)
+    candidate = line_offer[lines]
+
+    units = quantities[lines]
+    if (unit[candidate] * units).sum() > budget:
+        # Partial quantities may fall below a group-buy tier, so the
+        # knapsack prices those lines at the regular price
+        regular = np.where(group[candidate], book.price[offer[candidate]], unit[candidate])
+        values = np.array([items[i].priority for i in lines.tolist()]) / units
+        units = fit_budget(regular, units, values, budget)
+
+    unavailable = [{
+        'name': items[line].name,
+        'reason': ('Not sold by the chosen suppliers' if counts[line]
+                   else 'No wholesaler has enough in stock' if matched[line]
+                   else 'No matching products'),
+    } for line in np.flatnonzero(line_offer < 0).tolist()]
+    basket, suppliers = [], {}
+    for line, index, count in zip(lines.tolist(), candidate.tolist(), units.tolist()):
+        if count == 0:
+            unavailable.append({'name': items[line].name, 'reason': 'Over budget'})
+            continue
+        offer_index = offer[index:index + 1]
+        unit_price, group_buy_price = float(unit[index]), bool(group[index])
+        if group_buy_price and count < items[line].quantity:
+            regular = float(book.price[offer_index][0])
+            partial = float(book.group_prices(offer_index, np.array([count]),
+                                              _pooled(book, offer_index, pools))[0])
+            unit_price, group_buy_price = min(partial, regular), partial < regular
+        offer_index = int(offer_index[0])
+        wholesaler_id = int(book.supplier_ids[book.supplier[offer_index]])
+        cost = round(unit_price * count, 2)
+        basket.append({
+            'name': items[line].name,
+            'productId': int(book.product_id[offer_index]),
+            'productName': book.name(offer_index),
+            'wholesalerId': wholesaler_id,
+            'wholesaler': book.supplier_names[wholesaler_id],
+            'quantity': count,
+            'requestedQuantity': items[line].quantity,
+            'unitPrice': round(unit_price, 2),
+            'cost': cost,
+            'groupBuy': group_buy_price,
+            'substitute': bool(substitute[index]),
+            'estimatedSavings': round(max(float(typical[line]) - unit_price, 0) * count, 2),
+        })
+        supplier = suppliers.setdefault(wholesaler_id, {
+            'wholesalerId': wholesaler_id, 'name': book.supplier_names[wholesaler_id],
+            'itemCount': 0, 'subtotal': 0.0,
+        })
+        supplier['itemCount'] += 1
+        supplier['subtotal'] = round(supplier['subtotal'] + cost, 2)
+
+    total = round(sum(line['cost'] for line in basket), 2)
+    return {
+        'budget': budget,
+        'totalCost': total,
+        'withinBudget': total <= budget,
+        'estimatedSavings': round(sum(line['estimatedSavings'] for line in basket), 2),
+        'supplierCount': len(suppliers),
+        'suppliers': sorted(suppliers.values(), key=lambda s: -s['subtotal']),
+        'items': basket,
+        'unavailable': unavailable,
+        'timeMs': round((time.perf_counter() - started) * 1000, 2),
+    }
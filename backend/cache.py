@@ -0,0 +1,183 @@
+"""
+In-process response cache with strong ETags for read-mostly endpoints.
+
+Entries are keyed by route, query string, response format and the current
+data version of every table the route reads. Triggers added by migration 5
+bump a table's version in data_versions on every insert, update or delete,
+so a write changes the key and stale entries are simply never looked up
+again; they age out through the TTL and LRU bound. Because the versions live
+in the database, this stays correct when several worker processes share it.
+
+Only plain JSON responses are cached. NDJSON and columnar pages can be a
+hundred times larger and pass straight through, and a streamed JSON body is
+buffered only up to MAX_ENTRY_BYTES; past that the rest is streamed on
+uncached, so the cache never holds a whole large response in memory.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from db import get_db
+from streaming import response_format
+
+DEFAULT_TTL = 60
+MAX_ENTRIES = 512
+# Bigger bodies are streamed through uncached
+MAX_ENTRY_BYTES = 1024 * 1024
+
+# Tables whose writes invalidate cached responses
+VERSIONED_TABLES = ('vendors', 'wholesalers', 'products', 'orders', 'reviews')
+
+
+class ResponseCache:
+    """Thread-safe LRU of (body, mimetype, etag) with per-entry expiry."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[3] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry
+
+    def put(self, key, body, mimetype, etag, ttl):
+        with self._lock:
+            self._entries[key] = (body, mimetype, etag, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self._stats['not_modified'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+def table_versions(conn, tables):
+    rows = conn.execute('SELECT table_name, version FROM data_versions').fetchall()
+    versions = dict(rows)
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+def _respond(body, mimetype, etag):
+    if request.if_none_match.contains(etag):
+        response_cache.record_not_modified()
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate it on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _replay(head, rest, source):
+    """Yield the chunks already read, then the rest; closes ``source`` at the end."""
+    try:
+        yield from head
+        yield from rest
+    finally:
+        close = getattr(source, 'close', None)
+        if close is not None:
+            close()
+
+
+def _read_body(response):
+    """The body of ``response`` if it fits in MAX_ENTRY_BYTES, else None.
+
+    A streamed body too big to cache is left streaming: the chunks read so
+    far are put back in front of the rest.
+    """
+    if not response.is_streamed:
+        body = response.get_data()
+        return body if len(body) <= MAX_ENTRY_BYTES else None
+    source = response.response
+    chunks, size = [], 0
+    rest = response.iter_encoded()
+    for chunk in rest:
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > MAX_ENTRY_BYTES:
+            response.response = _replay(chunks, rest, source)
+            return None
+    return b''.join(chunks)
+
+
+def cached(*tables, ttl=DEFAULT_TTL):
+    """Cache a GET view's 200 JSON responses until one of ``tables`` is written."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if response_format() != 'json':
+                return view(*args, **kwargs)
+            versions = table_versions(get_db(), tables) if tables else ()
+            key = (request.path, tuple(sorted(request.args.items(multi=True))), versions)
+
+            entry = response_cache.get(key)
+            if entry is not None:
+                return _respond(*entry[:3])
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = _read_body(response)
+            if body is None:
+                return response
+            etag = hashlib.sha256(body).hexdigest()[:32]
+            response_cache.put(key, body, response.mimetype, etag, ttl)
+            return _respond(body, response.mimetype, etag)
+        return wrapper
+    return decorator
+
+
+def version_trigger_statements(tables=VERSIONED_TABLES):
+    """DDL for the data_versions table and the triggers that bump it."""
+    statements = ['''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''']
+    for table in tables:
+        statements.append(
+            f"INSERT OR IGNORE INTO data_versions (table_name, version) VALUES ('{table}', 0)")
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            statements.append(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+                END
+            ''')
+    return statements
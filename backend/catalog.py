@@ -0,0 +1,193 @@
+"""
+Product catalog queries: filtering, sorting and keyset pagination.
+
+Pages are addressed by an opaque cursor holding the sort value and id of the
+last row served, so fetching page N costs the same as fetching page 1 instead
+of growing with an OFFSET.
+"""
+
+import base64
+import json
+
+from streaming import BATCH_SIZE
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# NDJSON and columnar pages are encoded in batches, so they may be much larger
+MAX_STREAM_PAGE_SIZE = 10000
+
+# sortBy value -> (column, direction). Every order is made total by p.id so
+# the cursor always points at exactly one position.
+SORT_KEYS = {
+    'default': ('p.id', 'ASC'),
+    'name': ('p.name', 'ASC'),
+    'price': ('p.price', 'ASC'),
+    'price-low': ('p.price', 'ASC'),
+    'price-high': ('p.price', 'DESC'),
+    # estimatedSavings is a fixed share of price, so it sorts the same way
+    'savings': ('p.price', 'DESC'),
+    # The Budget page's default sortBy
+    'discount': ('p.price', 'DESC'),
+}
+
+# products.status is derived from stock using this threshold
+LOW_STOCK_THRESHOLD = 50
+
+# Queries selecting these join wholesalers w and LEFT JOIN wholesaler_ratings r
+PRODUCT_COLUMNS = '''
+    p.id, p.wholesaler_id, p.name, p.category, p.price, p.stock,
+    p.group_buy_eligible, p.image_path, p.views, p.likes, p.status,
+    p.created_at, w.name AS wholesaler_name, r.review_count, r.rating_sum
+'''
+
+
+def stock_status(stock):
+    if stock <= 0:
+        return 'Out of Stock'
+    if stock < LOW_STOCK_THRESHOLD:
+        return 'Low Stock'
+    return 'In Stock'
+
+
+def stock_status_sql(stock):
+    """SQL expression computing stock_status() of the SQL expression ``stock``."""
+    return (f"CASE WHEN {stock} <= 0 THEN 'Out of Stock' "
+            f"WHEN {stock} < {LOW_STOCK_THRESHOLD} THEN 'Low Stock' ELSE 'In Stock' END")
+
+
+def encode_cursor(sort_value, row_id):
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        row_id = int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    # Anything else would fail when bound as a query parameter
+    if sort_value is not None and not isinstance(sort_value, (str, int, float)):
+        raise ValueError('Invalid cursor')
+    return sort_value, row_id
+
+
+def parse_product_filters(args, max_limit=MAX_PAGE_SIZE):
+    """Validate query-string arguments into keyword arguments for product_page."""
+    sort_by = args.get('sortBy') or 'default'
+    if sort_by not in SORT_KEYS:
+        sort_by = 'default'
+
+    category = args.get('category')
+    if category in (None, '', 'all'):
+        category = None
+
+    max_budget = args.get('maxBudget')
+    if max_budget not in (None, ''):
+        try:
+            max_budget = float(max_budget)
+        except ValueError:
+            raise ValueError('maxBudget must be a number')
+    else:
+        max_budget = None
+
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    limit = max(1, min(limit, max_limit))
+
+    cursor = args.get('cursor') or None
+    if cursor is not None:
+        cursor = decode_cursor(cursor)
+
+    return {'sort_by': sort_by, 'category': category, 'max_budget': max_budget,
+            'limit': limit, 'cursor': cursor}
+
+
+def product_query(sort_by='default', category=None, max_budget=None, limit=DEFAULT_PAGE_SIZE,
+                  cursor=None):
+    """Build the SQL and parameters for one page of approved products.
+
+    One extra row is requested so the caller can tell whether a next page
+    exists without a COUNT query.
+    """
+    column, direction = SORT_KEYS[sort_by]
+    where = ['w.is_approved = 1']
+    params = []
+
+    if category is not None:
+        where.append('p.category = ?')
+        params.append(category)
+    if max_budget is not None:
+        where.append('p.price <= ?')
+        params.append(max_budget)
+    if cursor is not None:
+        comparison = '>' if direction == 'ASC' else '<'
+        if column == 'p.id':
+            where.append(f'p.id {comparison} ?')
+            params.append(cursor[1])
+        else:
+            # Row-value comparison lets SQLite seek straight into the index
+            where.append(f'({column}, p.id) {comparison} (?, ?)')
+            params.extend(cursor)
+
+    order = f'p.id {direction}' if column == 'p.id' else f'{column} {direction}, p.id {direction}'
+    # CROSS JOIN pins products as the outer loop, so SQLite walks the sort
+    # index and stops after LIMIT rows instead of sorting every approved row
+    sql = f'''
+        SELECT {PRODUCT_COLUMNS}
+        FROM products p
+        CROSS JOIN wholesalers w ON p.wholesaler_id = w.id
+        LEFT JOIN wholesaler_ratings r ON r.wholesaler_id = p.wholesaler_id
+        WHERE {' AND '.join(where)}
+        ORDER BY {order}
+        LIMIT ?
+    '''
+    params.append(limit + 1)
+    return sql, params
+
+
+class Page:
+    """Iterates at most ``limit`` rows and records the cursor for the next page."""
+
+    def __init__(self, cursor, sort_by, limit):
+        self.cursor = cursor
+        self.sort_column = SORT_KEYS[sort_by][0].split('.', 1)[1]
+        self.limit = limit
+        self.next_cursor = None
+
+    @property
+    def column_names(self):
+        return [column[0] for column in self.cursor.description]
+
+    def batches(self, batch_size=BATCH_SIZE):
+        """The page's rows as lists of up to ``batch_size``, straight from the cursor."""
+        remaining, last = self.limit, None
+        while True:
+            rows = self.cursor.fetchmany(min(batch_size, remaining + 1))
+            if not rows:
+                return
+            if len(rows) > remaining:
+                # The extra row only proves there is more to fetch
+                rows = rows[:remaining]
+                last = rows[-1] if rows else last
+                self.next_cursor = encode_cursor(last[self.sort_column], last['id'])
+                if rows:
+                    yield rows
+                return
+            remaining -= len(rows)
+            last = rows[-1]
+            yield rows
+
+    def __iter__(self):
+        for rows in self.batches():
+            yield from rows
+
+
+def product_page(conn, sort_by='default', category=None, max_budget=None,
+                 limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """Lazily iterate one page of approved products; see Page."""
+    sql, params = product_query(sort_by, category, max_budget, limit, cursor)
+    return Page(conn.execute(sql, params), sort_by, limit)
@@ -0,0 +1,229 @@
+"""
+Bulk product import and export for wholesalers.
+
+Uploads are parsed straight off the request stream, one row at a time, and
+written in chunks of CHUNK_SIZE rows per short transaction with
+executemany. The upload is never held in memory as a whole, and in WAL mode
+readers of the products table keep going while a chunk commits. Rows that
+fail validation are skipped and reported back with their row number.
+
+Rows with an ``id`` update that product (only if it belongs to the
+importing wholesaler); rows without one are inserted.
+
+Per-row insert triggers (search index, data version) are the bulk of the
+cost of a large load, so while a chunk's transaction runs the importer sets
+bulk_load.active and does that work once per chunk with set-based SQL. The
+flag is only ever set inside the importer's own write transaction, so no
+other connection can observe it.
+"""
+
+import csv
+import io
+import json
+
+from catalog import stock_status
+from streaming import iter_cursor
+
+CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+CSV_MIMETYPE = 'text/csv'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+EXPORT_COLUMNS = ('id', 'name', 'category', 'price', 'stock', 'group_buy_eligible', 'status')
+
+_TRUE = {'1', 'true', 'yes', 'y'}
+_FALSE = {'0', 'false', 'no', 'n', ''}
+
+
+def _parse_bool(value, default=True):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError('group_buy_eligible must be true or false')
+
+
+def validate_row(row):
+    """Turn one raw CSV/NDJSON row into (id, name, category, price, stock, group_buy)."""
+    if not isinstance(row, dict):
+        raise ValueError('row must be an object')
+    name = (row.get('name') or '').strip()
+    if not name:
+        raise ValueError('name is required')
+    category = (row.get('category') or '').strip() or None
+    try:
+        price = float(row.get('price'))
+    except (TypeError, ValueError):
+        raise ValueError('price must be a number')
+    if price < 0:
+        raise ValueError('price must not be negative')
+    try:
+        stock = int(row.get('stock'))
+    except (TypeError, ValueError):
+        raise ValueError('stock must be an integer')
+    if stock < 0:
+        raise ValueError('stock must not be negative')
+    product_id = row.get('id')
+    if product_id in (None, ''):
+        product_id = None
+    else:
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            raise ValueError('id must be an integer')
+    group_buy = _parse_bool(row.get('group_buy_eligible'))
+    return product_id, name, category, price, stock, group_buy
+
+
+def _text_stream(stream):
+    return io.TextIOWrapper(io.BufferedReader(stream), encoding='utf-8-sig', newline='')
+
+
+def iter_upload(stream, mimetype):
+    """Yield (row_number, raw_row_or_error) from a CSV or NDJSON body."""
+    text = _text_stream(stream)
+    if mimetype == NDJSON_MIMETYPE:
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, ValueError('invalid JSON')
+    else:
+        # Row 1 is the header, so data rows are numbered as they appear in the file
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            yield number, row
+
+
+def bulk_load_statements():
+    """Migration steps letting the importer defer per-row insert triggers."""
+    return [
+        'CREATE TABLE IF NOT EXISTS bulk_load (active INTEGER NOT NULL)',
+        'INSERT INTO bulk_load (active) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM bulk_load)',
+        'DROP TRIGGER IF EXISTS trg_products_search_insert',
+        '''
+        CREATE TRIGGER trg_products_search_insert AFTER INSERT ON products
+        WHEN NOT (SELECT active FROM bulk_load)
+        BEGIN
+            INSERT INTO product_search (rowid, name, category, wholesaler)
+            VALUES (new.id, new.name, new.category,
+                    (SELECT name FROM wholesalers WHERE id = new.wholesaler_id));
+        END
+        ''',
+        'DROP TRIGGER IF EXISTS trg_products_version_insert',
+        '''
+        CREATE TRIGGER trg_products_version_insert AFTER INSERT ON products
+        WHEN NOT (SELECT active FROM bulk_load)
+        BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE table_name = 'products';
+        END
+        ''',
+    ]
+
+
+def _write_chunk(conn, wholesaler_id, inserts, updates):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if inserts:
+            first_new_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM products').fetchone()[0]
+            conn.execute('UPDATE bulk_load SET active = 1')
+            conn.executemany('''
+                INSERT INTO products (wholesaler_id, name, category, price, stock, group_buy_eligible, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', ((wholesaler_id, name, category, price, stock, group_buy, stock_status(stock))
+                  for _, name, category, price, stock, group_buy in inserts))
+            # What the deferred insert triggers would have done, once per chunk
+            conn.execute('''
+                INSERT INTO product_search (rowid, name, category, wholesaler)
+                SELECT p.id, p.name, p.category, w.name
+                FROM products p LEFT JOIN wholesalers w ON p.wholesaler_id = w.id
+                WHERE p.id >= ?
+            ''', (first_new_id,))
+            conn.execute("UPDATE data_versions SET version = version + 1 WHERE table_name = 'products'")
+            conn.execute('UPDATE bulk_load SET active = 0')
+        cursor = conn.executemany('''
+            UPDATE products
+            SET name = ?, category = COALESCE(?, category), price = ?, stock = ?,
+                group_buy_eligible = ?, status = ?
+            WHERE id = ? AND wholesaler_id = ?
+        ''', ((name, category, price, stock, group_buy, stock_status(stock), product_id, wholesaler_id)
+              for product_id, name, category, price, stock, group_buy in updates))
+        updated = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return updated
+
+
+def import_products(conn, wholesaler_id, rows):
+    """Validate and write rows from iter_upload; returns a summary dict."""
+    summary = {'imported': 0, 'updated': 0, 'failed': 0, 'errors': []}
+    inserts, updates = [], []
+
+    def fail(number, message):
+        summary['failed'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'row': number, 'error': message})
+
+    def flush():
+        updated = _write_chunk(conn, wholesaler_id, inserts, updates)
+        summary['imported'] += len(inserts)
+        summary['updated'] += updated
+        missing = len(updates) - updated
+        if missing:
+            summary['failed'] += missing
+            if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                summary['errors'].append({
+                    'row': None,
+                    'error': f'{missing} rows referenced products that are not yours'
+                })
+        inserts.clear()
+        updates.clear()
+
+    for number, row in rows:
+        if isinstance(row, Exception):
+            fail(number, str(row))
+            continue
+        try:
+            product = validate_row(row)
+        except ValueError as e:
+            fail(number, str(e))
+            continue
+        (updates if product[0] is not None else inserts).append(product)
+        if len(inserts) + len(updates) >= CHUNK_SIZE:
+            flush()
+    if inserts or updates:
+        flush()
+    return summary
+
+
+def export_rows(conn, wholesaler_id):
+    cursor = conn.execute(f'''
+        SELECT {', '.join(EXPORT_COLUMNS)} FROM products
+        WHERE wholesaler_id = ? ORDER BY id
+    ''', (wholesaler_id,))
+    return iter_cursor(cursor)
+
+
+def csv_chunks(rows, batch_size=1000):
+    """Encode rows as CSV text, a header first and then batch_size rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(tuple(row))
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,317 @@
+"""
+Cart checkout with stock reservations.
+
+A checkout takes the whole cart in one short write transaction: each line's
+stock is decremented by a conditional UPDATE that only succeeds while enough
+is left, so concurrent checkouts of the same hot product can never oversell
+it; lines that cannot be filled are reported individually and the rest go
+through. Status is recomputed from stock in the same statement.
+
+A cart can also be reserved first: the stock is taken off the shelf and
+held for RESERVATION_MINUTES while the vendor pays, then confirmed into
+orders. Reservations that are released or run out put their stock back;
+expired ones are swept in one set-based pass by a background job.
+
+Paying with Pay Later draws the order total from the vendor's credit in the
+same transaction, so a refused draw leaves stock and orders untouched.
+"""
+
+from catalog import stock_status_sql
+import credit
+import events
+import jobs
+
+RESERVATION_MINUTES = 10
+SWEEP_INTERVAL = 30
+MAX_LINES = 100
+MAX_QUANTITY = 10000
+PAYMENT_METHODS = ('cod', 'upi', 'pay_later')
+
+
+def checkout_statements():
+    """Migration steps for derived stock status and stock reservations."""
+    return [
+        # Repair any drift, then keep status derived from stock for writers
+        # that change stock without setting it
+        f"UPDATE products SET status = {stock_status_sql('stock')} WHERE status IS NOT {stock_status_sql('stock')}",
+        # A stale status is corrected by the trigger below, whose own update
+        # is the one announced
+        'DROP TRIGGER IF EXISTS trg_products_event_update',
+        events.product_event_trigger(f"new.status IS {stock_status_sql('new.stock')}"),
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_products_derive_status
+        AFTER UPDATE OF stock, status ON products
+        WHEN new.status IS NOT {stock_status_sql('new.stock')}
+        BEGIN
+            UPDATE products SET status = {stock_status_sql('new.stock')} WHERE id = new.id;
+        END
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stock_reservations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vendor_id INTEGER NOT NULL REFERENCES vendors (id),
+            status TEXT NOT NULL DEFAULT 'held',
+            expires_at DATETIME NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # The expiry sweep only touches held reservations past their deadline
+        '''
+        CREATE INDEX IF NOT EXISTS idx_stock_reservations_expiry
+        ON stock_reservations (expires_at) WHERE status = 'held'
+        ''',
+        # Reservations mid-release; empty outside a releasing transaction
+        '''
+        CREATE INDEX IF NOT EXISTS idx_stock_reservations_releasing
+        ON stock_reservations (id) WHERE status = 'releasing'
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stock_reservation_lines (
+            reservation_id INTEGER NOT NULL REFERENCES stock_reservations (id),
+            product_id INTEGER NOT NULL REFERENCES products (id),
+            wholesaler_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            unit_price REAL NOT NULL,
+            PRIMARY KEY (reservation_id, product_id)
+        ) WITHOUT ROWID
+        ''',
+        'ALTER TABLE orders ADD COLUMN reservation_id INTEGER REFERENCES stock_reservations (id)',
+        'CREATE INDEX IF NOT EXISTS idx_orders_reservation ON orders (reservation_id) WHERE reservation_id IS NOT NULL',
+    ]
+
+
+class CheckoutError(Exception):
+    """A checkout request that cannot be honoured, with a client-facing message."""
+
+
+def parse_cart(items):
+    """[{product_id, quantity}, ...] to {product_id: quantity}, merging repeats."""
+    if not isinstance(items, list) or not items:
+        raise CheckoutError('items must be a non-empty list')
+    if len(items) > MAX_LINES:
+        raise CheckoutError(f'At most {MAX_LINES} lines per checkout')
+    cart = {}
+    for item in items:
+        try:
+            product_id = int(item['product_id'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise CheckoutError('Each item needs integer product_id and quantity')
+        if quantity <= 0:
+            raise CheckoutError('quantity must be positive')
+        cart[product_id] = cart.get(product_id, 0) + quantity
+        if cart[product_id] > MAX_QUANTITY:
+            raise CheckoutError(f'At most {MAX_QUANTITY} of one product per checkout')
+    return cart
+
+
+def _take_stock(conn, cart):
+    """Decrement stock line by line inside the caller's write transaction.
+
+    Returns (taken, failed): taken is [(product_id, wholesaler_id, quantity,
+    unit_price)], failed is a list of per-line problems.
+    """
+    taken, failed = [], []
+    for product_id, quantity in sorted(cart.items()):
+        product = conn.execute('''
+            SELECT p.wholesaler_id, p.price, p.stock
+            FROM products p JOIN wholesalers w ON w.id = p.wholesaler_id
+            WHERE p.id = ? AND w.is_approved = 1
+        ''', (product_id,)).fetchone()
+        if product is None:
+            failed.append({'productId': product_id, 'requested': quantity, 'available': 0,
+                           'message': 'Product not found'})
+            continue
+        # The write lock is held, but the condition keeps this safe on its own
+        updated = conn.execute(f'''
+            UPDATE products SET stock = stock - :quantity, status = {stock_status_sql('stock - :quantity')}
+            WHERE id = :id AND stock >= :quantity
+        ''', {'quantity': quantity, 'id': product_id}).rowcount
+        if updated:
+            taken.append((product_id, product['wholesaler_id'], quantity, product['price']))
+        else:
+            available = max(product['stock'], 0)
+            failed.append({'productId': product_id, 'requested': quantity, 'available': available,
+                           'message': f'Only {available} left' if available else 'Out of stock'})
+    return taken, failed
+
+
+def _pay(conn, vendor_id, payment_method, total, reference):
+    if payment_method == 'pay_later':
+        credit.draw_in_transaction(conn, vendor_id, credit.to_paise(total),
+                                   'Checkout', reference)
+
+
+def _insert_orders(conn, vendor_id, lines, reservation_id=None):
+    order_ids = []
+    for product_id, wholesaler_id, quantity, unit_price in lines:
+        order_ids.append(conn.execute('''
+            INSERT INTO orders (wholesaler_id, vendor_id, product_id, quantity, total_amount, reservation_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (wholesaler_id, vendor_id, product_id, quantity, round(quantity * unit_price, 2),
+              reservation_id)).lastrowid)
+    return order_ids
+
+
+def _total(lines):
+    return round(sum(round(quantity * unit_price, 2) for _, _, quantity, unit_price in lines), 2)
+
+
+def _validate_payment(payment_method):
+    if payment_method not in PAYMENT_METHODS:
+        raise CheckoutError(f'paymentMethod must be one of {", ".join(PAYMENT_METHODS)}')
+
+
+def checkout(conn, vendor_id, cart, payment_method='cod'):
+    """Place orders for every line of ``cart`` that can be filled.
+
+    Returns (order_ids, failed). Nothing is written if no line can be
+    filled or payment is refused.
+    """
+    _validate_payment(payment_method)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        taken, failed = _take_stock(conn, cart)
+        if not taken:
+            conn.rollback()
+            return [], failed
+        order_ids = _insert_orders(conn, vendor_id, taken)
+        _pay(conn, vendor_id, payment_method, _total(taken), f'orders:{order_ids[0]}-{order_ids[-1]}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return order_ids, failed
+
+
+def reserve(conn, vendor_id, cart):
+    """Hold stock for ``cart``; returns (reservation_id or None, failed)."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        taken, failed = _take_stock(conn, cart)
+        if not taken:
+            conn.rollback()
+            return None, failed
+        reservation_id = conn.execute(f'''
+            INSERT INTO stock_reservations (vendor_id, expires_at)
+            VALUES (?, datetime('now', '+{RESERVATION_MINUTES} minutes'))
+        ''', (vendor_id,)).lastrowid
+        conn.executemany('''
+            INSERT INTO stock_reservation_lines (reservation_id, product_id, wholesaler_id, quantity, unit_price)
+            VALUES (?, ?, ?, ?, ?)
+        ''', ((reservation_id, *line) for line in taken))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return reservation_id, failed
+
+
+def confirm(conn, vendor_id, reservation_id, payment_method='cod'):
+    """Turn a held reservation into orders at the prices it was reserved at."""
+    _validate_payment(payment_method)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        confirmed = conn.execute('''
+            UPDATE stock_reservations SET status = 'confirmed'
+            WHERE id = ? AND vendor_id = ? AND status = 'held' AND expires_at > datetime('now')
+        ''', (reservation_id, vendor_id)).rowcount
+        if not confirmed:
+            raise CheckoutError('Reservation not found or expired')
+        lines = conn.execute('''
+            SELECT product_id, wholesaler_id, quantity, unit_price
+            FROM stock_reservation_lines WHERE reservation_id = ?
+        ''', (reservation_id,)).fetchall()
+        order_ids = _insert_orders(conn, vendor_id, lines, reservation_id)
+        _pay(conn, vendor_id, payment_method, _total(lines), f'reservation:{reservation_id}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return order_ids
+
+
+def _release(conn, condition, params, status):
+    """Return the stock of held reservations matching ``condition``.
+
+    Must run inside the caller's write transaction. Like group-buy closing,
+    reservations are first marked 'releasing' so the restock and the final
+    status change work on exactly the same set.
+    """
+    releasing = conn.execute(f'''
+        UPDATE stock_reservations SET status = 'releasing'
+        WHERE status = 'held' AND {condition}
+    ''', params).rowcount
+    if releasing:
+        conn.execute(f'''
+            UPDATE products
+            SET stock = stock + held.quantity, status = {stock_status_sql('stock + held.quantity')}
+            FROM (
+                SELECT l.product_id, SUM(l.quantity) AS quantity
+                FROM stock_reservations r JOIN stock_reservation_lines l ON l.reservation_id = r.id
+                WHERE r.status = 'releasing'
+                GROUP BY l.product_id
+            ) AS held
+            WHERE products.id = held.product_id
+        ''')
+        conn.execute("UPDATE stock_reservations SET status = ? WHERE status = 'releasing'", (status,))
+    return releasing
+
+
+def release(conn, vendor_id, reservation_id):
+    """Cancel the vendor's held reservation and put its stock back."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        released = _release(conn, 'id = ? AND vendor_id = ?', (reservation_id, vendor_id), 'released')
+        if not released:
+            raise CheckoutError('Reservation not found or no longer held')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def expire_reservations(conn):
+    """Release every held reservation past its deadline; returns how many."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        expired = _release(conn, "expires_at <= datetime('now')", (), 'expired')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return expired
+
+
+@jobs.every(SWEEP_INTERVAL, name='reservation-sweep')
+def scheduled_sweep(conn):
+    expire_reservations(conn)
+
+
+def reservation_lines(conn, reservation_id):
+    return conn.execute('''
+        SELECT l.product_id, l.quantity, l.unit_price, p.name
+        FROM stock_reservation_lines l JOIN products p ON p.id = l.product_id
+        WHERE l.reservation_id = ?
+    ''', (reservation_id,)).fetchall()
+
+
+def serialize_orders(conn, order_ids):
+    if not order_ids:
+        return []
+    placeholders = ','.join('?' * len(order_ids))
+    rows = conn.execute(f'''
+        SELECT o.id, o.product_id, p.name, o.wholesaler_id, o.quantity, o.total_amount, o.status
+        FROM orders o JOIN products p ON p.id = o.product_id
+        WHERE o.id IN ({placeholders})
+        ORDER BY o.id
+    ''', order_ids).fetchall()
+    return [{
+        'id': row['id'],
+        'productId': row['product_id'],
+        'name': row['name'],
+        'wholesalerId': row['wholesaler_id'],
+        'quantity': row['quantity'],
+        'totalAmount': row['total_amount'],
+        'status': row['status']
+    } for row in rows]
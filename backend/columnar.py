@@ -0,0 +1,89 @@
+"""
+Columnar JSON encoding for large listings.
+
+Clients that send Accept: application/vnd.sahaayak.columnar+json get each
+field's name once and its values as one array, instead of an object per row
+that repeats every key:
+
+    {"items": {"count": 2,
+               "columns": ["id", "name", "category", ...],
+               "data": {"id": [1, 2], "name": ["Tomatoes", "Onions"],
+                        "category": [0, 0], ...},
+               "dictionaries": {"category": ["Vegetables"]}},
+     "nextCursor": "..."}
+
+Columns listed in "dictionaries" hold indexes into that list (or null), so
+repeated strings such as category and wholesaler names are sent once per
+page. Rows are transposed straight from cursor batches, derived fields are
+computed a column at a time, and each column is encoded with a single call
+to the C JSON encoder; no per-row dicts are built. Because every column must
+be complete before the next one starts, the body is sent when the page has
+been read rather than streamed.
+"""
+
+import json
+from collections import namedtuple
+
+from flask import Response
+
+from streaming import COLUMNAR_MIMETYPE
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+# name: field name in the response; source: result column(s) it is made
+# from; derive(*source values) -> values, applied to whole columns;
+# dictionary: send as indexes into a list of distinct values
+Column = namedtuple('Column', 'name source derive dictionary', defaults=(None, False))
+
+
+def _dictionary_encode(values):
+    codes, dictionary, seen = [], [], {}
+    for value in values:
+        if value is None:
+            codes.append(None)
+            continue
+        code = seen.get(value)
+        if code is None:
+            code = seen[value] = len(dictionary)
+            dictionary.append(value)
+        codes.append(code)
+    return codes, dictionary
+
+
+def collect(names, batches):
+    """{result column: [values]} from batches of rows."""
+    collected = {name: [] for name in names}
+    for rows in batches:
+        # zip(*rows) transposes the batch in C
+        for name, values in zip(names, zip(*rows)):
+            collected[name].extend(values)
+    return collected
+
+
+def encode(key, names, batches, columns, trailer=None):
+    """The columnar body for rows with result columns ``names``."""
+    collected = collect(names, batches)
+    count = len(collected[names[0]]) if names else 0
+
+    data, dictionaries = [], []
+    for column in columns:
+        sources = (column.source,) if isinstance(column.source, str) else column.source
+        values = collected[sources[0]] if column.derive is None else \
+            column.derive(*(collected[source] for source in sources))
+        if column.dictionary:
+            values, dictionary = _dictionary_encode(values)
+            dictionaries.append(_encode(column.name) + ':' + _encode(dictionary))
+        data.append(_encode(column.name) + ':' + _encode(values))
+
+    body = (_encode(key) + ':{"count":' + str(count)
+            + ',"columns":' + _encode([column.name for column in columns])
+            + ',"data":{' + ','.join(data) + '}'
+            + ',"dictionaries":{' + ','.join(dictionaries) + '}}')
+    for name, value in (trailer() if trailer else {}).items():
+        body += ',' + _encode(name) + ':' + _encode(value)
+    return '{' + body + '}'
+
+
+def columnar_list(key, names, batches, columns, trailer=None):
+    """Respond with ``batches`` of rows encoded as ``columns``; see encode()."""
+    return Response(encode(key, names, batches, columns, trailer), mimetype=COLUMNAR_MIMETYPE)
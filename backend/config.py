@@ -1,4 +1,5 @@
 import os
+import multiprocessing
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -6,15 +7,41 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     DEBUG = os.environ.get('FLASK_DEBUG') or True
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+    # Statements slower than this are logged with their route (0 disables)
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 250))
     
 class DevelopmentConfig(Config):
     DEBUG = True
     
 class ProductionConfig(Config):
     DEBUG = False
+
+    # Pre-forked server settings (see serve.py)
+    BIND = os.environ.get('BIND', '0.0.0.0:5000')
+    WORKERS = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+    THREADS = int(os.environ.get('WORKER_THREADS', 4))
+    # 'sync' runs each connection on a worker thread; 'async' serves
+    # connections from an event loop (asgi.py) and uses the THREADS only
+    # while a request is running
+    SERVER_MODE = os.environ.get('SERVER_MODE', 'sync')
+    # Open connections per async worker
+    WORKER_CONNECTIONS = int(os.environ.get('WORKER_CONNECTIONS', 10000))
+    # Recycle each worker after this many requests (jittered so they do not
+    # all restart together)
+    MAX_REQUESTS = int(os.environ.get('MAX_REQUESTS', 2000))
+    MAX_REQUESTS_JITTER = int(os.environ.get('MAX_REQUESTS_JITTER', 200))
+    TIMEOUT = int(os.environ.get('WORKER_TIMEOUT', 30))
+    GRACEFUL_TIMEOUT = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+    # One connection per worker thread plus headroom for background jobs
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', THREADS + 2))
     
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
     'default': DevelopmentConfig
 }
+
+def get_config():
+    """Config class selected by FLASK_ENV"""
+    return config.get(os.environ.get('FLASK_ENV', 'default'), config['default'])
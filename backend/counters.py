@@ -0,0 +1,145 @@
+"""
+Write-behind counters for products.views and products.likes.
+
+Requests only bump an in-memory delta; a background job folds all pending
+deltas into SQLite with one batched UPDATE transaction every FLUSH_INTERVAL
+seconds. Browsing therefore never takes the SQLite write lock, and a crash
+loses at most one interval of counts. Each thread is given a shard, round
+robin, the first time it counts, so concurrent requests rarely wait on the
+same lock. Reads add the pending deltas to the stored values so counts stay
+current between flushes (per worker process: other workers' pending deltas
+show up after their next flush). A flush copies the deltas and only
+subtracts them once its transaction has committed, so they never disappear
+from reads while it waits for the write lock.
+"""
+
+import atexit
+import logging
+import itertools
+import threading
+from collections import defaultdict
+
+import db
+import jobs
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5
+SHARDS = 16
+FIELDS = ('views', 'likes')
+
+
+class ShardedCounters:
+    """Per-product (views, likes) deltas split across independently locked shards."""
+
+    def __init__(self, shards=SHARDS):
+        self._shards = [(threading.Lock(), defaultdict(lambda: [0, 0])) for _ in range(shards)]
+        # Thread idents are aligned addresses, so they make poor shard keys
+        self._next_shard = itertools.count()
+        self._local = threading.local()
+        # One flush at a time, so no delta is written twice
+        self.flush_lock = threading.Lock()
+
+    def _shard(self):
+        index = getattr(self._local, 'shard', None)
+        if index is None:
+            # next() on a count is atomic under the GIL
+            index = self._local.shard = next(self._next_shard) % len(self._shards)
+        return self._shards[index]
+
+    def incr(self, product_id, field, amount=1):
+        index = FIELDS.index(field)
+        lock, deltas = self._shard()
+        with lock:
+            deltas[product_id][index] += amount
+
+    def pending(self, product_id):
+        """Unflushed (views, likes) for one product across all shards."""
+        views = likes = 0
+        for lock, deltas in self._shards:
+            with lock:
+                delta = deltas.get(product_id)
+                if delta:
+                    views += delta[0]
+                    likes += delta[1]
+        return views, likes
+
+    def snapshot(self):
+        """Copy every shard's pending deltas, leaving them in place."""
+        taken = []
+        for lock, deltas in self._shards:
+            with lock:
+                taken.append({product_id: tuple(delta) for product_id, delta in deltas.items()})
+        return taken
+
+    def settle(self, taken):
+        """Subtract a flushed snapshot(), keeping anything counted since."""
+        for (lock, deltas), flushed in zip(self._shards, taken):
+            with lock:
+                for product_id, (views, likes) in flushed.items():
+                    delta = deltas[product_id]
+                    delta[0] -= views
+                    delta[1] -= likes
+                    if not any(delta):
+                        del deltas[product_id]
+
+    def has_pending(self):
+        return any(deltas for _, deltas in self._shards)
+
+
+product_counters = ShardedCounters()
+
+
+def flush(conn, counters=product_counters):
+    """Write all pending deltas in one transaction; returns products touched."""
+    with counters.flush_lock:
+        taken = counters.snapshot()
+        merged = defaultdict(lambda: [0, 0])
+        for flushed in taken:
+            for product_id, (views, likes) in flushed.items():
+                merged[product_id][0] += views
+                merged[product_id][1] += likes
+        if not merged:
+            return 0
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('UPDATE products SET views = views + ?, likes = likes + ? WHERE id = ?',
+                             ((views, likes, product_id) for product_id, (views, likes) in merged.items()))
+            conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        counters.settle(taken)
+    return len(merged)
+
+
+@jobs.every(FLUSH_INTERVAL, name='counter-flush')
+def scheduled_flush(conn):
+    flush(conn)
+
+
+@atexit.register
+def flush_on_shutdown():
+    if not product_counters.has_pending():
+        return
+    try:
+        with db.pool.connection() as conn:
+            flush(conn)
+    except Exception:
+        logger.exception('Could not flush product counters on shutdown')
+
+
+def version_trigger_statements():
+    """Migration steps so counter flushes do not invalidate cached catalog reads."""
+    return [
+        'DROP TRIGGER IF EXISTS trg_products_version_update',
+        '''
+        CREATE TRIGGER trg_products_version_update
+        AFTER UPDATE OF wholesaler_id, name, category, price, stock, group_buy_eligible,
+                        image_path, status ON products
+        BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE table_name = 'products';
+        END
+        ''',
+    ]
@@ -0,0 +1,388 @@
+"""
+Pay-later credit for vendors.
+
+Every money movement is a row in credit_ledger, which triggers keep
+append-only: draws and interest add to what the vendor owes, repayments
+subtract. credit_accounts holds each vendor's running balance, updated in
+the same transaction as the ledger row, so balance and limit checks are a
+single primary-key read instead of a SUM over the history. A draw is one
+conditional UPDATE that only succeeds while the new balance stays within the
+limit, so concurrent draws cannot overspend it.
+
+Amounts are stored in paise (integers) and exposed in rupees. Repayments
+pay off interest before principal. Once the due date has passed, interest
+accrues daily on the outstanding principal at MONTHLY_INTEREST_RATE / 30,
+for all vendors at once in set-based SQL; an account more than
+BLOCK_AFTER_DAYS_OVERDUE days overdue is blocked from drawing until it is
+repaid in full. To accrue missed days or check the snapshots against the
+ledger:
+
+    python credit.py accrue
+    python credit.py reconcile
+"""
+
+import re
+import sys
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+import jobs
+
+DEFAULT_CREDIT_LIMIT = 3000
+# Largest single draw or repayment (₹1 crore); far above any credit limit,
+# and well inside SQLite's 64-bit integers
+MAX_AMOUNT_PAISE = 10 ** 9
+MONTHLY_INTEREST_RATE = 0.05
+BILLING_CYCLE_DAYS = 30
+BLOCK_AFTER_DAYS_OVERDUE = 15
+ACCRUAL_CHECK_INTERVAL = 3600
+DEFAULT_HISTORY_LIMIT = 20
+MAX_HISTORY_LIMIT = 100
+
+AADHAR_PATTERN = re.compile(r'^\d{4}\s?\d{4}\s?\d{4}$')
+PAN_PATTERN = re.compile(r'^[A-Z]{5}[0-9]{4}[A-Z]$')
+
+
+def credit_statements():
+    """Migration steps for credit accounts and the ledger."""
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS credit_accounts (
+            vendor_id INTEGER PRIMARY KEY REFERENCES vendors (id),
+            credit_limit_paise INTEGER NOT NULL,
+            principal_paise INTEGER NOT NULL DEFAULT 0,
+            interest_paise INTEGER NOT NULL DEFAULT 0,
+            interest_rate REAL NOT NULL,
+            due_date DATE,
+            status TEXT NOT NULL DEFAULT 'active',
+            last_entry_id INTEGER NOT NULL DEFAULT 0,
+            aadhar_masked TEXT NOT NULL,
+            pan TEXT,
+            enrolled_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # The accrual job only visits accounts with principal outstanding
+        '''
+        CREATE INDEX IF NOT EXISTS idx_credit_accounts_due
+        ON credit_accounts (due_date) WHERE principal_paise > 0
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS credit_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vendor_id INTEGER NOT NULL REFERENCES credit_accounts (vendor_id),
+            kind TEXT NOT NULL CHECK (kind IN ('draw', 'repayment', 'interest')),
+            amount_paise INTEGER NOT NULL,
+            balance_after_paise INTEGER NOT NULL,
+            description TEXT,
+            reference TEXT,
+            accrual_date DATE,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_credit_ledger_vendor ON credit_ledger (vendor_id, id)',
+        # At most one interest entry per vendor and day, so re-running an
+        # accrual is harmless
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_credit_ledger_accrual
+        ON credit_ledger (vendor_id, accrual_date) WHERE kind = 'interest'
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_credit_ledger_no_update
+        BEFORE UPDATE ON credit_ledger
+        BEGIN
+            SELECT RAISE(ABORT, 'credit_ledger is append-only');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_credit_ledger_no_delete
+        BEFORE DELETE ON credit_ledger
+        BEGIN
+            SELECT RAISE(ABORT, 'credit_ledger is append-only');
+        END
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS credit_accrual_runs (
+            accrual_date DATE PRIMARY KEY,
+            accounts INTEGER NOT NULL,
+            ran_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]
+
+
+class CreditError(Exception):
+    """A credit request that cannot be honoured, with a client-facing message."""
+
+
+def to_paise(amount):
+    """Positive rupee amount (number or string) to integer paise."""
+    try:
+        rupees = Decimal(str(amount))
+    except (InvalidOperation, ValueError):
+        raise CreditError('amount must be a number')
+    if not rupees.is_finite():
+        raise CreditError('amount must be a number')
+    if rupees <= 0:
+        raise CreditError('amount must be positive')
+    # Compared in rupees, since scaling a huge exponent to paise overflows
+    if rupees > Decimal(MAX_AMOUNT_PAISE) / 100:
+        raise CreditError(f'amount must be at most ₹{to_rupees(MAX_AMOUNT_PAISE):,.2f}')
+    try:
+        paise = (rupees * 100).quantize(Decimal('1'))
+    except InvalidOperation:
+        raise CreditError('amount is too large')
+    # Less than half a paisa
+    if paise <= 0:
+        raise CreditError('amount must be positive')
+    return int(paise)
+
+
+def to_rupees(paise):
+    return paise / 100
+
+
+def account(conn, vendor_id):
+    return conn.execute('SELECT * FROM credit_accounts WHERE vendor_id = ?', (vendor_id,)).fetchone()
+
+
+def enroll(conn, vendor_id, aadhar, pan=None):
+    aadhar = (aadhar or '').strip()
+    pan = (pan or '').strip().upper() or None
+    if not AADHAR_PATTERN.match(aadhar):
+        raise CreditError('Enter a valid Aadhar number (XXXX XXXX XXXX)')
+    if pan is not None and not PAN_PATTERN.match(pan):
+        raise CreditError('Enter a valid PAN')
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        vendor = conn.execute('SELECT is_approved FROM vendors WHERE id = ?', (vendor_id,)).fetchone()
+        if vendor is None or not vendor['is_approved']:
+            raise CreditError('Vendor must be approved')
+        # Only the last four digits of the Aadhar number are kept
+        created = conn.execute('''
+            INSERT INTO credit_accounts (vendor_id, credit_limit_paise, interest_rate, aadhar_masked, pan)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (vendor_id) DO NOTHING
+        ''', (vendor_id, DEFAULT_CREDIT_LIMIT * 100, MONTHLY_INTEREST_RATE,
+              'XXXX XXXX ' + aadhar[-4:], pan)).rowcount
+        if not created:
+            raise CreditError('Already enrolled in Pay Later')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _append(conn, vendor_id, kind, amount_paise, description, reference):
+    """Ledger row for a change already applied to the snapshot; same transaction."""
+    balance = conn.execute('''
+        SELECT principal_paise + interest_paise FROM credit_accounts WHERE vendor_id = ?
+    ''', (vendor_id,)).fetchone()[0]
+    entry_id = conn.execute('''
+        INSERT INTO credit_ledger (vendor_id, kind, amount_paise, balance_after_paise, description, reference)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (vendor_id, kind, amount_paise, balance, description, reference)).lastrowid
+    conn.execute('UPDATE credit_accounts SET last_entry_id = ? WHERE vendor_id = ?', (entry_id, vendor_id))
+    return entry_id
+
+
+def draw_in_transaction(conn, vendor_id, amount_paise, description=None, reference=None):
+    """Draw ``amount_paise`` inside the caller's write transaction; raises CreditError if refused."""
+    drawn = conn.execute(f'''
+        UPDATE credit_accounts
+        SET principal_paise = principal_paise + :amount,
+            due_date = CASE WHEN principal_paise + interest_paise = 0
+                            THEN date('now', '+{BILLING_CYCLE_DAYS} days') ELSE due_date END
+        WHERE vendor_id = :vendor AND status = 'active'
+          AND principal_paise + interest_paise + :amount <= credit_limit_paise
+    ''', {'amount': amount_paise, 'vendor': vendor_id}).rowcount
+    if not drawn:
+        current = account(conn, vendor_id)
+        if current is None:
+            raise CreditError('Not enrolled in Pay Later')
+        if current['status'] != 'active':
+            raise CreditError('Pay Later is blocked until the overdue balance is repaid')
+        available = current['credit_limit_paise'] - current['principal_paise'] - current['interest_paise']
+        raise CreditError(f'Only ₹{to_rupees(available):,.2f} of credit is available')
+    return _append(conn, vendor_id, 'draw', amount_paise, description, reference)
+
+
+def draw(conn, vendor_id, amount, description=None, reference=None):
+    """Spend ``amount`` rupees of credit; returns the ledger entry id."""
+    amount_paise = to_paise(amount)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        entry_id = draw_in_transaction(conn, vendor_id, amount_paise, description, reference)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return entry_id
+
+
+def repay(conn, vendor_id, amount, reference=None, method=None):
+    """Pay back ``amount`` rupees, interest first; returns the ledger entry id."""
+    amount_paise = to_paise(amount)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Right-hand sides see the row as it was before the update
+        repaid = conn.execute('''
+            UPDATE credit_accounts
+            SET interest_paise = max(interest_paise - :amount, 0),
+                principal_paise = principal_paise - max(:amount - interest_paise, 0),
+                due_date = CASE WHEN principal_paise + interest_paise = :amount THEN NULL ELSE due_date END,
+                status = CASE WHEN principal_paise + interest_paise = :amount THEN 'active' ELSE status END
+            WHERE vendor_id = :vendor AND principal_paise + interest_paise >= :amount
+        ''', {'amount': amount_paise, 'vendor': vendor_id}).rowcount
+        if not repaid:
+            current = account(conn, vendor_id)
+            if current is None:
+                raise CreditError('Not enrolled in Pay Later')
+            owed = current['principal_paise'] + current['interest_paise']
+            raise CreditError(f'Amount is more than the ₹{to_rupees(owed):,.2f} outstanding')
+        description = f'Payment via {method.replace("_", " ").upper()}' if method else 'Repayment'
+        entry_id = _append(conn, vendor_id, 'repayment', -amount_paise, description, reference)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return entry_id
+
+
+def _accrue_day(conn, accrual_date):
+    """Accrue one day's interest for every overdue account; returns accounts charged."""
+    day = accrual_date.isoformat()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if conn.execute('SELECT 1 FROM credit_accrual_runs WHERE accrual_date = ?', (day,)).fetchone():
+            conn.rollback()
+            return 0
+        high_water = conn.execute('SELECT COALESCE(MAX(id), 0) FROM credit_ledger').fetchone()[0]
+        conn.execute(f'''
+            INSERT INTO credit_ledger (vendor_id, kind, amount_paise, balance_after_paise,
+                                       description, accrual_date)
+            SELECT vendor_id, 'interest', charge, principal_paise + interest_paise + charge,
+                   'Daily interest', :day
+            FROM (
+                SELECT vendor_id, principal_paise, interest_paise,
+                       CAST(round(principal_paise * interest_rate / {BILLING_CYCLE_DAYS}) AS INTEGER) AS charge
+                FROM credit_accounts
+                WHERE principal_paise > 0 AND due_date < :day
+            )
+            WHERE charge > 0
+            ON CONFLICT (vendor_id, accrual_date) WHERE kind = 'interest' DO NOTHING
+        ''', {'day': day})
+        # Fold the new entries into the snapshots in one pass
+        charged = conn.execute('''
+            UPDATE credit_accounts
+            SET interest_paise = interest_paise + l.amount_paise, last_entry_id = l.id
+            FROM credit_ledger l
+            WHERE l.vendor_id = credit_accounts.vendor_id AND l.id > ?
+        ''', (high_water,)).rowcount
+        conn.execute(f'''
+            UPDATE credit_accounts SET status = 'blocked'
+            WHERE status = 'active' AND principal_paise > 0
+              AND due_date < date(?, '-{BLOCK_AFTER_DAYS_OVERDUE} days')
+        ''', (day,))
+        conn.execute('INSERT INTO credit_accrual_runs (accrual_date, accounts) VALUES (?, ?)',
+                     (day, charged))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return charged
+
+
+def accrue_interest(conn, through=None):
+    """Accrue every day not yet accrued up to ``through`` (default yesterday).
+
+    A fresh database starts with yesterday; after downtime the missed days
+    are caught up one transaction each. Returns the number of interest
+    entries written.
+    """
+    through = through or date.today() - timedelta(days=1)
+    last = conn.execute('SELECT MAX(accrual_date) FROM credit_accrual_runs').fetchone()[0]
+    day = date.fromisoformat(last) + timedelta(days=1) if last else through
+    charged = 0
+    while day <= through:
+        charged += _accrue_day(conn, day)
+        day += timedelta(days=1)
+    return charged
+
+
+@jobs.every(ACCRUAL_CHECK_INTERVAL, name='credit-interest')
+def scheduled_accrual(conn):
+    accrue_interest(conn)
+
+
+def reconcile(conn):
+    """Vendor ids whose snapshot does not match the sum of their ledger."""
+    return [row[0] for row in conn.execute('''
+        SELECT a.vendor_id
+        FROM credit_accounts a
+        LEFT JOIN (SELECT vendor_id, SUM(amount_paise) AS total FROM credit_ledger GROUP BY vendor_id) l
+               ON l.vendor_id = a.vendor_id
+        WHERE a.principal_paise + a.interest_paise != COALESCE(l.total, 0)
+    ''')]
+
+
+def history(conn, vendor_id, limit=DEFAULT_HISTORY_LIMIT, before_id=None):
+    """Newest ledger entries first, paged by entry id."""
+    return conn.execute('''
+        SELECT id, kind, amount_paise, balance_after_paise, description, reference, created_at
+        FROM credit_ledger
+        WHERE vendor_id = ? AND id < ?
+        ORDER BY id DESC LIMIT ?
+    ''', (vendor_id, before_id or sys.maxsize, limit)).fetchall()
+
+
+def serialize_account(row):
+    if row is None:
+        return {'isEnrolled': False, 'isBlocked': False, 'totalCreditLimit': DEFAULT_CREDIT_LIMIT,
+                'usedCredit': 0, 'interestRate': MONTHLY_INTEREST_RATE}
+    used = row['principal_paise'] + row['interest_paise']
+    return {
+        'vendorId': row['vendor_id'],
+        'totalCreditLimit': to_rupees(row['credit_limit_paise']),
+        'usedCredit': to_rupees(used),
+        'availableCredit': to_rupees(row['credit_limit_paise'] - used),
+        'principal': to_rupees(row['principal_paise']),
+        'interest': to_rupees(row['interest_paise']),
+        'dueDate': row['due_date'],
+        'interestRate': row['interest_rate'],
+        'isEnrolled': True,
+        'isBlocked': row['status'] == 'blocked',
+        'bankDetails': {'aadhar': row['aadhar_masked'], 'pan': row['pan']}
+    }
+
+
+def serialize_entry(row):
+    return {
+        'id': row['id'],
+        'date': row['created_at'],
+        'type': row['kind'],
+        'amount': to_rupees(row['amount_paise']),
+        'balanceAfter': to_rupees(row['balance_after_paise']),
+        'description': row['description'],
+        'reference': row['reference']
+    }
+
+
+if __name__ == '__main__':
+    import db
+    from app import init_db
+
+    init_db()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'accrue'
+    if command not in ('accrue', 'reconcile'):
+        print('Usage: python credit.py [accrue|reconcile]')
+        sys.exit(2)
+    with db.pool.connection() as conn:
+        if command == 'accrue':
+            print(f'✅ Wrote {accrue_interest(conn)} interest entries')
+        else:
+            mismatched = reconcile(conn)
+            if mismatched:
+                print(f'❌ Balances differ from the ledger for vendors {mismatched}')
+                sys.exit(1)
+            print('✅ All balances match the ledger')
@@ -0,0 +1,292 @@
+"""
+Synthetic dataset generator for benchmarks.
+
+Builds a fresh database with the normal schema, seed rows and migrations,
+then bulk-loads vendors, wholesalers, products, orders and reviews at a
+chosen scale. Scale 1 is roughly production size:
+
+    python datagen.py --scale 1 --output bench.db          # 10k vendors, 2M orders
+    python datagen.py --scale 0.01 --output bench-small.db
+
+The same --scale and --seed always produce the same rows (order dates are
+relative to the day the dataset is built). Every generated vendor can log in
+with their phone (7000000000, 7000000001, ...) and password vendor123;
+wholesalers likewise with 8000000000, ... and password123. Orders are
+spread over the past year in id order, as real ones would be, and the
+analytics rollup and reorder statistics are rebuilt at the end.
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import db
+from catalog import stock_status
+from geo import LOCALITIES
+
+# Row counts at --scale 1
+BASE_COUNTS = {
+    'vendors': 10000,
+    'wholesalers': 500,
+    'products': 200000,
+    'orders': 2000000,
+    'reviews': 100000,
+}
+INSERT_CHUNK = 50000
+ORDER_HISTORY_DAYS = 365
+# Each vendor keeps coming back to a few products, as real shops do
+REGULAR_ITEMS = 8
+REPEAT_SHARE = 0.6
+# Spread of generated pins around their locality's centre, in degrees (~1.5km)
+PIN_JITTER = 0.015
+
+VENDOR_PASSWORD = 'vendor123'
+WHOLESALER_PASSWORD = 'password123'
+VENDOR_PHONE_BASE = 7000000000
+WHOLESALER_PHONE_BASE = 8000000000
+
+LOCATIONS = ('Ghatkopar', 'Andheri', 'Bandra', 'Dadar', 'Kurla', 'Borivali', 'Thane',
+             'Vashi', 'Malad', 'Chembur', 'Goregaon', 'Mulund', 'Powai', 'Sion', 'Colaba')
+FIRST_NAMES = ('Raj', 'Priya', 'Amit', 'Sunita', 'Vikram', 'Anita', 'Rahul', 'Meena',
+               'Suresh', 'Kavita', 'Arjun', 'Pooja', 'Ganesh', 'Lata', 'Imran', 'Farah')
+LAST_NAMES = ('Patel', 'Shah', 'Kumar', 'Sharma', 'Desai', 'Joshi', 'Patil', 'Khan',
+              'Iyer', 'Naik', 'Pawar', 'Mehta', 'Gupta', 'Shaikh', 'Kulkarni', 'Rao')
+SHOP_SUFFIXES = ('Traders', 'Wholesale', 'Mart', 'Suppliers', 'Agencies', 'Distributors')
+CATALOG = {
+    'Vegetables': ('Tomatoes', 'Onions', 'Potatoes', 'Spinach', 'Carrots', 'Okra',
+                   'Brinjal', 'Green Chili', 'Cauliflower', 'Cabbage', 'Coriander'),
+    'Fruits': ('Bananas', 'Apples', 'Oranges', 'Mangoes', 'Papaya', 'Grapes', 'Guava'),
+    'Grains & Cereals': ('Basmati Rice', 'Sona Masoori Rice', 'Wheat', 'Wheat Flour',
+                         'Jowar', 'Bajra', 'Poha'),
+    'Pulses': ('Toor Dal', 'Moong Dal', 'Chana Dal', 'Masoor Dal', 'Rajma', 'Kabuli Chana'),
+    'Dairy & Eggs': ('Milk', 'Paneer', 'Curd', 'Butter', 'Ghee', 'Eggs'),
+    'Spices': ('Turmeric', 'Red Chili Powder', 'Cumin', 'Coriander Powder', 'Garam Masala'),
+    'Fish & Seafood': ('Pomfret', 'Prawns', 'Bombay Duck', 'Surmai', 'Rohu'),
+    'Oils': ('Groundnut Oil', 'Sunflower Oil', 'Mustard Oil', 'Coconut Oil'),
+}
+PRODUCT_QUALIFIERS = ('', 'Fresh', 'Organic', 'Premium', 'Local', 'Farm', 'Grade A', 'Export Quality')
+# (status, weight) for generated orders
+ORDER_STATUSES = (('delivered', 70), ('confirmed', 12), ('pending', 10), ('cancelled', 8))
+REVIEW_COMMENTS = ('Good quality, on time', 'Fresh stock every time', 'Prices are fair',
+                   'Delivery was late', 'Packing could be better', 'Very reliable supplier',
+                   'Quantity was short once', 'Best rates in the area', '')
+
+
+def scaled_counts(scale):
+    return {table: max(1, int(count * scale)) for table, count in BASE_COUNTS.items()}
+
+
+def _chunks(rows, size=INSERT_CHUNK):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _insert(conn, statement, rows):
+    """executemany in INSERT_CHUNK-row transactions; returns the first new rowid."""
+    first_id = None
+    for chunk in _chunks(rows):
+        conn.execute('BEGIN')
+        cursor = conn.executemany(statement, chunk)
+        conn.commit()
+        if first_id is None:
+            first_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0] - cursor.rowcount + 1
+    return first_id
+
+
+def _pin(rng, location):
+    lat, lon = LOCALITIES[location]
+    return round(rng.gauss(lat, PIN_JITTER), 6), round(rng.gauss(lon, PIN_JITTER), 6)
+
+
+def _person(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+def _vendors(rng, count):
+    for i in range(count):
+        name = _person(rng)
+        location = rng.choice(LOCATIONS)
+        yield (name, f"{name.lower().replace(' ', '.')}{i}@example.com",
+               str(VENDOR_PHONE_BASE + i), VENDOR_PASSWORD, location,
+               int(rng.random() < 0.95), *_pin(rng, location))
+
+
+def _wholesalers(rng, count):
+    for i in range(count):
+        surname = rng.choice(LAST_NAMES)
+        location = rng.choice(LOCATIONS)
+        yield (f'{surname} {rng.choice(SHOP_SUFFIXES)}', str(WHOLESALER_PHONE_BASE + i),
+               WHOLESALER_PASSWORD, f'{surname} & Sons {rng.choice(SHOP_SUFFIXES)}',
+               'Sourced from APMC Vashi and partner farms', location,
+               # The first wholesaler is always approved so benchmarks can log in
+               int(i == 0 or rng.random() < 0.9),
+               round(rng.uniform(3.5, 5.0), 1), round(rng.uniform(80, 100), 1),
+               round(rng.uniform(75, 100), 1), *_pin(rng, location))
+
+
+def _products(rng, count, wholesaler_ids, catalog):
+    for _ in range(count):
+        category = rng.choice(list(CATALOG))
+        item = rng.choice(CATALOG[category])
+        qualifier = rng.choice(PRODUCT_QUALIFIERS)
+        price = round(rng.lognormvariate(3.8, 0.7), 2)
+        stock = int(rng.expovariate(1 / 300))
+        wholesaler_id = rng.choice(wholesaler_ids)
+        catalog.append((wholesaler_id, price))
+        yield (wholesaler_id, f'{qualifier} {item}'.strip(), category, price, stock,
+               int(rng.random() < 0.7), int(rng.expovariate(1 / 150)), int(rng.expovariate(1 / 10)),
+               stock_status(stock))
+
+
+def _orders(rng, count, vendor_ids, first_product_id, catalog, now):
+    start = (now - timedelta(days=ORDER_HISTORY_DAYS)).timestamp()
+    step = ORDER_HISTORY_DAYS * 86400 / count
+    # Picking from a weighted pool is much cheaper than rng.choices per row
+    statuses = [status for status, weight in ORDER_STATUSES for _ in range(weight)]
+    randrange, random_, choice, randint = rng.randrange, rng.random, rng.choice, rng.randint
+    regulars = {}
+    for i in range(count):
+        vendor_id = choice(vendor_ids)
+        if random_() < REPEAT_SHARE:
+            basket = regulars.get(vendor_id)
+            if basket is None:
+                basket = regulars[vendor_id] = [randrange(len(catalog)) for _ in range(REGULAR_ITEMS)]
+            offset = choice(basket)
+        else:
+            offset = randrange(len(catalog))
+        wholesaler_id, price = catalog[offset]
+        quantity = randint(1, 50)
+        yield (wholesaler_id, vendor_id, first_product_id + offset, quantity,
+               round(quantity * price, 2), choice(statuses), int(start + (i + random_()) * step))
+
+
+def _reviews(rng, count, wholesaler_ids, vendor_ids):
+    for _ in range(count):
+        comment = rng.choice(REVIEW_COMMENTS)
+        yield (rng.choice(wholesaler_ids), rng.choice(vendor_ids),
+               rng.choices((1, 2, 3, 4, 5), (3, 5, 12, 35, 45))[0], comment or None,
+               'Thank you!' if comment and rng.random() < 0.3 else None)
+
+
+def generate(path, scale=1.0, seed=42, log=print):
+    """Create a database at ``path`` (which must not exist) filled at ``scale``."""
+    import analytics
+    import reorder
+    from app import init_db
+
+    counts = scaled_counts(scale)
+    rng = random.Random(seed)
+    # Order history ends at today's midnight, so date-range endpoints see
+    # the same recent activity whenever the dataset is built
+    now = datetime.combine(date.today(), datetime.min.time())
+
+    # Schema, seed rows and migrations exactly as the app creates them
+    db.configure(database=path)
+    init_db()
+    db.pool.close_all()
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    # A throwaway file: trade durability for load speed
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -262144')
+    timings = {}
+
+    def timed(table, load):
+        started = time.perf_counter()
+        result = load()
+        timings[table] = round(time.perf_counter() - started, 2)
+        log(f'  {table:<12} {counts.get(table, ""):>10}  {timings[table]:>7.2f}s')
+        return result
+
+    log(f'Generating {path} (scale {scale}, seed {seed})')
+    first_vendor = timed('vendors', lambda: _insert(conn, '''
+        INSERT INTO vendors (name, email, phone, password, location, is_approved, latitude, longitude)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', _vendors(rng, counts['vendors'])))
+    first_wholesaler = timed('wholesalers', lambda: _insert(conn, '''
+        INSERT INTO wholesalers (name, phone, password, shop_name, sourcing_info, location,
+                                 is_approved, trust_score, response_rate, delivery_rate,
+                                 latitude, longitude)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', _wholesalers(rng, counts['wholesalers'])))
+    vendor_ids = range(first_vendor, first_vendor + counts['vendors'])
+    wholesaler_ids = range(first_wholesaler, first_wholesaler + counts['wholesalers'])
+
+    catalog = []
+
+    def load_products():
+        # Defer the per-row search and version triggers, as the catalog
+        # importer does, and index everything in one pass afterwards
+        conn.execute('UPDATE bulk_load SET active = 1')
+        first_id = _insert(conn, '''
+            INSERT INTO products (wholesaler_id, name, category, price, stock, group_buy_eligible,
+                                  views, likes, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', _products(rng, counts['products'], wholesaler_ids, catalog))
+        conn.execute('BEGIN')
+        conn.execute('''
+            INSERT INTO product_search (rowid, name, category, wholesaler)
+            SELECT p.id, p.name, p.category, w.name
+            FROM products p LEFT JOIN wholesalers w ON p.wholesaler_id = w.id
+            WHERE p.id >= ?
+        ''', (first_id,))
+        conn.execute("UPDATE data_versions SET version = version + 1 WHERE table_name = 'products'")
+        conn.execute('UPDATE bulk_load SET active = 0')
+        conn.commit()
+        return first_id
+
+    first_product = timed('products', load_products)
+    # Historical orders are not announced to event subscribers
+    conn.execute('UPDATE bulk_load SET active = 1')
+    timed('orders', lambda: _insert(conn, '''
+        INSERT INTO orders (wholesaler_id, vendor_id, product_id, quantity, total_amount, status,
+                            created_at)
+        VALUES (?, ?, ?, ?, ?, ?, datetime(?, 'unixepoch'))
+    ''', _orders(rng, counts['orders'], vendor_ids, first_product, catalog, now)))
+    conn.execute('UPDATE bulk_load SET active = 0')
+    timed('reviews', lambda: _insert(conn, '''
+        INSERT INTO reviews (wholesaler_id, vendor_id, rating, comment, reply)
+        VALUES (?, ?, ?, ?, ?)
+    ''', _reviews(rng, counts['reviews'], wholesaler_ids, vendor_ids)))
+
+    conn.row_factory = sqlite3.Row
+    timed('analytics', lambda: analytics.backfill(conn))
+    timed('reorder', lambda: reorder.rebuild(conn))
+    timed('analyze', lambda: conn.execute('ANALYZE'))
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    return {'counts': counts, 'seconds': timings}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiplier on %s' % ', '.join(f'{n} {t}' for t, n in BASE_COUNTS.items()))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench.db')
+    parser.add_argument('--force', action='store_true', help='replace an existing output file')
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.output):
+        if not args.force:
+            parser.error(f'{args.output} exists; pass --force to replace it')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.output + suffix):
+                os.remove(args.output + suffix)
+
+    started = time.perf_counter()
+    generate(args.output, args.scale, args.seed)
+    print(f'Done in {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
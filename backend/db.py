@@ -0,0 +1,204 @@
+"""
+SQLite data-access layer.
+
+All routes get their connection from a single bounded pool instead of calling
+sqlite3.connect per request. Connections are opened once in WAL mode with
+tuned pragmas, keep their prepared-statement cache across requests, and are
+handed back to the pool when the request's app context is torn down.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g
+
+DATABASE = os.environ.get('DATABASE_PATH', 'vendor_clubs.db')
+
+# Applied to every new connection. WAL lets readers keep going while a
+# wholesaler's stock update holds the write lock; NORMAL sync is durable
+# across application crashes in WAL mode and much cheaper than FULL.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',      # ~16MB page cache per connection
+    'PRAGMA mmap_size = 134217728',    # 128MB memory-mapped reads
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+)
+
+# Per-connection LRU of compiled statements; the routes only use a few dozen
+# distinct SQL strings so they stay prepared for the life of the connection.
+STATEMENT_CACHE_SIZE = 256
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the pool timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of SQLite connections.
+
+    Connections are created lazily up to ``max_size``. A thread that finds the
+    pool exhausted waits up to ``timeout`` seconds for another thread to
+    release one.
+    """
+
+    def __init__(self, database=DATABASE, max_size=8, timeout=10.0, factory=sqlite3.Connection):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        # Connection class for new connections (metrics.py swaps in an
+        # instrumented one)
+        self.factory = factory
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checked_out': 0,
+            'peak_checked_out': 0,
+            'acquires': 0,
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'wait_time_ms': 0.0,
+            'timeouts': 0,
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            timeout=5.0,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=self.factory,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """Check a connection out of the pool, creating one if allowed."""
+        started = time.perf_counter()
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    self._stats['hits'] += 1
+                    break
+                if self._created < self.max_size:
+                    self._created += 1
+                    self._stats['misses'] += 1
+                    conn = None
+                    break
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - started)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'no database connection free after {self.timeout}s')
+            self._stats['acquires'] += 1
+            self._stats['checked_out'] += 1
+            self._stats['peak_checked_out'] = max(
+                self._stats['peak_checked_out'], self._stats['checked_out'])
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time_ms'] += (time.perf_counter() - started) * 1000
+
+        if conn is None:
+            # Open outside the lock so a slow connect does not stall releases
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._stats['checked_out'] -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def release(self, conn):
+        """Return a connection, rolling back anything left uncommitted."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection: drop it and let the pool open a fresh one
+            conn.close()
+            with self._cond:
+                self._created -= 1
+                self._stats['checked_out'] -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._stats['checked_out'] -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for code running outside a request."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """Close idle connections and forget about checked-out ones."""
+        with self._cond:
+            for conn in self._idle:
+                conn.close()
+            self._idle = []
+            self._created = 0
+            self._stats['checked_out'] = 0
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self._created
+            stats['idle'] = len(self._idle)
+            stats['max_size'] = self.max_size
+        stats['wait_time_ms'] = round(stats['wait_time_ms'], 3)
+        return stats
+
+
+pool = ConnectionPool()
+
+
+def configure(database=None, max_size=None, timeout=None):
+    """Point the shared pool at a database and resize it."""
+    pool.close_all()
+    if database is not None:
+        pool.database = database
+    if max_size is not None:
+        pool.max_size = max_size
+    if timeout is not None:
+        pool.timeout = timeout
+
+
+def get_db():
+    """Connection for the current request, checked out on first use."""
+    if 'db' not in g:
+        g.db = pool.acquire()
+    return g.db
+
+
+def close_db(exc=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        pool.release(conn)
+
+
+def init_app(app):
+    configure(
+        database=app.config.get('DATABASE', DATABASE),
+        max_size=app.config.get('DB_POOL_SIZE', 8),
+        timeout=app.config.get('DB_POOL_TIMEOUT', 10.0),
+    )
+    app.teardown_appcontext(close_db)
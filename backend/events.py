@@ -0,0 +1,376 @@
+"""
+Server-Sent Events for product stock and order changes.
+
+Triggers append a row to the events table whenever a product's stock,
+status or price changes and whenever an order is placed or changes status,
+in the same transaction as the write, whichever code path (or worker
+process) made it. Each process runs one broadcaster thread that reads new
+rows with a single primary-key range query and fans them out to the
+subscribers of their topic, so an open dashboard costs one queued event per
+change instead of repeated catalog queries:
+
+    product:<id>               stock, status and price of one product
+    wholesaler:<id>:orders     orders placed with a wholesaler
+    vendor:<id>:orders         orders placed by a vendor
+
+Each client has a bounded queue. A client that falls MAX_QUEUED_EVENTS
+behind is disconnected rather than buffered without limit; like any client,
+it reconnects with Last-Event-ID and is replayed what it missed from the
+events table, which keeps RETENTION_MINUTES of history. Streams send a
+comment every HEARTBEAT_SECONDS so proxies keep them open, and end after
+STREAM_SECONDS so a long-lived dashboard does not pin a worker thread.
+Under the async server (asgi.py) streams wait on the event loop instead and
+take no thread at all.
+"""
+
+import asyncio
+import json
+import logging
+import queue
+import re
+import threading
+import time
+
+from flask import request
+
+import db
+import jobs
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.25
+POLL_BATCH = 1000
+MAX_QUEUED_EVENTS = 256
+MAX_TOPICS = 50
+MAX_REPLAY = 500
+HEARTBEAT_SECONDS = 15
+STREAM_SECONDS = 300
+RECONNECT_MS = 3000
+RETENTION_MINUTES = 60
+PRUNE_INTERVAL = 300
+
+TOPIC_PATTERN = re.compile(r'^(?:product:\d+|wholesaler:\d+:orders|vendor:\d+:orders)$')
+
+
+def _order_event(row):
+    return f'''json_object('id', {row}.id, 'status', {row}.status, 'productId', {row}.product_id,
+                           'quantity', {row}.quantity, 'totalAmount', {row}.total_amount,
+                           'wholesalerId', {row}.wholesaler_id, 'vendorId', {row}.vendor_id)'''
+
+
+def _order_trigger(name, timing, when, event_type):
+    # One event for the wholesaler's topic and one for the vendor's
+    return f'''
+        CREATE TRIGGER IF NOT EXISTS {name}
+        {timing} ON orders
+        WHEN {when} AND NOT (SELECT active FROM bulk_load)
+        BEGIN
+            INSERT INTO events (topic, type, data)
+            VALUES ('wholesaler:' || new.wholesaler_id || ':orders', '{event_type}', {_order_event('new')}),
+                   ('vendor:' || new.vendor_id || ':orders', '{event_type}', {_order_event('new')});
+        END
+    '''
+
+
+def product_event_trigger(condition=None):
+    """Trigger announcing stock, status and price changes (and ``condition``)."""
+    when = 'new.stock IS NOT old.stock OR new.status IS NOT old.status OR new.price IS NOT old.price'
+    if condition:
+        when = f'({when}) AND {condition}'
+    return f'''
+        CREATE TRIGGER IF NOT EXISTS trg_products_event_update
+        AFTER UPDATE OF stock, status, price ON products
+        WHEN {when}
+        BEGIN
+            INSERT INTO events (topic, type, data)
+            VALUES ('product:' || new.id, 'product',
+                    json_object('id', new.id, 'stock', new.stock, 'status', new.status,
+                                'price', new.price));
+        END
+    '''
+
+
+def event_statements():
+    """Migration steps for the events log and the triggers that fill it."""
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT NOT NULL,
+            type TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # For the retention sweep; replay and the broadcaster read id ranges
+        'CREATE INDEX IF NOT EXISTS idx_events_created ON events (created_at)',
+        # Only changes to existing products are announced; nobody can be
+        # subscribed to a product before it exists
+        product_event_trigger(),
+        _order_trigger('trg_orders_event_insert', 'AFTER INSERT', '1', 'order'),
+        _order_trigger('trg_orders_event_status', 'AFTER UPDATE OF status',
+                       'new.status IS NOT old.status', 'order-status'),
+    ]
+
+
+def parse_topics(value):
+    """Comma-separated topic list; raises ValueError if malformed."""
+    topics = {topic.strip() for topic in (value or '').split(',') if topic.strip()}
+    if not topics:
+        raise ValueError('topics is required')
+    if len(topics) > MAX_TOPICS:
+        raise ValueError(f'At most {MAX_TOPICS} topics per stream')
+    for topic in topics:
+        if not TOPIC_PATTERN.match(topic):
+            raise ValueError(f'Unknown topic {topic!r}')
+    return topics
+
+
+def topic_owner(topic):
+    """(user_type, id) allowed to subscribe to an orders topic, else None."""
+    kind, _, rest = topic.partition(':')
+    if kind in ('wholesaler', 'vendor'):
+        return kind, int(rest.split(':', 1)[0])
+    return None
+
+
+def format_event(event_id, event_type, topic, data):
+    # data is already JSON; wrap it with its topic without re-parsing
+    return f'id: {event_id}\nevent: {event_type}\ndata: {{"topic":{json.dumps(topic)},"data":{data}}}\n\n'
+
+
+class Subscription:
+    def __init__(self, topics):
+        self.topics = topics
+        self.queue = queue.Queue(MAX_QUEUED_EVENTS)
+        self.dropped = False
+        # Called after each queued event for subscribers that wait on an
+        # event loop rather than in queue.get()
+        self.wake = None
+
+
+class Broadcaster:
+    """Tails the events table and fans new rows out to local subscribers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_topic = {}
+        self._subscribers = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self._last_id = None
+        self._stats = {'delivered': 0, 'dropped_clients': 0}
+
+    def subscribe(self, conn, topics):
+        """Register for ``topics``; events already committed are for replay() to send."""
+        subscription = Subscription(topics)
+        # Read before subscribing, so a caller's replay after this call
+        # reaches at least as far as the first poll starts
+        start_id = current_id(conn)
+        with self._lock:
+            for topic in topics:
+                self._by_topic.setdefault(topic, set()).add(subscription)
+            self._subscribers += 1
+            if self._last_id is None:
+                self._last_id = start_id
+            if self._thread is None:
+                # Started lazily so it runs in the worker, never in a parent
+                # that forks
+                self._thread = threading.Thread(target=self._run, name='event-broadcaster', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if not self._remove(subscription):
+                return
+            self._subscribers -= 1
+
+    def _remove(self, subscription):
+        removed = False
+        for topic in subscription.topics:
+            subscribers = self._by_topic.get(topic)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                removed = True
+                if not subscribers:
+                    del self._by_topic[topic]
+        return removed
+
+    def notify(self):
+        """Check for new events now rather than at the next poll."""
+        if self._subscribers:
+            self._wake.set()
+
+    def publish(self, rows):
+        """Queue (id, topic, type, data) rows for their topics' subscribers."""
+        with self._lock:
+            for event_id, topic, event_type, data in rows:
+                for subscription in tuple(self._by_topic.get(topic, ())):
+                    try:
+                        subscription.queue.put_nowait((event_id, topic, event_type, data))
+                        self._stats['delivered'] += 1
+                    except queue.Full:
+                        # Too far behind: disconnect it; it resumes from the log
+                        subscription.dropped = True
+                        self._remove(subscription)
+                        self._subscribers -= 1
+                        self._stats['dropped_clients'] += 1
+                    if subscription.wake is not None:
+                        subscription.wake()
+
+    def _poll(self, conn):
+        while True:
+            rows = conn.execute('''
+                SELECT id, topic, type, data FROM events WHERE id > ? ORDER BY id LIMIT ?
+            ''', (self._last_id, POLL_BATCH)).fetchall()
+            if not rows:
+                return
+            self._last_id = rows[-1][0]
+            self.publish(rows)
+            if len(rows) < POLL_BATCH:
+                return
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Idle: the next subscriber restarts the thread from the
+                    # tail as it was before that subscriber's replay, so
+                    # nothing falls in between
+                    self._thread = None
+                    self._last_id = None
+                    return
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+            try:
+                with db.pool.connection() as conn:
+                    self._poll(conn)
+            except Exception:
+                logger.exception('Event broadcaster poll failed')
+                time.sleep(POLL_INTERVAL)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = self._subscribers
+            stats['topics'] = len(self._by_topic)
+        return stats
+
+
+broadcaster = Broadcaster()
+
+
+def current_id(conn):
+    return conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+
+
+def replay(conn, topics, last_event_id):
+    """Events after last_event_id for topics, or None if they are no longer all kept.
+
+    Called after subscribing, so together with the live queue nothing
+    committed since last_event_id is missed.
+    """
+    oldest = conn.execute('SELECT MIN(id) FROM events').fetchone()[0]
+    if oldest is not None and last_event_id < oldest - 1:
+        return None
+    placeholders = ','.join('?' * len(topics))
+    # Clients reconnect within seconds, so the id range is short; walking it
+    # in order beats gathering and sorting each topic's whole history
+    rows = conn.execute(f'''
+        SELECT id, topic, type, data FROM events
+        WHERE id > ? AND topic IN ({placeholders})
+        ORDER BY id LIMIT ?
+    ''', (last_event_id, *topics, MAX_REPLAY + 1)).fetchall()
+    return None if len(rows) > MAX_REPLAY else rows
+
+
+def _opening(missed, reset):
+    yield f'retry: {RECONNECT_MS}\n\n'
+    if reset:
+        # Too much was missed to replay; the client should refetch
+        yield 'event: reset\ndata: {}\n\n'
+    for event_id, topic, event_type, data in missed:
+        yield format_event(event_id, event_type, topic, data)
+
+
+def stream(subscription, missed=(), reset=False, last_event_id=0):
+    """The SSE body: replayed events, then live ones until the stream times out."""
+    # Queued events the client already has are skipped
+    last_sent = missed[-1][0] if missed else last_event_id
+    try:
+        yield from _opening(missed, reset)
+
+        deadline = time.monotonic() + STREAM_SECONDS
+        while not subscription.dropped:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                event_id, topic, event_type, data = subscription.queue.get(
+                    timeout=min(HEARTBEAT_SECONDS, remaining))
+            except queue.Empty:
+                yield ': heartbeat\n\n'
+                continue
+            # Live events may overlap the replayed ones
+            if event_id > last_sent:
+                last_sent = event_id
+                yield format_event(event_id, event_type, topic, data)
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+async def stream_async(subscription, missed=(), reset=False, last_event_id=0):
+    """stream() for the async server: waits for events on the event loop."""
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    # Events queued before this point are already in the queue
+    subscription.wake = lambda: loop.call_soon_threadsafe(ready.set)
+    last_sent = missed[-1][0] if missed else last_event_id
+    try:
+        for chunk in _opening(missed, reset):
+            yield chunk
+
+        deadline = loop.time() + STREAM_SECONDS
+        while not subscription.dropped:
+            try:
+                event_id, topic, event_type, data = subscription.queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                # An event queued after the check above sets it again
+                ready.clear()
+                try:
+                    await asyncio.wait_for(ready.wait(), min(HEARTBEAT_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    yield ': heartbeat\n\n'
+                continue
+            if event_id > last_sent:
+                last_sent = event_id
+                yield format_event(event_id, event_type, topic, data)
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+def _wake_after_write(response):
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        broadcaster.notify()
+    return response
+
+
+def init_app(app):
+    """Wake the broadcaster after each write request so local changes go out at once."""
+    app.after_request(_wake_after_write)
+
+
+@jobs.every(PRUNE_INTERVAL, name='event-prune')
+def prune_events(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute(f"DELETE FROM events WHERE created_at < datetime('now', '-{RETENTION_MINUTES} minutes')")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
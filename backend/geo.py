@@ -0,0 +1,204 @@
+"""
+Coordinates for vendors and wholesalers, and "wholesalers near me".
+
+Both tables get latitude/longitude columns. Rows whose coordinates are not
+given are placed at the centre of their locality, looked up by triggers in
+the localities table ("Ghatkopar", or "Pune, Maharashtra" by its first
+part). Wholesaler positions are mirrored into the wholesaler_geo R*Tree, so
+a nearby lookup reads only the wholesalers inside the search circle's
+bounding box and computes the exact great-circle distance for those alone.
+"""
+
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+DEFAULT_RADIUS_KM = 5.0
+MAX_RADIUS_KM = 100.0
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Locality -> approximate centre (latitude, longitude)
+LOCALITIES = {
+    'Andheri': (19.1136, 72.8697),
+    'Bandra': (19.0596, 72.8295),
+    'Borivali': (19.2307, 72.8567),
+    'Byculla': (18.9793, 72.8383),
+    'Chembur': (19.0522, 72.9005),
+    'Colaba': (18.9067, 72.8147),
+    'Dadar': (19.0178, 72.8478),
+    'Ghatkopar': (19.0860, 72.9081),
+    'Goregaon': (19.1663, 72.8526),
+    'Kandivali': (19.2047, 72.8517),
+    'Kurla': (19.0726, 72.8845),
+    'Malad': (19.1874, 72.8484),
+    'Mulund': (19.1726, 72.9565),
+    'Powai': (19.1176, 72.9060),
+    'Sion': (19.0390, 72.8619),
+    'Thane': (19.2183, 72.9781),
+    'Vashi': (19.0771, 72.9986),
+    'Vikhroli': (19.1110, 72.9280),
+    'Worli': (19.0176, 72.8172),
+    'Mumbai': (19.0760, 72.8777),
+    'Pune': (18.5204, 73.8567),
+    'Nashik': (19.9975, 73.7898),
+    'Nagpur': (21.1458, 79.0882),
+    'Aurangabad': (19.8762, 75.3433),
+}
+
+
+def _seed_localities(conn):
+    conn.executemany('INSERT OR IGNORE INTO localities (name, latitude, longitude) VALUES (?, ?, ?)',
+                     ((name, lat, lon) for name, (lat, lon) in LOCALITIES.items()))
+
+
+def _locality_coordinates(location):
+    # "Pune, Maharashtra" is looked up as "Pune"
+    return f'''(SELECT latitude, longitude FROM localities
+                WHERE name = trim(substr({location}, 1, instr({location} || ',', ',') - 1)))'''
+
+
+def geo_statements():
+    """Migration steps for coordinates, localities and the wholesaler R*Tree."""
+    statements = [
+        '''
+        CREATE TABLE IF NOT EXISTS localities (
+            name TEXT PRIMARY KEY COLLATE NOCASE,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        _seed_localities,
+    ]
+    for table in ('vendors', 'wholesalers'):
+        statements += [
+            f'ALTER TABLE {table} ADD COLUMN latitude REAL',
+            f'ALTER TABLE {table} ADD COLUMN longitude REAL',
+            f'''
+            UPDATE {table} SET (latitude, longitude) = {_locality_coordinates(f'{table}.location')}
+            WHERE latitude IS NULL
+            ''',
+            # New rows without coordinates start at their locality's centre
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_geo_locate
+            AFTER INSERT ON {table}
+            WHEN new.latitude IS NULL AND new.location IS NOT NULL
+            BEGIN
+                UPDATE {table} SET (latitude, longitude) = {_locality_coordinates('new.location')}
+                WHERE id = new.id;
+            END
+            ''',
+            # Moving to another locality moves the pin too, unless the same
+            # update sets coordinates explicitly
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_geo_relocate
+            AFTER UPDATE OF location ON {table}
+            WHEN new.location IS NOT old.location
+                 AND new.latitude IS old.latitude AND new.longitude IS old.longitude
+            BEGIN
+                UPDATE {table} SET (latitude, longitude) = {_locality_coordinates('new.location')}
+                WHERE id = new.id;
+            END
+            ''',
+        ]
+    statements += [
+        # Points are stored as zero-size boxes
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS wholesaler_geo USING rtree(
+            id, min_lat, max_lat, min_lon, max_lon
+        )
+        ''',
+        '''
+        INSERT OR REPLACE INTO wholesaler_geo (id, min_lat, max_lat, min_lon, max_lon)
+        SELECT id, latitude, latitude, longitude, longitude FROM wholesalers
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_wholesalers_geo_insert
+        AFTER INSERT ON wholesalers
+        WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO wholesaler_geo (id, min_lat, max_lat, min_lon, max_lon)
+            VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_wholesalers_geo_update
+        AFTER UPDATE OF latitude, longitude ON wholesalers
+        BEGIN
+            DELETE FROM wholesaler_geo WHERE id = old.id;
+            INSERT INTO wholesaler_geo (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+            WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_wholesalers_geo_delete
+        AFTER DELETE ON wholesalers
+        BEGIN
+            DELETE FROM wholesaler_geo WHERE id = old.id;
+        END
+        ''',
+    ]
+    return statements
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat, lon, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) enclosing the circle."""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    # Degrees of longitude shrink towards the poles; clamp so the box stays finite
+    dlon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lat + dlat, max(lon - dlon, -180.0), min(lon + dlon, 180.0)
+
+
+NEARBY_QUERY = '''
+    SELECT w.id, w.name, w.shop_name, w.location, w.latitude, w.longitude,
+           w.trust_score, w.response_rate, w.delivery_rate, r.review_count, r.rating_sum
+    FROM wholesaler_geo g JOIN wholesalers w ON w.id = g.id
+    LEFT JOIN wholesaler_ratings r ON r.wholesaler_id = w.id
+    WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ?
+      AND w.is_approved = 1
+'''
+
+
+def parse_nearby_args(args):
+    """Validate ?lat=&lon=&radius=&limit=; lat/lon are None if not given."""
+    try:
+        lat = float(args['lat']) if args.get('lat') not in (None, '') else None
+        lon = float(args['lon']) if args.get('lon') not in (None, '') else None
+    except ValueError:
+        raise ValueError('lat and lon must be numbers')
+    if (lat is None) != (lon is None):
+        raise ValueError('lat and lon must be given together')
+    if lat is not None and not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError('lat must be within ±90 and lon within ±180')
+    try:
+        radius = float(args.get('radius', DEFAULT_RADIUS_KM))
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError('radius must be a number and limit an integer')
+    if not 0 < radius <= MAX_RADIUS_KM:
+        raise ValueError(f'radius must be between 0 and {MAX_RADIUS_KM:g} km')
+    return lat, lon, radius, max(1, min(limit, MAX_LIMIT))
+
+
+def nearby_wholesalers(conn, lat, lon, radius_km=DEFAULT_RADIUS_KM, limit=DEFAULT_LIMIT):
+    """Approved wholesalers within radius_km, nearest first, as (distance_km, row)."""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    candidates = conn.execute(NEARBY_QUERY, (min_lat, max_lat, min_lon, max_lon))
+    ranked = []
+    for row in candidates:
+        distance = haversine_km(lat, lon, row['latitude'], row['longitude'])
+        # The box's corners lie outside the circle
+        if distance <= radius_km:
+            ranked.append((distance, row))
+    return heapq.nsmallest(limit, ranked, key=lambda item: item[0])
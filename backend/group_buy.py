@@ -0,0 +1,278 @@
+"""
+Group-buy pooling for group_buy_eligible products.
+
+Vendors in the same location who want the same product join one open pool.
+A pool keeps running totals (quantity, members, current tier price) that are
+updated as each vendor joins, so its status is a single indexed row read.
+At most one pool per (product, location) is open at a time, enforced by a
+partial unique index.
+
+A pool closes when its quantity reaches the target or its deadline passes.
+Closing takes each member's pledge, in the order they joined, from stock
+with the same conditional decrement checkout uses; a pledge the remaining
+stock cannot cover is marked failed. The confirmed pledges then become
+orders at the tier price their combined quantity reaches, and a pool with no
+confirmed member closes as failed. Orders only exist once a pool closes, so analytics and
+order listings never see provisional prices.
+"""
+
+import jobs
+from catalog import stock_status_sql
+
+POOL_WINDOW_HOURS = 24
+DEFAULT_TARGET_QUANTITY = 100
+SWEEP_INTERVAL = 60
+
+# (minimum pooled quantity, discount percent) used for products without
+# their own rows in group_buy_tiers
+DEFAULT_TIERS = ((0, 0.0), (25, 5.0), (50, 8.0), (100, 12.0))
+
+
+def group_buy_statements():
+    """Migration steps for pools, their members and price tiers."""
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS group_pools (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            wholesaler_id INTEGER NOT NULL,
+            location TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'open',
+            base_price REAL NOT NULL,
+            unit_price REAL NOT NULL,
+            total_quantity INTEGER NOT NULL DEFAULT 0,
+            member_count INTEGER NOT NULL DEFAULT 0,
+            target_quantity INTEGER NOT NULL,
+            closes_at DATETIME NOT NULL,
+            closed_at DATETIME,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+        ''',
+        # One open pool per product and location; also the O(1) status lookup
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_group_pools_open
+        ON group_pools (product_id, location) WHERE status = 'open'
+        ''',
+        # The closing sweep only touches open pools past their deadline
+        '''
+        CREATE INDEX IF NOT EXISTS idx_group_pools_deadline
+        ON group_pools (closes_at) WHERE status = 'open'
+        ''',
+        # Pools mid-close; empty outside a closing transaction
+        '''
+        CREATE INDEX IF NOT EXISTS idx_group_pools_closing
+        ON group_pools (id) WHERE status = 'closing'
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS group_pool_members (
+            pool_id INTEGER NOT NULL,
+            vendor_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (pool_id, vendor_id)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS group_buy_tiers (
+            product_id INTEGER NOT NULL,
+            min_quantity INTEGER NOT NULL,
+            discount_percent REAL NOT NULL,
+            PRIMARY KEY (product_id, min_quantity)
+        ) WITHOUT ROWID
+        ''',
+        'ALTER TABLE orders ADD COLUMN pool_id INTEGER REFERENCES group_pools (id)',
+        'CREATE INDEX IF NOT EXISTS idx_orders_pool ON orders (pool_id) WHERE pool_id IS NOT NULL',
+    ]
+
+
+def member_status_statements():
+    """Migration steps recording whether each pledge was confirmed when its pool closed."""
+    return [
+        # 'pledged' while the pool is open, then 'confirmed' or 'failed'
+        "ALTER TABLE group_pool_members ADD COLUMN status TEXT NOT NULL DEFAULT 'pledged'",
+    ]
+
+
+class GroupBuyError(Exception):
+    """A join request that cannot be honoured, with a client-facing message."""
+
+
+def tiers_for(conn, product_id):
+    rows = conn.execute('''
+        SELECT min_quantity, discount_percent FROM group_buy_tiers
+        WHERE product_id = ? ORDER BY min_quantity
+    ''', (product_id,)).fetchall()
+    return [tuple(row) for row in rows] or list(DEFAULT_TIERS)
+
+
+def tier_price(base_price, tiers, quantity):
+    """Unit price at ``quantity`` and the next tier as (min_quantity, price) or None."""
+    discount, next_tier = 0.0, None
+    for min_quantity, percent in tiers:
+        if quantity >= min_quantity:
+            discount = percent
+        elif next_tier is None:
+            next_tier = (min_quantity, round(base_price * (1 - percent / 100), 2))
+    return round(base_price * (1 - discount / 100), 2), next_tier
+
+
+def open_pool(conn, product_id, location):
+    return conn.execute('''
+        SELECT * FROM group_pools
+        WHERE product_id = ? AND location = ? AND status = 'open'
+    ''', (product_id, location)).fetchone()
+
+
+def join_pool(conn, vendor_id, product_id, quantity):
+    """Add a vendor's quantity to the open pool for their location.
+
+    Creates the pool if there is none and closes it straight away if this
+    pledge reaches the target. Returns the pool's id.
+    """
+    if quantity <= 0:
+        raise GroupBuyError('quantity must be positive')
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        vendor = conn.execute('SELECT location FROM vendors WHERE id = ? AND is_approved = 1',
+                              (vendor_id,)).fetchone()
+        if vendor is None or not vendor['location']:
+            raise GroupBuyError('Vendor must be approved and have a location')
+        product = conn.execute('''
+            SELECT p.id, p.price, p.stock, p.wholesaler_id, p.group_buy_eligible
+            FROM products p JOIN wholesalers w ON p.wholesaler_id = w.id
+            WHERE p.id = ? AND w.is_approved = 1
+        ''', (product_id,)).fetchone()
+        if product is None:
+            raise GroupBuyError('Product not found')
+        if not product['group_buy_eligible']:
+            raise GroupBuyError('Product is not eligible for group buying')
+
+        pool = open_pool(conn, product_id, vendor['location'])
+        if pool is None:
+            cursor = conn.execute(f'''
+                INSERT INTO group_pools (product_id, wholesaler_id, location, base_price, unit_price,
+                                         target_quantity, closes_at)
+                VALUES (?, ?, ?, ?, ?, ?, datetime('now', '+{POOL_WINDOW_HOURS} hours'))
+            ''', (product_id, product['wholesaler_id'], vendor['location'], product['price'],
+                  product['price'], DEFAULT_TARGET_QUANTITY))
+            pool = conn.execute('SELECT * FROM group_pools WHERE id = ?',
+                                (cursor.lastrowid,)).fetchone()
+        # Pledges beyond the current stock could never be confirmed
+        available = max((product['stock'] or 0) - pool['total_quantity'], 0)
+        if quantity > available:
+            raise GroupBuyError(f'Only {available} more can be pledged to this pool')
+
+        member = conn.execute('SELECT 1 FROM group_pool_members WHERE pool_id = ? AND vendor_id = ?',
+                              (pool['id'], vendor_id)).fetchone()
+        conn.execute('''
+            INSERT INTO group_pool_members (pool_id, vendor_id, quantity) VALUES (?, ?, ?)
+            ON CONFLICT (pool_id, vendor_id) DO UPDATE SET quantity = quantity + excluded.quantity
+        ''', (pool['id'], vendor_id, quantity))
+
+        total = pool['total_quantity'] + quantity
+        unit_price, _ = tier_price(pool['base_price'], tiers_for(conn, product_id), total)
+        conn.execute('''
+            UPDATE group_pools
+            SET total_quantity = ?, member_count = member_count + ?, unit_price = ?
+            WHERE id = ?
+        ''', (total, 0 if member else 1, unit_price, pool['id']))
+
+        if total >= pool['target_quantity']:
+            _close_pools(conn, 'id = ?', (pool['id'],))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return pool['id']
+
+
+def _close_pools(conn, condition, params):
+    """Confirm member orders and close every open pool matching ``condition``.
+
+    Must run inside the caller's write transaction. Pools are first marked
+    'closing' so the member pass and the final status change work on
+    exactly the same set with plain indexed lookups.
+    """
+    closing = conn.execute(f'''
+        UPDATE group_pools SET status = 'closing'
+        WHERE status = 'open' AND {condition}
+    ''', params).rowcount
+    if closing:
+        members = conn.execute('''
+            SELECT g.id AS pool_id, g.wholesaler_id, g.product_id, g.base_price, m.vendor_id, m.quantity
+            FROM group_pools g JOIN group_pool_members m ON m.pool_id = g.id
+            WHERE g.status = 'closing'
+            ORDER BY g.id, m.joined_at, m.vendor_id
+        ''').fetchall()
+        confirmed = {}
+        for member in members:
+            # The same condition as checkout, so a pool never oversells
+            taken = conn.execute(f'''
+                UPDATE products SET stock = stock - :quantity, status = {stock_status_sql('stock - :quantity')}
+                WHERE id = :id AND stock >= :quantity
+            ''', {'quantity': member['quantity'], 'id': member['product_id']}).rowcount
+            conn.execute('UPDATE group_pool_members SET status = ? WHERE pool_id = ? AND vendor_id = ?',
+                         ('confirmed' if taken else 'failed', member['pool_id'], member['vendor_id']))
+            if taken:
+                confirmed.setdefault(member['pool_id'], []).append(member)
+
+        # Priced at the tier the confirmed quantity reaches, not the pledged one
+        for pool_id, pool_members in confirmed.items():
+            first = pool_members[0]
+            total = sum(member['quantity'] for member in pool_members)
+            unit_price, _ = tier_price(first['base_price'], tiers_for(conn, first['product_id']), total)
+            conn.execute('UPDATE group_pools SET total_quantity = ?, unit_price = ? WHERE id = ?',
+                         (total, unit_price, pool_id))
+            conn.executemany('''
+                INSERT INTO orders (wholesaler_id, vendor_id, product_id, quantity, total_amount,
+                                    status, pool_id)
+                VALUES (?, ?, ?, ?, ?, 'confirmed', ?)
+            ''', ((member['wholesaler_id'], member['vendor_id'], member['product_id'], member['quantity'],
+                   round(member['quantity'] * unit_price, 2), pool_id) for member in pool_members))
+        conn.execute('''
+            UPDATE group_pools
+            SET status = CASE WHEN EXISTS (
+                    SELECT 1 FROM group_pool_members m
+                    WHERE m.pool_id = group_pools.id AND m.status = 'confirmed'
+                ) THEN 'closed' ELSE 'failed' END,
+                closed_at = CURRENT_TIMESTAMP
+            WHERE status = 'closing'
+        ''')
+    return closing
+
+
+def close_expired_pools(conn):
+    """Close every open pool past its deadline; returns how many closed."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        closed = _close_pools(conn, "closes_at <= datetime('now')", ())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return closed
+
+
+@jobs.every(SWEEP_INTERVAL, name='group-buy-sweep')
+def scheduled_sweep(conn):
+    close_expired_pools(conn)
+
+
+def serialize_pool(conn, pool):
+    _, next_tier = tier_price(pool['base_price'], tiers_for(conn, pool['product_id']),
+                              pool['total_quantity'])
+    return {
+        'poolId': pool['id'],
+        'productId': pool['product_id'],
+        'location': pool['location'],
+        'status': pool['status'],
+        'basePrice': pool['base_price'],
+        'unitPrice': pool['unit_price'],
+        'totalQuantity': pool['total_quantity'],
+        'memberCount': pool['member_count'],
+        'targetQuantity': pool['target_quantity'],
+        'closesAt': pool['closes_at'],
+        'nextTier': {'minQuantity': next_tier[0], 'unitPrice': next_tier[1]} if next_tier else None
+    }
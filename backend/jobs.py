@@ -0,0 +1,47 @@
+"""
+Periodic background jobs.
+
+Each job runs on its own daemon thread with a pooled connection, so it never
+holds up a request. Jobs must be safe to run concurrently from several worker
+processes; they take the SQLite write lock with BEGIN IMMEDIATE and re-check
+their own progress markers inside the transaction.
+"""
+
+import logging
+import threading
+
+import db
+
+logger = logging.getLogger(__name__)
+
+_jobs = []
+_stop = threading.Event()
+
+
+def every(seconds, name=None):
+    """Register ``fn(conn)`` to run every ``seconds`` once jobs are started."""
+    def decorator(fn):
+        _jobs.append((name or fn.__name__, seconds, fn))
+        return fn
+    return decorator
+
+
+def _run(name, seconds, fn):
+    while not _stop.wait(seconds):
+        try:
+            with db.pool.connection() as conn:
+                fn(conn)
+        except Exception:
+            logger.exception('Background job %s failed', name)
+
+
+def start():
+    """Start one thread per registered job."""
+    _stop.clear()
+    for name, seconds, fn in _jobs:
+        threading.Thread(target=_run, args=(name, seconds, fn),
+                         name=f'job-{name}', daemon=True).start()
+
+
+def stop():
+    _stop.set()
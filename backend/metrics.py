@@ -0,0 +1,324 @@
+"""
+In-process request and query metrics, exposed in Prometheus text format.
+
+Every request is timed from before_request until its body has been sent
+(streamed bodies included) and counted by route, method and status along
+with the bytes sent. Every SQLite statement run through a pooled connection
+is timed and counted under its normalized SQL (literals replaced by ?),
+together with the rows it returned or changed and the virtual machine
+steps it took, counted by a progress handler. A statement that reads a
+handful of rows but takes millions of steps is a table scan.
+
+Statements slower than SLOW_QUERY_MS are logged to the ``slow_query``
+logger with the route (or background job) that ran them.
+
+Metrics are per process: under the pre-forked server each worker keeps its
+own, and a scrape of /api/metrics sees whichever worker answered it.
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_request_context, request
+
+import db
+
+slow_query_log = logging.getLogger('slow_query')
+
+# Request and query latency buckets, in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_SLOW_QUERY_MS = 250
+# The progress handler fires every PROGRESS_STEPS VM instructions, so step
+# counts are accurate to that granularity
+PROGRESS_STEPS = 1000
+# Distinct normalized statements tracked; the rest are counted as 'other'
+MAX_QUERY_SERIES = 500
+NAMESPACE = 'sahaayak_'
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w?])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count, as Prometheus expects."""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(DURATION_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.slow_query_ms = DEFAULT_SLOW_QUERY_MS
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # (method, route, status) -> [requests, response bytes]
+            self.requests = {}
+            # (method, route) -> Histogram
+            self.request_durations = {}
+            # normalized sql -> [calls, seconds, rows, vm steps]
+            self.queries = {}
+            self.query_durations = Histogram()
+            # route -> slow statements
+            self.slow_queries = {}
+            self._normalized = OrderedDict()
+
+    def normalize(self, sql):
+        """SQL with literals replaced by ? and whitespace collapsed (memoized)."""
+        normalized = self._normalized.get(sql)
+        if normalized is None:
+            normalized = _STRING_LITERAL.sub('?', sql)
+            normalized = _NUMBER_LITERAL.sub('?', normalized)
+            normalized = _PLACEHOLDER_LIST.sub('(...)', normalized)
+            normalized = _WHITESPACE.sub(' ', normalized).strip()
+            with self._lock:
+                self._normalized[sql] = normalized
+                if len(self._normalized) > MAX_QUERY_SERIES * 4:
+                    self._normalized.popitem(last=False)
+        return normalized
+
+    def query_stat(self, sql):
+        key = self.normalize(sql)
+        stat = self.queries.get(key)
+        if stat is None:
+            with self._lock:
+                if len(self.queries) >= MAX_QUERY_SERIES:
+                    key = 'other'
+                stat = self.queries.setdefault(key, [0, 0.0, 0, 0])
+        return stat
+
+    def record_request(self, method, route, status, seconds, size):
+        with self._lock:
+            counts = self.requests.setdefault((method, route, status), [0, 0])
+            counts[0] += 1
+            counts[1] += size
+            histogram = self.request_durations.get((method, route))
+            if histogram is None:
+                histogram = self.request_durations[(method, route)] = Histogram()
+            histogram.observe(seconds)
+
+    def record_query(self, stat, sql, seconds, rows, steps):
+        with self._lock:
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] += rows
+            stat[3] += steps
+            self.query_durations.observe(seconds)
+        if self.slow_query_ms and seconds * 1000 >= self.slow_query_ms:
+            route = current_route()
+            with self._lock:
+                self.slow_queries[route] = self.slow_queries.get(route, 0) + 1
+            slow_query_log.warning('%.1fms route=%s rows=%d steps=%d sql=%s',
+                                   seconds * 1000, route, rows, steps, self.normalize(sql))
+
+    def record_fetch(self, stat, seconds, rows, steps):
+        # Rows and time spent stepping through a result after execute()
+        with self._lock:
+            stat[1] += seconds
+            stat[2] += rows
+            stat[3] += steps
+
+
+registry = Registry()
+
+
+def current_route():
+    if has_request_context():
+        return request.url_rule.rule if request.url_rule else 'unmatched'
+    # Background jobs run on threads named job-<name>
+    return threading.current_thread().name
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement and the rows fetched from it."""
+
+    _stat = None
+
+    def _run(self, method, sql, parameters):
+        conn = self.connection
+        stat = self._stat = registry.query_stat(sql)
+        steps = conn.steps
+        started = time.perf_counter()
+        try:
+            return method(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            # rowcount is -1 for SELECT; their rows are counted as fetched
+            registry.record_query(stat, sql, elapsed, max(self.rowcount, 0),
+                                  (conn.steps - steps) * PROGRESS_STEPS)
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters)
+
+    def _fetch(self, method, *args):
+        steps = self.connection.steps
+        started = time.perf_counter()
+        rows = method(*args)
+        if self._stat is not None:
+            count = len(rows) if isinstance(rows, list) else int(rows is not None)
+            registry.record_fetch(self._stat, time.perf_counter() - started, count,
+                                  (self.connection.steps - steps) * PROGRESS_STEPS)
+        return rows
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        row = super().__next__()
+        if self._stat is not None:
+            self._stat[2] += 1
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose statements all go through InstrumentedCursor."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.steps = 0
+        self.set_progress_handler(self._progress, PROGRESS_STEPS)
+
+    def _progress(self):
+        self.steps += 1
+        return 0  # never interrupt
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute bypasses an overridden cursor().execute
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _before_request():
+    g.request_started = time.perf_counter()
+
+
+def _after_request(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    method, route, status = request.method, current_route(), response.status_code
+
+    if response.is_streamed:
+        # Count the bytes as they are sent; the request ends when the body does
+        sent = [0]
+        body = response.response
+
+        def counting(chunks=body):
+            for chunk in chunks:
+                sent[0] += len(chunk)
+                yield chunk
+        response.response = counting()
+        size = lambda: sent[0]
+    else:
+        length = response.content_length or 0
+        size = lambda: length
+
+    response.call_on_close(lambda: registry.record_request(
+        method, route, status, time.perf_counter() - started, size()))
+    return response
+
+
+def init_app(app):
+    """Time requests and instrument every connection the pool opens."""
+    registry.slow_query_ms = app.config.get('SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)
+    db.pool.factory = InstrumentedConnection
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram_lines(name, labels, histogram):
+    cumulative = 0
+    for bound, count in zip(DURATION_BUCKETS, histogram.counts):
+        cumulative += count
+        yield f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}'
+    yield f'{name}_bucket{_labels(**labels, le="+Inf")} {histogram.count}'
+    yield f'{name}_sum{_labels(**labels)} {histogram.sum:.6f}'
+    yield f'{name}_count{_labels(**labels)} {histogram.count}'
+
+
+def _metric(lines, name, kind, help_text, samples=()):
+    name = NAMESPACE + name
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+    for labels, value in samples:
+        lines.append(f'{name}{_labels(**labels) if labels else ""} {value}')
+
+
+def render(gauges=None):
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with registry._lock:
+        requests = sorted(registry.requests.items())
+        _metric(lines, 'http_requests_total', 'counter', 'Requests by route, method and status.',
+                ((dict(method=m, route=r, status=s), count) for (m, r, s), (count, _) in requests))
+        _metric(lines, 'http_response_bytes_total', 'counter', 'Response body bytes sent.',
+                ((dict(method=m, route=r, status=s), size) for (m, r, s), (_, size) in requests))
+        _metric(lines, 'http_request_duration_seconds', 'histogram',
+                'Time from request start until the response body was sent.')
+        for (m, r), histogram in sorted(registry.request_durations.items()):
+            lines.extend(_histogram_lines(NAMESPACE + 'http_request_duration_seconds',
+                                          {'method': m, 'route': r}, histogram))
+
+        queries = sorted(registry.queries.items())
+        _metric(lines, 'db_queries_total', 'counter', 'Statements executed, by normalized SQL.',
+                (({'sql': sql}, stat[0]) for sql, stat in queries))
+        _metric(lines, 'db_query_seconds_total', 'counter', 'Time spent executing and fetching.',
+                (({'sql': sql}, f'{stat[1]:.6f}') for sql, stat in queries))
+        _metric(lines, 'db_query_rows_total', 'counter', 'Rows returned or changed.',
+                (({'sql': sql}, stat[2]) for sql, stat in queries))
+        _metric(lines, 'db_query_vm_steps_total', 'counter',
+                f'SQLite VM instructions, sampled every {PROGRESS_STEPS}.',
+                (({'sql': sql}, stat[3]) for sql, stat in queries))
+        _metric(lines, 'db_query_duration_seconds', 'histogram', 'Statement execution time.')
+        lines.extend(_histogram_lines(NAMESPACE + 'db_query_duration_seconds', {},
+                                      registry.query_durations))
+        _metric(lines, 'db_slow_queries_total', 'counter',
+                f'Statements slower than {registry.slow_query_ms}ms, by route.',
+                (({'route': route}, count) for route, count in sorted(registry.slow_queries.items())))
+
+    for name, value in sorted((gauges or {}).items()):
+        _metric(lines, name, 'gauge', name.replace('_', ' ').capitalize() + '.', [(None, value)])
+    return '\n'.join(lines) + '\n'
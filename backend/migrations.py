@@ -0,0 +1,203 @@
+"""
+Versioned schema migrations.
+
+init_db creates the baseline tables; everything after that is an ordered
+migration step recorded in schema_version, so startup only applies the steps
+a database has not seen yet. Run this module directly to migrate the local
+database and verify that the hot queries are served by indexes:
+
+    python migrations.py
+"""
+
+import sys
+
+from analytics import rollup_statements
+from cache import version_trigger_statements
+from catalog import product_query
+from catalog_io import bulk_load_statements
+from checkout import checkout_statements
+from credit import credit_statements
+from events import event_statements
+from counters import version_trigger_statements as counter_trigger_statements
+from geo import NEARBY_QUERY, geo_statements
+from group_buy import group_buy_statements, member_status_statements
+from reorder import reorder_statements, suggestion_query
+from reviews import review_query, review_statements
+from search import search_index_statements
+from uploads import upload_statements
+
+# (version, description, statements). Append only: never edit or reorder a
+# step once it has shipped, add a new one instead.
+MIGRATIONS = [
+    (1, 'index approved wholesalers and products by wholesaler', [
+        # Covers the wholesaler side of the /api/products join
+        'CREATE INDEX IF NOT EXISTS idx_wholesalers_approved ON wholesalers (is_approved, id, name)',
+        'CREATE INDEX IF NOT EXISTS idx_products_wholesaler ON products (wholesaler_id)',
+    ]),
+    (2, 'index approved vendors and vendor login', [
+        'CREATE INDEX IF NOT EXISTS idx_vendors_approved ON vendors (is_approved)',
+        # wholesalers.phone is UNIQUE and already has an automatic index
+        'CREATE INDEX IF NOT EXISTS idx_vendors_phone ON vendors (phone)',
+    ]),
+    (3, 'index orders and reviews by wholesaler', [
+        'CREATE INDEX IF NOT EXISTS idx_orders_wholesaler_created ON orders (wholesaler_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_reviews_wholesaler ON reviews (wholesaler_id)',
+    ]),
+    (4, 'index product sort keys for keyset pagination', [
+        # The rowid is implicitly the last key column, matching the
+        # (sort value, id) cursor
+        'CREATE INDEX IF NOT EXISTS idx_products_price ON products (price)',
+        'CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)',
+        'CREATE INDEX IF NOT EXISTS idx_products_category_price ON products (category, price)',
+    ]),
+    (5, 'data version counters for response cache invalidation', version_trigger_statements()),
+    (6, 'FTS5 product search index and spoken-name aliases', search_index_statements()),
+    (7, 'daily analytics rollup state', rollup_statements()),
+    (8, 'let bulk catalog imports defer per-row insert triggers', bulk_load_statements()),
+    (9, 'group-buy pools, members and price tiers', group_buy_statements()),
+    (10, 'ignore view and like counter flushes in the products data version',
+     counter_trigger_statements()),
+    (11, 'content-addressed uploads and their resized variants', upload_statements()),
+    (12, 'vendor and wholesaler coordinates with an R*Tree over wholesalers', geo_statements()),
+    (13, 'append-only pay-later credit ledger with per-vendor balance snapshots',
+     credit_statements()),
+    (14, 'incrementally maintained wholesaler rating aggregates', review_statements()),
+    (15, 'change events for product stock and orders, for SSE subscribers', event_statements()),
+    (16, 'stock reservations for checkout, with status derived from stock', checkout_statements()),
+    (17, 'per-vendor product purchase statistics for reorder suggestions', reorder_statements()),
+    (18, 'group-buy member outcomes, confirmed or failed for lack of stock',
+     member_status_statements()),
+]
+
+# Queries the routes run on every request, with representative parameters.
+# check_query_plans() fails if any of them falls back to a full table scan.
+HOT_QUERIES = {
+    'products': product_query(),
+    'products_by_price': product_query('price-low', max_budget=100, cursor=(45.0, 1)),
+    'products_by_category': product_query('price-high', category='Vegetables', cursor=(45.0, 1)),
+    'products_by_name': product_query('name', cursor=('Fresh Spinach', 2)),
+    'vendors': ('SELECT * FROM vendors WHERE is_approved = 1', ()),
+    'vendor_login': ('SELECT id, name, is_approved FROM vendors WHERE phone = ? AND password = ?',
+                     ('9876543210', 'vendor123')),
+    'wholesaler_login': ('SELECT id, name, is_approved FROM wholesalers WHERE phone = ? AND password = ?',
+                         ('9999999999', 'password123')),
+    'wholesaler_orders': ('SELECT * FROM orders WHERE wholesaler_id = ? ORDER BY created_at DESC',
+                          (1,)),
+    'wholesaler_reviews': ('SELECT * FROM reviews WHERE wholesaler_id = ?', (1,)),
+    'group_pool_status': ('''
+        SELECT * FROM group_pools
+        WHERE product_id = ? AND location = ? AND status = 'open'
+    ''', (1, 'Ghatkopar')),
+    'group_pool_sweep': ("SELECT id FROM group_pools WHERE status = 'open' AND closes_at <= datetime('now')", ()),
+    'wholesaler_analytics': ('''
+        SELECT date, total_orders, total_revenue, active_customers
+        FROM analytics
+        WHERE wholesaler_id = ? AND date BETWEEN ? AND ?
+        ORDER BY date
+    ''', (1, '2025-01-01', '2025-01-31')),
+    'wholesalers_nearby': (NEARBY_QUERY, (19.04, 19.13, 72.86, 72.95)),
+    'wholesaler_review_page': review_query(wholesaler_id=1, before_id=1000),
+    'vendor_review_page': review_query(vendor_id=1),
+    'event_replay': ('''
+        SELECT id, topic, type, data FROM events
+        WHERE id > ? AND topic IN (?, ?)
+        ORDER BY id LIMIT ?
+    ''', (0, 'product:1', 'vendor:1:orders', 501)),
+    'event_tail': ('SELECT id, topic, type, data FROM events WHERE id > ? ORDER BY id LIMIT ?', (0, 1000)),
+    'reservation_sweep': ('''
+        UPDATE stock_reservations SET status = 'releasing'
+        WHERE status = 'held' AND expires_at <= datetime('now')
+    ''', ()),
+    'reservation_release': ('''
+        SELECT l.product_id, SUM(l.quantity) AS quantity
+        FROM stock_reservations r JOIN stock_reservation_lines l ON l.reservation_id = r.id
+        WHERE r.status = 'releasing'
+        GROUP BY l.product_id
+    ''', ()),
+    'credit_history': ('''
+        SELECT id, kind, amount_paise, balance_after_paise, description, reference, created_at
+        FROM credit_ledger
+        WHERE vendor_id = ? AND id < ?
+        ORDER BY id DESC LIMIT ?
+    ''', (1, 1000, 20)),
+    'reorder_suggestions': suggestion_query(1),
+}
+
+
+def current_version(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(conn):
+    """Apply pending migrations in order; returns the versions applied."""
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current_version(conn):
+            continue
+        # IMMEDIATE takes the write lock up front so two workers starting
+        # together cannot both apply the same step
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                         (version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+def query_plan(conn, sql, params=()):
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+
+def check_query_plans(conn, queries=None):
+    """Return {name: plan} for hot queries that are not served by an index.
+
+    Paged queries must walk an index in ORDER BY order; for them a plain rowid
+    scan is fine because it stops after LIMIT rows, but a temp B-tree sort is
+    not. Everything else must not scan a table.
+    """
+    problems = {}
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        plan = query_plan(conn, sql, params)
+        paged = 'LIMIT' in sql
+        if paged:
+            bad = any('TEMP B-TREE' in step for step in plan)
+        else:
+            bad = any(step.startswith('SCAN ') and 'INDEX' not in step for step in plan)
+        if bad:
+            problems[name] = plan
+    return problems
+
+
+if __name__ == '__main__':
+    import db
+    from app import init_db
+
+    init_db()
+    with db.pool.connection() as conn:
+        print(f'Schema version: {current_version(conn)}')
+        problems = check_query_plans(conn)
+    for name, plan in problems.items():
+        print(f'❌ {name} does not use an index: {plan}')
+    if problems:
+        sys.exit(1)
+    print('✅ All hot queries use an index')
@@ -0,0 +1,234 @@
+"""
+Reorder suggestions from each vendor's purchase history.
+
+vendor_product_stats keeps one row per (vendor, product) the vendor has
+ordered: how many orders, the total quantity, and the first and last order
+times. From those the typical quantity is total / count and the typical
+interval between orders is (last - first) / (count - 1), so next_due, the
+last order plus one interval, is stored with the row and indexed by
+(vendor_id, next_due). Suggestions are then one index range scan per vendor
+that stops at the page limit, however long the vendor's history.
+
+Every statistic is a count, sum, min or max, so orders can be folded in any
+order and in any grouping. A trigger folds each order as it is placed, inside
+the writing transaction. Orders up to reorder_state.history_through (those
+that existed when the table was created or last rebuilt) are left to
+fold_history(), which works through them in id windows with one set-based
+statement each, in the background job below or from the command line:
+
+    python reorder.py rebuild
+
+Until it has caught up, suggestions only reflect the history folded so far.
+Like the analytics rollup, orders are counted once, when placed.
+"""
+
+import sys
+
+import jobs
+
+# Orders folded per transaction, so a long rebuild never holds the write
+# lock for more than a moment at a time
+BATCH_SIZE = 50000
+FOLD_INTERVAL = 60
+DEFAULT_HORIZON_DAYS = 3
+MAX_HORIZON_DAYS = 30
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Items this many intervals overdue are ones the vendor stopped buying
+LAPSED_INTERVALS = 3
+
+
+def _next_due(last, first, count):
+    """SQL for the last order time plus the mean interval between orders."""
+    return (f'CASE WHEN {count} > 1 AND {last} > {first} '
+            f'THEN {last} + ({last} - {first}) / ({count} - 1) END')
+
+
+_UPSERT = f'''
+    ON CONFLICT (vendor_id, product_id) DO UPDATE SET
+        order_count = order_count + excluded.order_count,
+        total_quantity = total_quantity + excluded.total_quantity,
+        first_ordered = MIN(first_ordered, excluded.first_ordered),
+        last_ordered = MAX(last_ordered, excluded.last_ordered),
+        next_due = {_next_due('MAX(last_ordered, excluded.last_ordered)',
+                              'MIN(first_ordered, excluded.first_ordered)',
+                              'order_count + excluded.order_count')}
+'''
+
+
+def reorder_statements():
+    """Migration steps for purchase statistics and the trigger that maintains them."""
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS vendor_product_stats (
+            vendor_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            order_count INTEGER NOT NULL,
+            total_quantity INTEGER NOT NULL,
+            -- Julian day numbers, so intervals are plain subtraction
+            first_ordered REAL NOT NULL,
+            last_ordered REAL NOT NULL,
+            next_due REAL,
+            PRIMARY KEY (vendor_id, product_id)
+        ) WITHOUT ROWID
+        ''',
+        # Items bought only once have no interval and are never due
+        '''
+        CREATE INDEX IF NOT EXISTS idx_vendor_product_stats_due
+        ON vendor_product_stats (vendor_id, next_due) WHERE next_due IS NOT NULL
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS reorder_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            history_through INTEGER NOT NULL,
+            folded_through INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        # Existing orders are history for fold_history(); the trigger takes the rest
+        '''
+        INSERT OR IGNORE INTO reorder_state (id, history_through)
+        SELECT 1, COALESCE(MAX(id), 0) FROM orders
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_orders_reorder_stats AFTER INSERT ON orders
+        WHEN new.vendor_id IS NOT NULL AND new.product_id IS NOT NULL
+             AND new.created_at IS NOT NULL
+             AND new.id > (SELECT history_through FROM reorder_state)
+             AND NOT (SELECT active FROM bulk_load)
+        BEGIN
+            INSERT INTO vendor_product_stats
+                (vendor_id, product_id, order_count, total_quantity, first_ordered, last_ordered)
+            VALUES (new.vendor_id, new.product_id, 1, COALESCE(new.quantity, 0),
+                    julianday(new.created_at), julianday(new.created_at))
+            {_UPSERT};
+        END
+        ''',
+    ]
+
+
+def fold_history(conn, batch_size=BATCH_SIZE):
+    """Fold history orders not yet counted; returns orders processed."""
+    processed = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            low, target = conn.execute(
+                'SELECT folded_through, history_through FROM reorder_state').fetchone()
+            high, count = conn.execute('''
+                SELECT MAX(id), COUNT(*)
+                FROM (SELECT id FROM orders WHERE id > ? AND id <= ? ORDER BY id LIMIT ?)
+            ''', (low, target, batch_size)).fetchone()
+            if high is None:
+                conn.rollback()
+                return processed
+
+            # WHERE before ON CONFLICT keeps the upsert from parsing as a join
+            conn.execute(f'''
+                INSERT INTO vendor_product_stats
+                    (vendor_id, product_id, order_count, total_quantity,
+                     first_ordered, last_ordered, next_due)
+                SELECT vendor_id, product_id, COUNT(*), COALESCE(SUM(quantity), 0),
+                       MIN(julianday(created_at)), MAX(julianday(created_at)),
+                       {_next_due('MAX(julianday(created_at))', 'MIN(julianday(created_at))',
+                                  'COUNT(*)')}
+                FROM orders
+                WHERE id > ? AND id <= ?
+                  AND vendor_id IS NOT NULL AND product_id IS NOT NULL AND created_at IS NOT NULL
+                GROUP BY vendor_id, product_id
+                {_UPSERT}
+            ''', (low, high))
+            conn.execute('UPDATE reorder_state SET folded_through = ?', (high,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        processed += count
+
+
+def rebuild(conn, batch_size=BATCH_SIZE):
+    """Discard the statistics and rebuild them from the full order history.
+
+    Orders placed while this runs are counted by the trigger.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM vendor_product_stats')
+        conn.execute('''
+            UPDATE reorder_state
+            SET history_through = (SELECT COALESCE(MAX(id), 0) FROM orders), folded_through = 0
+        ''')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return fold_history(conn, batch_size)
+
+
+@jobs.every(FOLD_INTERVAL, name='reorder-history')
+def scheduled_fold(conn):
+    fold_history(conn)
+
+
+def parse_options(args):
+    """(horizon days, limit) from ?days=&limit=; raises ValueError."""
+    try:
+        days = float(args.get('days', DEFAULT_HORIZON_DAYS))
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        raise ValueError('days must be a number and limit an integer')
+    if not 0 <= days <= MAX_HORIZON_DAYS:
+        raise ValueError(f'days must be between 0 and {MAX_HORIZON_DAYS}')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {MAX_LIMIT}')
+    return days, limit
+
+
+def suggestion_query(vendor_id, days=DEFAULT_HORIZON_DAYS, limit=DEFAULT_LIMIT):
+    """Items due within ``days``, most overdue first, skipping lapsed ones."""
+    return ('''
+        SELECT s.product_id, p.name, p.price, p.stock, w.name AS wholesaler_name,
+               s.order_count, s.total_quantity, s.first_ordered, s.last_ordered,
+               datetime(s.last_ordered) AS last_ordered_at, datetime(s.next_due) AS due_at,
+               julianday('now') - s.next_due AS days_overdue
+        FROM vendor_product_stats s
+        JOIN products p ON p.id = s.product_id
+        JOIN wholesalers w ON w.id = p.wholesaler_id
+        WHERE s.vendor_id = ? AND s.next_due <= julianday('now') + ?
+          AND julianday('now') - s.next_due
+              <= ? * (s.last_ordered - s.first_ordered) / (s.order_count - 1)
+          AND w.is_approved = 1
+        ORDER BY s.next_due
+        LIMIT ?
+    ''', (vendor_id, days, LAPSED_INTERVALS, limit))
+
+
+def suggestions(conn, vendor_id, days=DEFAULT_HORIZON_DAYS, limit=DEFAULT_LIMIT):
+    sql, params = suggestion_query(vendor_id, days, limit)
+    return [{
+        'productId': row['product_id'],
+        'name': row['name'],
+        'price': row['price'],
+        'wholesaler': row['wholesaler_name'],
+        'inStock': (row['stock'] or 0) > 0,
+        'orderCount': row['order_count'],
+        'typicalQuantity': max(1, round(row['total_quantity'] / row['order_count'])),
+        'averageIntervalDays': round((row['last_ordered'] - row['first_ordered'])
+                                     / (row['order_count'] - 1), 1),
+        'lastOrderedAt': row['last_ordered_at'],
+        'dueAt': row['due_at'],
+        'daysOverdue': round(row['days_overdue'], 1),
+    } for row in conn.execute(sql, params)]
+
+
+if __name__ == '__main__':
+    import db
+    from app import init_db
+
+    init_db()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'fold'
+    if command not in ('fold', 'rebuild'):
+        print('Usage: python reorder.py [fold|rebuild]')
+        sys.exit(2)
+    with db.pool.connection() as conn:
+        count = rebuild(conn) if command == 'rebuild' else fold_history(conn)
+    print(f'✅ Folded {count} orders into reorder statistics')
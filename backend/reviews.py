@@ -0,0 +1,279 @@
+"""
+Vendor reviews of wholesalers and per-wholesaler rating aggregates.
+
+wholesaler_ratings keeps each wholesaler's review count, rating sum and
+star histogram. Triggers on reviews adjust it on every insert, delete and
+rating change, inside the writing transaction, so listings show real
+ratings by joining one small row per wholesaler instead of averaging its
+reviews on every request.
+
+Review lists are newest first and paged by review id.
+"""
+
+import sys
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_COMMENT_LENGTH = 2000
+STARS = (1, 2, 3, 4, 5)
+
+
+def _histogram(sign, rating):
+    return ', '.join(f'stars_{n} = stars_{n} {sign} ({rating} = {n})' for n in STARS)
+
+
+def review_statements():
+    """Migration steps for rating aggregates and verified-order reviews."""
+    star_columns = ',\n'.join(f'            stars_{n} INTEGER NOT NULL DEFAULT 0' for n in STARS)
+    remove_old = f'''
+                UPDATE wholesaler_ratings
+                SET review_count = review_count - 1, rating_sum = rating_sum - old.rating,
+                    {_histogram('-', 'old.rating')}
+                WHERE wholesaler_id = old.wholesaler_id
+                  AND old.rating BETWEEN 1 AND 5;'''
+    add_new = f'''
+                INSERT INTO wholesaler_ratings (wholesaler_id) SELECT new.wholesaler_id
+                WHERE new.wholesaler_id IS NOT NULL AND new.rating BETWEEN 1 AND 5
+                ON CONFLICT (wholesaler_id) DO NOTHING;
+                UPDATE wholesaler_ratings
+                SET review_count = review_count + 1, rating_sum = rating_sum + new.rating,
+                    {_histogram('+', 'new.rating')}
+                WHERE wholesaler_id = new.wholesaler_id
+                  AND new.rating BETWEEN 1 AND 5;'''
+    return [
+        f'''
+        CREATE TABLE IF NOT EXISTS wholesaler_ratings (
+            wholesaler_id INTEGER PRIMARY KEY REFERENCES wholesalers (id),
+            review_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+{star_columns}
+        )
+        ''',
+        f'''
+        INSERT OR REPLACE INTO wholesaler_ratings
+            (wholesaler_id, review_count, rating_sum, {', '.join(f'stars_{n}' for n in STARS)})
+        SELECT wholesaler_id, COUNT(*), SUM(rating), {', '.join(f'SUM(rating = {n})' for n in STARS)}
+        FROM reviews
+        WHERE wholesaler_id IS NOT NULL AND rating BETWEEN 1 AND 5
+        GROUP BY wholesaler_id
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_reviews_rating_insert
+        AFTER INSERT ON reviews
+        BEGIN{add_new}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_reviews_rating_update
+        AFTER UPDATE OF rating, wholesaler_id ON reviews
+        WHEN new.rating IS NOT old.rating OR new.wholesaler_id IS NOT old.wholesaler_id
+        BEGIN{remove_old}{add_new}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_reviews_rating_delete
+        AFTER DELETE ON reviews
+        BEGIN{remove_old}
+        END
+        ''',
+        # Reviews may name the order they are about; one review per order
+        'ALTER TABLE reviews ADD COLUMN order_id INTEGER REFERENCES orders (id)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_reviews_order ON reviews (order_id) WHERE order_id IS NOT NULL',
+        'CREATE INDEX IF NOT EXISTS idx_reviews_vendor ON reviews (vendor_id)',
+    ]
+
+
+class ReviewError(Exception):
+    """A review request that cannot be honoured, with a client-facing message."""
+
+
+class ReviewNotFound(ReviewError):
+    """The review does not exist or belongs to someone else."""
+
+
+def average(review_count, rating_sum, unrated=None):
+    return round(rating_sum / review_count, 1) if review_count else unrated
+
+
+def listing_rating(review_count, rating_sum):
+    """Listings always show a number; reviewCount tells the UI it is unrated."""
+    return average(review_count, rating_sum, unrated=0.0)
+
+
+def trust_score(review_count, rating_sum, stored):
+    """The average rating once reviewed, else the wholesaler's stored trust_score."""
+    return average(review_count, rating_sum, unrated=stored)
+
+
+def _parse_rating(value):
+    try:
+        rating = int(value)
+    except (TypeError, ValueError):
+        raise ReviewError('rating must be an integer from 1 to 5')
+    if rating not in STARS:
+        raise ReviewError('rating must be an integer from 1 to 5')
+    return rating
+
+
+def _parse_comment(value):
+    comment = (value or '').strip() or None
+    if comment is not None and len(comment) > MAX_COMMENT_LENGTH:
+        raise ReviewError(f'comment must be at most {MAX_COMMENT_LENGTH} characters')
+    return comment
+
+
+def create_review(conn, vendor_id, wholesaler_id, rating, comment=None, order_id=None):
+    """Add a vendor's review; returns its id."""
+    rating = _parse_rating(rating)
+    comment = _parse_comment(comment)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        wholesaler = conn.execute('SELECT is_approved FROM wholesalers WHERE id = ?',
+                                  (wholesaler_id,)).fetchone()
+        if wholesaler is None or not wholesaler['is_approved']:
+            raise ReviewError('Wholesaler not found')
+        if order_id is not None:
+            order = conn.execute('SELECT wholesaler_id, vendor_id FROM orders WHERE id = ?',
+                                 (order_id,)).fetchone()
+            if order is None or order['vendor_id'] != vendor_id or order['wholesaler_id'] != wholesaler_id:
+                raise ReviewError('Order not found')
+            if conn.execute('SELECT 1 FROM reviews WHERE order_id = ?', (order_id,)).fetchone():
+                raise ReviewError('This order has already been reviewed')
+        review_id = conn.execute('''
+            INSERT INTO reviews (wholesaler_id, vendor_id, rating, comment, order_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (wholesaler_id, vendor_id, rating, comment, order_id)).lastrowid
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return review_id
+
+
+def update_review(conn, vendor_id, review_id, rating=None, comment=None):
+    """Change the rating and/or comment of the vendor's own review."""
+    changes, params = [], []
+    if rating is not None:
+        changes.append('rating = ?')
+        params.append(_parse_rating(rating))
+    if comment is not None:
+        changes.append('comment = ?')
+        params.append(_parse_comment(comment))
+    if not changes:
+        raise ReviewError('Nothing to update')
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        updated = conn.execute(f'UPDATE reviews SET {", ".join(changes)} WHERE id = ? AND vendor_id = ?',
+                               (*params, review_id, vendor_id)).rowcount
+        if not updated:
+            raise ReviewNotFound('Review not found')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def delete_review(conn, vendor_id, review_id):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        deleted = conn.execute('DELETE FROM reviews WHERE id = ? AND vendor_id = ?',
+                               (review_id, vendor_id)).rowcount
+        if not deleted:
+            raise ReviewNotFound('Review not found')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def reply_to_review(conn, wholesaler_id, review_id, reply):
+    """Set (or with an empty reply, clear) the wholesaler's reply."""
+    reply = _parse_comment(reply)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        updated = conn.execute('UPDATE reviews SET reply = ? WHERE id = ? AND wholesaler_id = ?',
+                               (reply, review_id, wholesaler_id)).rowcount
+        if not updated:
+            raise ReviewNotFound('Review not found')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def parse_list_args(args):
+    """Validate ?wholesaler_id=&vendor_id=&limit=&before_id= for list_reviews."""
+    try:
+        wholesaler_id = int(args['wholesaler_id']) if args.get('wholesaler_id') else None
+        vendor_id = int(args['vendor_id']) if args.get('vendor_id') else None
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+        before_id = int(args['before_id']) if args.get('before_id') else None
+    except ValueError:
+        raise ReviewError('wholesaler_id, vendor_id, limit and before_id must be integers')
+    return {'wholesaler_id': wholesaler_id, 'vendor_id': vendor_id,
+            'limit': max(1, min(limit, MAX_PAGE_SIZE)), 'before_id': before_id}
+
+
+def review_query(wholesaler_id=None, vendor_id=None, limit=DEFAULT_PAGE_SIZE, before_id=None,
+                 review_id=None):
+    """SQL and parameters for one page of reviews, newest first."""
+    where = ['rv.id < ?']
+    params = [before_id or sys.maxsize]
+    if review_id is not None:
+        where.append('rv.id = ?')
+        params.append(review_id)
+    if wholesaler_id is not None:
+        where.append('rv.wholesaler_id = ?')
+        params.append(wholesaler_id)
+    if vendor_id is not None:
+        where.append('rv.vendor_id = ?')
+        params.append(vendor_id)
+    sql = f'''
+        SELECT rv.id, rv.wholesaler_id, rv.vendor_id, rv.rating, rv.comment, rv.reply,
+               rv.created_at, v.name AS vendor_name, w.name AS wholesaler_name,
+               o.total_amount AS order_value
+        FROM reviews rv
+        LEFT JOIN vendors v ON v.id = rv.vendor_id
+        LEFT JOIN wholesalers w ON w.id = rv.wholesaler_id
+        LEFT JOIN orders o ON o.id = rv.order_id
+        WHERE {' AND '.join(where)}
+        ORDER BY rv.id DESC
+        LIMIT ?
+    '''
+    params.append(limit)
+    return sql, params
+
+
+def list_reviews(conn, **filters):
+    return conn.execute(*review_query(**filters)).fetchall()
+
+
+def get_review(conn, review_id):
+    return conn.execute(*review_query(limit=1, review_id=review_id)).fetchone()
+
+
+def rating_summary(conn, wholesaler_id):
+    row = conn.execute('SELECT * FROM wholesaler_ratings WHERE wholesaler_id = ?',
+                       (wholesaler_id,)).fetchone()
+    count = row['review_count'] if row else 0
+    return {
+        'wholesalerId': wholesaler_id,
+        'averageRating': average(count, row['rating_sum'] if row else 0),
+        'reviewCount': count,
+        'histogram': {str(n): row[f'stars_{n}'] if row else 0 for n in STARS}
+    }
+
+
+def serialize_review(row):
+    return {
+        'id': row['id'],
+        'wholesalerId': row['wholesaler_id'],
+        'wholesalerName': row['wholesaler_name'],
+        'vendorId': row['vendor_id'],
+        'vendorName': row['vendor_name'],
+        'rating': row['rating'],
+        'comment': row['comment'],
+        'reply': row['reply'],
+        'date': row['created_at'],
+        'orderValue': row['order_value']
+    }
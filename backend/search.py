@@ -0,0 +1,152 @@
+"""
+Full-text product search for the voice search bar.
+
+product_search is an FTS5 index over product name, category and wholesaler
+name, kept in sync with products and wholesalers by triggers. Queries match
+every spoken word as a prefix, with common Hindi/Marathi produce names
+expanded to their English catalog terms, and are ranked by BM25 with the
+product name weighted highest.
+"""
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# BM25 column weights for (name, category, wholesaler)
+RANK_WEIGHTS = (10.0, 2.0, 1.0)
+
+# Spoken word -> English catalog term. Words are matched one at a time, so
+# "hari mirch" becomes (hari OR green) AND (mirch OR chili).
+ALIASES = {
+    'tamatar': 'tomato', 'टमाटर': 'tomato',
+    'pyaj': 'onion', 'pyaz': 'onion', 'प्याज': 'onion', 'kanda': 'onion', 'कांदा': 'onion',
+    'palak': 'spinach', 'पालक': 'spinach',
+    'aloo': 'potato', 'alu': 'potato', 'आलू': 'potato', 'batata': 'potato', 'बटाटा': 'potato',
+    'gajar': 'carrot', 'गाजर': 'carrot',
+    'bhindi': 'okra', 'भिंडी': 'okra',
+    'baingan': 'brinjal', 'बैंगन': 'brinjal', 'vangi': 'brinjal', 'वांगी': 'brinjal',
+    'mirch': 'chili', 'mirchi': 'chili', 'मिर्च': 'chili', 'मिरची': 'chili',
+    'hari': 'green', 'हरी': 'green', 'lal': 'red', 'लाल': 'red',
+    'kela': 'banana', 'केला': 'banana', 'keli': 'banana', 'केळी': 'banana',
+    'seb': 'apple', 'सेब': 'apple',
+    'santra': 'orange', 'संतरा': 'orange', 'संत्रा': 'orange',
+    'doodh': 'milk', 'dudh': 'milk', 'दूध': 'milk',
+    'paneer': 'paneer', 'पनीर': 'paneer',
+    'haldi': 'turmeric', 'हल्दी': 'turmeric', 'halad': 'turmeric', 'हळद': 'turmeric',
+    'chawal': 'rice', 'चावल': 'rice', 'tandul': 'rice', 'तांदूळ': 'rice',
+    'atta': 'flour', 'आटा': 'flour', 'peeth': 'flour', 'पीठ': 'flour',
+    'gehun': 'wheat', 'गेहूं': 'wheat', 'gahu': 'wheat', 'गहू': 'wheat',
+    'machli': 'fish', 'मछली': 'fish', 'mase': 'fish', 'मासे': 'fish',
+    'jhinga': 'prawn', 'झींगा': 'prawn', 'kolambi': 'prawn', 'कोळंबी': 'prawn',
+}
+
+
+def _seed_aliases(conn):
+    conn.executemany('INSERT OR IGNORE INTO search_aliases (alias, term) VALUES (?, ?)',
+                     ALIASES.items())
+
+
+def search_index_statements():
+    """Migration steps creating, populating and syncing the search index."""
+    return [
+        # Prefix indexes answer the short prefixes of a half-spoken word without
+        # walking every matching term
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+            name, category, wholesaler,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS search_aliases (
+            alias TEXT PRIMARY KEY,
+            term TEXT NOT NULL
+        )
+        ''',
+        _seed_aliases,
+        '''
+        INSERT INTO product_search (rowid, name, category, wholesaler)
+        SELECT p.id, p.name, p.category, w.name
+        FROM products p LEFT JOIN wholesalers w ON p.wholesaler_id = w.id
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_products_search_insert AFTER INSERT ON products
+        BEGIN
+            INSERT INTO product_search (rowid, name, category, wholesaler)
+            VALUES (new.id, new.name, new.category,
+                    (SELECT name FROM wholesalers WHERE id = new.wholesaler_id));
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_products_search_update
+        AFTER UPDATE OF name, category, wholesaler_id ON products
+        BEGIN
+            DELETE FROM product_search WHERE rowid = old.id;
+            INSERT INTO product_search (rowid, name, category, wholesaler)
+            VALUES (new.id, new.name, new.category,
+                    (SELECT name FROM wholesalers WHERE id = new.wholesaler_id));
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_products_search_delete AFTER DELETE ON products
+        BEGIN
+            DELETE FROM product_search WHERE rowid = old.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_wholesalers_search_rename
+        AFTER UPDATE OF name ON wholesalers
+        BEGIN
+            UPDATE product_search SET wholesaler = new.name
+            WHERE rowid IN (SELECT id FROM products WHERE wholesaler_id = new.id);
+        END
+        ''',
+    ]
+
+
+def _quote(token):
+    return '"' + token.replace('"', '""') + '"'
+
+
+def match_expression(conn, query):
+    """Turn free text into an FTS5 MATCH expression, or None if it is empty.
+
+    Every word must match as a prefix; a word with a known alias may match
+    either spelling. Words are quoted so user input cannot inject FTS syntax.
+    """
+    words = [word.strip('.,!?;:()[]{}"\'').lower() for word in query.split()]
+    words = [word for word in words if word]
+    if not words:
+        return None
+
+    placeholders = ','.join('?' * len(words))
+    aliases = dict(conn.execute(
+        f'SELECT alias, term FROM search_aliases WHERE alias IN ({placeholders})', words))
+
+    clauses = []
+    for word in words:
+        term = aliases.get(word)
+        if term and term != word:
+            clauses.append(f'({_quote(word)}* OR {_quote(term)}*)')
+        else:
+            clauses.append(f'{_quote(word)}*')
+    return ' AND '.join(clauses)
+
+
+def search_products(conn, query, limit=DEFAULT_LIMIT):
+    """Top ``limit`` approved products matching ``query``, best first."""
+    expression = match_expression(conn, query)
+    if expression is None:
+        return []
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    return conn.execute(f'''
+        SELECT p.*, w.name AS wholesaler_name, r.review_count, r.rating_sum,
+               bm25(product_search, {weights}) AS score
+        FROM product_search
+        JOIN products p ON p.id = product_search.rowid
+        JOIN wholesalers w ON p.wholesaler_id = w.id
+        LEFT JOIN wholesaler_ratings r ON r.wholesaler_id = p.wholesaler_id
+        WHERE product_search MATCH ? AND w.is_approved = 1
+        ORDER BY score
+        LIMIT ?
+    ''', (expression, limit)).fetchall()
@@ -0,0 +1,108 @@
+"""
+Production server for Sahaayak.
+
+Runs the Flask app under gunicorn's pre-fork model: the master process
+opens the listening socket and migrates the database once, then forks one
+worker per core (WEB_CONCURRENCY), each serving WORKER_THREADS requests at a
+time. Workers are recycled after MAX_REQUESTS requests, and sending the
+master SIGHUP replaces all workers gracefully without dropping connections.
+
+With SERVER_MODE=async, workers instead run gunicorn's asyncio worker with
+the ASGI adapter in asgi.py: each holds up to WORKER_CONNECTIONS
+connections on an event loop and runs at most WORKER_THREADS requests at a
+time on its executor.
+
+Started by `python app.py` when FLASK_ENV=production, or directly:
+
+    FLASK_ENV=production python serve.py
+    SERVER_MODE=async FLASK_ENV=production python serve.py
+"""
+
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+import counters
+import db
+import jobs
+import static_assets
+from app import app, init_db
+from config import ProductionConfig
+
+
+def on_starting(server):
+    # Migrate once in the master so workers never race on schema changes
+    init_db()
+    db.pool.close_all()
+
+
+def post_fork(server, worker):
+    # SQLite connections must not cross a fork: start each worker with an
+    # empty pool and its own background job threads
+    db.pool.close_all()
+    jobs.start()
+    # Workers replaced by SIGHUP pick up a fresh frontend build
+    static_assets.refresh()
+
+
+def worker_exit(server, worker):
+    jobs.stop()
+    counters.flush_on_shutdown()
+
+
+class SahaayakServer(BaseApplication):
+
+    def __init__(self, application, settings):
+        self.application = application
+        self.settings = settings
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.settings.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+SERVER_MODES = ('sync', 'async')
+
+
+def gunicorn_settings(config=ProductionConfig):
+    if config.SERVER_MODE not in SERVER_MODES:
+        raise SystemExit(f"SERVER_MODE must be one of {', '.join(SERVER_MODES)}")
+    if config.SERVER_MODE == 'async':
+        # Threads are the adapter's executor (asgi.py), not gunicorn's
+        workers = {'worker_class': 'asgi', 'worker_connections': config.WORKER_CONNECTIONS}
+    else:
+        workers = {'worker_class': 'gthread', 'threads': config.THREADS}
+    return {
+        'bind': config.BIND,
+        'workers': config.WORKERS,
+        **workers,
+        'max_requests': config.MAX_REQUESTS,
+        'max_requests_jitter': config.MAX_REQUESTS_JITTER,
+        'timeout': config.TIMEOUT,
+        'graceful_timeout': config.GRACEFUL_TIMEOUT,
+        'on_starting': on_starting,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+    }
+
+
+def application(config=ProductionConfig):
+    if config.SERVER_MODE == 'async':
+        import asgi
+        return asgi.application
+    return app
+
+
+def run(config=ProductionConfig):
+    settings = gunicorn_settings(config)
+    print(f"🚀 Starting {config.WORKERS} {config.SERVER_MODE} workers x {config.THREADS} threads "
+          f"on {config.BIND}")
+    SahaayakServer(application(config), settings).run()
+
+
+if __name__ == '__main__':
+    sys.exit(run())
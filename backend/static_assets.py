@@ -0,0 +1,143 @@
+"""
+In-memory manifest of the built frontend (dist/).
+
+The manifest is built once at startup: every file's size, mtime, content
+hash and content type, plus gzip (and, if the optional brotli package is
+installed, brotli) variants written next to compressible files. Serving a
+path is then a dict lookup and a send_file of the best variant the client
+accepts; nothing touches the filesystem to decide what to send. Vite's
+content-hashed assets (assets/index-3f9a1c2b.js) never change under the
+same name, so they are marked immutable and browsers do not ask for them
+again.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import request, send_file
+
+try:
+    import brotli
+except ImportError:  # optional: gzip-only without it
+    brotli = None
+
+DIST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dist')
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                      'application/xml', 'application/manifest+json')
+MIN_COMPRESS_SIZE = 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Vite output names such as assets/index-3f9a1c2b.js or assets/logo-D4kq_9Zb.svg
+HASHED_NAME = re.compile(r'(^|/)assets/.+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+_VARIANT_SUFFIXES = ('.gz', '.br')
+
+manifest = {}
+
+
+def _digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            sha.update(block)
+    return sha.hexdigest()[:32]
+
+
+def _compressible(mimetype, size):
+    return size >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def _ensure_variant(source, suffix, compress):
+    """Write source+suffix unless an up-to-date one exists; returns its path."""
+    target = source + suffix
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source):
+        with open(source, 'rb') as f:
+            data = compress(f.read())
+        tmp = f'{target}.{os.getpid()}.tmp'  # workers may refresh concurrently
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, target)
+    return target
+
+
+def build_manifest(dist_path=DIST_PATH):
+    """Scan dist_path and return {relative path: entry}, precompressing as needed."""
+    entries = {}
+    if not os.path.isdir(dist_path):
+        return entries
+    for root, _, files in os.walk(dist_path):
+        for name in files:
+            if name.endswith(_VARIANT_SUFFIXES) or name.endswith('.tmp'):
+                continue
+            full_path = os.path.join(root, name)
+            rel_path = os.path.relpath(full_path, dist_path).replace(os.sep, '/')
+            stat = os.stat(full_path)
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+            variants = {}
+            if _compressible(mimetype, stat.st_size):
+                try:
+                    variants['gzip'] = _ensure_variant(
+                        full_path, '.gz', lambda data: gzip.compress(data, 9, mtime=0))
+                    if brotli is not None:
+                        variants['br'] = _ensure_variant(full_path, '.br', brotli.compress)
+                except OSError:
+                    # Read-only dist/: serve the uncompressed file
+                    variants = {}
+
+            entries[rel_path] = {
+                'path': full_path,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'etag': _digest(full_path),
+                'mimetype': mimetype,
+                'immutable': bool(HASHED_NAME.search(rel_path)),
+                'variants': variants,
+            }
+    return entries
+
+
+def refresh(dist_path=DIST_PATH):
+    """Rebuild the manifest in place, e.g. after a new frontend build."""
+    entries = build_manifest(dist_path)
+    manifest.clear()
+    manifest.update(entries)
+
+
+def _pick_encoding(entry):
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in entry['variants'] and accepted[encoding] > 0:
+            return encoding
+    return None
+
+
+def send_asset(rel_path):
+    """Response for a manifest entry, or None if the path is not in dist/."""
+    entry = manifest.get(rel_path)
+    if entry is None:
+        return None
+
+    encoding = _pick_encoding(entry)
+    path = entry['variants'][encoding] if encoding else entry['path']
+    # send_file hands the open file to the server's wsgi.file_wrapper, which
+    # gunicorn serves with sendfile()
+    response = send_file(
+        path,
+        mimetype=entry['mimetype'],
+        etag=entry['etag'] + ('-' + encoding if encoding else ''),
+        last_modified=entry['mtime'],
+        conditional=True,
+    )
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if entry['variants']:
+        response.vary.add('Accept-Encoding')
+    if entry['immutable']:
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
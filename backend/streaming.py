@@ -0,0 +1,112 @@
+"""
+Streaming JSON responses for list endpoints.
+
+Rows are pulled from the SQLite cursor in batches and encoded as they go, so
+a listing never holds the whole result set in memory and clients receive the
+first rows before the query has finished. The body is either the usual JSON
+object ({"items": [...], ...}) or NDJSON, one object per line, depending on
+the request's Accept header. Some listings also offer a columnar encoding
+(see columnar.py).
+"""
+
+import json
+
+from flask import Response, request, stream_with_context
+
+BATCH_SIZE = 500
+NDJSON_MIMETYPE = 'application/x-ndjson'
+COLUMNAR_MIMETYPE = 'application/vnd.sahaayak.columnar+json'
+RESPONSE_FORMATS = {'application/json': 'json', NDJSON_MIMETYPE: 'ndjson', COLUMNAR_MIMETYPE: 'columnar'}
+# Set in the WSGI environ by the async server (asgi.py); a view may store an
+# async iterable there for the server to send as the response body
+ASYNC_BODY = 'sahaayak.async_body'
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+
+def iter_batches(cursor, batch_size=BATCH_SIZE):
+    """Yield lists of up to batch_size rows from a cursor."""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def iter_cursor(cursor, batch_size=BATCH_SIZE):
+    """Yield rows from a cursor, fetching batch_size rows at a time."""
+    for rows in iter_batches(cursor, batch_size):
+        yield from rows
+
+
+def response_format():
+    """'json', 'ndjson' or 'columnar', from the request's Accept header."""
+    best = request.accept_mimetypes.best_match(list(RESPONSE_FORMATS))
+    return RESPONSE_FORMATS.get(best, 'json')
+
+
+def wants_ndjson():
+    return response_format() == 'ndjson'
+
+
+def async_aware(body, async_body):
+    """Response body that the async server sends from ``async_body`` instead.
+
+    Under WSGI servers ``body`` is returned unchanged. Under asgi.py the
+    view returns an empty body and the event loop iterates ``async_body``,
+    so waiting on it does not occupy a worker thread.
+    """
+    if ASYNC_BODY not in request.environ:
+        return body
+    request.environ[ASYNC_BODY] = async_body
+    # Not a sequence, so no Content-Length is set
+    return iter(())
+
+
+def _json_body(key, items, trailer):
+    yield '{' + _encode(key) + ':['
+    batch = []
+    separator = ''
+    for item in items:
+        batch.append(_encode(item))
+        if len(batch) >= BATCH_SIZE:
+            yield separator + ','.join(batch)
+            separator = ','
+            batch = []
+    if batch:
+        yield separator + ','.join(batch)
+    yield ']'
+    for name, value in (trailer() if trailer else {}).items():
+        yield ',' + _encode(name) + ':' + _encode(value)
+    yield '}'
+
+
+def _ndjson_body(items, trailer):
+    batch = []
+    for item in items:
+        batch.append(_encode(item) + '\n')
+        if len(batch) >= BATCH_SIZE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+    # Pagination details are only known once the rows are exhausted, so NDJSON
+    # clients get them as a final {"meta": {...}} line
+    meta = trailer() if trailer else {}
+    if meta:
+        yield _encode({'meta': meta}) + '\n'
+
+
+def stream_list(key, items, trailer=None):
+    """Stream an iterable of dicts as {key: [...]} or NDJSON.
+
+    trailer is called after the last item and returns extra top-level fields,
+    such as the cursor for the next page.
+    """
+    if wants_ndjson():
+        body, mimetype = _ndjson_body(items, trailer), NDJSON_MIMETYPE
+    else:
+        body, mimetype = _json_body(key, items, trailer), 'application/json'
+    # stream_with_context keeps the request's pooled connection checked out
+    # until the generator finishes
+    return Response(stream_with_context(body), mimetype=mimetype)
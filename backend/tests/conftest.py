@@ -0,0 +1,17 @@
+import pytest
+
+import db
+
+
+@pytest.fixture
+def seeded_db(tmp_path):
+    """Connection to a fresh, fully migrated database with the sample data."""
+    from app import init_db
+
+    db.configure(database=str(tmp_path / 'test.db'))
+    init_db()
+    try:
+        with db.pool.connection() as conn:
+            yield conn
+    finally:
+        db.configure(database=db.DATABASE)
@@ -0,0 +1,66 @@
+import sqlite3
+import threading
+import time
+
+import counters
+import db
+
+
+def test_pending_counts_stay_visible_until_the_flush_commits(seeded_db):
+    product_counters = counters.ShardedCounters()
+    product_counters.incr(1, 'views', 3)
+
+    # Another writer holds the lock, so the flush has to wait for it
+    blocker = sqlite3.connect(db.pool.database, isolation_level=None)
+    blocker.execute('BEGIN IMMEDIATE')
+    started = threading.Event()
+
+    def run_flush():
+        with db.pool.connection() as conn:
+            started.set()
+            counters.flush(conn, product_counters)
+
+    flusher = threading.Thread(target=run_flush)
+    flusher.start()
+    started.wait()
+    time.sleep(0.2)
+    product_counters.incr(1, 'likes')
+    assert product_counters.pending(1) == (3, 1)
+
+    blocker.rollback()
+    blocker.close()
+    flusher.join()
+
+    # The like counted mid-flush was not in its snapshot, so it stays pending
+    assert product_counters.pending(1) == (0, 1)
+    views, likes = seeded_db.execute('SELECT views, likes FROM products WHERE id = 1').fetchone()
+    assert (views, likes) == (234 + 3, 12)
+
+
+def test_shards_are_spread_across_threads():
+    product_counters = counters.ShardedCounters()
+    shards = set()
+
+    def count():
+        shards.add(id(product_counters._shard()))
+        product_counters.incr(1, 'views')
+
+    threads = [threading.Thread(target=count) for _ in range(counters.SHARDS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(shards) == counters.SHARDS
+    assert product_counters.pending(1) == (counters.SHARDS, 0)
+
+
+def test_likes_for_unknown_products_are_not_counted(seeded_db):
+    from app import app
+
+    client = app.test_client()
+    assert client.post('/api/products/99999/like').status_code == 404
+    assert counters.product_counters.pending(99999) == (0, 0)
+    assert client.post('/api/products/1/like').status_code == 200
+    assert counters.product_counters.pending(1)[1] >= 1
+    # Written here rather than by the shutdown flush, after this database is gone
+    counters.flush(seeded_db)
@@ -0,0 +1,73 @@
+from datetime import date, timedelta
+
+import pytest
+
+import credit
+
+
+@pytest.fixture
+def vendor(seeded_db):
+    credit.enroll(seeded_db, 1, '1234 5678 9012')
+    return 1
+
+
+def balance(conn, vendor_id):
+    row = credit.account(conn, vendor_id)
+    return row['principal_paise'], row['interest_paise']
+
+
+def test_draw_over_limit_is_refused(seeded_db, vendor):
+    credit.draw(seeded_db, vendor, 2500)
+    with pytest.raises(credit.CreditError, match='Only ₹500.00 of credit is available'):
+        credit.draw(seeded_db, vendor, 500.01)
+
+    assert balance(seeded_db, vendor) == (250000, 0)
+    assert credit.reconcile(seeded_db) == []
+
+
+def test_repay_over_balance_is_refused(seeded_db, vendor):
+    credit.draw(seeded_db, vendor, 100)
+    with pytest.raises(credit.CreditError, match='more than the ₹100.00 outstanding'):
+        credit.repay(seeded_db, vendor, 100.01)
+
+    credit.repay(seeded_db, vendor, 100)
+    assert balance(seeded_db, vendor) == (0, 0)
+    assert credit.account(seeded_db, vendor)['due_date'] is None
+    assert credit.reconcile(seeded_db) == []
+
+
+@pytest.mark.parametrize('amount, message', [
+    (1e17, 'at most'),
+    (1e300, 'at most'),
+    ('1e999999999', 'at most'),
+    ('nan', 'must be a number'),
+    (0.001, 'must be positive'),
+])
+def test_out_of_range_amounts_are_refused(seeded_db, vendor, amount, message):
+    with pytest.raises(credit.CreditError, match=message):
+        credit.repay(seeded_db, vendor, amount)
+
+
+def test_accrual_charges_overdue_principal_once_and_blocks(seeded_db, vendor):
+    credit.draw(seeded_db, vendor, 1000)
+    seeded_db.execute('UPDATE credit_accounts SET due_date = ? WHERE vendor_id = ?',
+                      ((date.today() - timedelta(days=20)).isoformat(), vendor))
+    seeded_db.commit()
+
+    yesterday = date.today() - timedelta(days=1)
+    assert credit.accrue_interest(seeded_db, yesterday) == 1
+    assert credit.accrue_interest(seeded_db, yesterday) == 0
+
+    # 5% a month on ₹1000, for one day
+    assert balance(seeded_db, vendor) == (100000, 167)
+    assert credit.account(seeded_db, vendor)['status'] == 'blocked'
+    assert credit.reconcile(seeded_db) == []
+    with pytest.raises(credit.CreditError, match='blocked'):
+        credit.draw(seeded_db, vendor, 1)
+
+    # Interest is paid off first; clearing the balance unblocks the account
+    credit.repay(seeded_db, vendor, 1.67)
+    assert balance(seeded_db, vendor) == (100000, 0)
+    credit.repay(seeded_db, vendor, 1000)
+    assert credit.account(seeded_db, vendor)['status'] == 'active'
+    assert credit.reconcile(seeded_db) == []
@@ -0,0 +1,25 @@
+import pytest
+
+import events
+from app import app
+
+
+@pytest.fixture
+def client(seeded_db):
+    return app.test_client()
+
+
+def test_unread_streams_unsubscribe(client):
+    for _ in range(3):
+        client.head('/api/events?topics=product:1').close()
+    assert events.broadcaster.stats()['subscribers'] == 0
+
+
+def test_failed_replay_unsubscribes(client, monkeypatch):
+    def replay(*args):
+        raise RuntimeError('replay failed')
+
+    monkeypatch.setattr(events, 'replay', replay)
+    with pytest.raises(RuntimeError):
+        client.get('/api/events?topics=product:1&lastEventId=0')
+    assert events.broadcaster.stats()['subscribers'] == 0
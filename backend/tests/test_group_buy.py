@@ -0,0 +1,50 @@
+import pytest
+
+import group_buy
+
+
+def pledge(conn, vendor_id, quantity, product_id=1):
+    return group_buy.join_pool(conn, vendor_id, product_id, quantity)
+
+
+def test_pledges_beyond_stock_are_rejected(seeded_db):
+    seeded_db.execute('UPDATE products SET stock = 30 WHERE id = 1')
+    seeded_db.commit()
+    with pytest.raises(group_buy.GroupBuyError, match='Only 30 more can be pledged'):
+        pledge(seeded_db, 1, 31)
+
+
+def test_partial_failure_prices_at_the_confirmed_tier(seeded_db):
+    # Vendors 1 and 2 share a location, so they join the same pool
+    seeded_db.execute("UPDATE vendors SET location = 'Ghatkopar' WHERE id = 2")
+    seeded_db.commit()
+    pool_id = pledge(seeded_db, 1, 40)
+    pledge(seeded_db, 2, 40)
+    pool = seeded_db.execute('SELECT unit_price FROM group_pools WHERE id = ?', (pool_id,)).fetchone()
+    assert pool['unit_price'] == 41.40  # 80 units: 8% off 45.00
+
+    seeded_db.execute('UPDATE products SET stock = 50 WHERE id = 1')
+    seeded_db.execute("UPDATE group_pools SET closes_at = datetime('now', '-1 minute')")
+    seeded_db.commit()
+    assert group_buy.close_expired_pools(seeded_db) == 1
+
+    members = dict(seeded_db.execute(
+        'SELECT vendor_id, status FROM group_pool_members WHERE pool_id = ?', (pool_id,)).fetchall())
+    assert members == {1: 'confirmed', 2: 'failed'}
+    pool = seeded_db.execute('SELECT * FROM group_pools WHERE id = ?', (pool_id,)).fetchone()
+    assert (pool['status'], pool['total_quantity'], pool['unit_price']) == ('closed', 40, 42.75)
+    orders = seeded_db.execute(
+        'SELECT vendor_id, quantity, total_amount FROM orders WHERE pool_id = ?', (pool_id,)).fetchall()
+    assert [tuple(order) for order in orders] == [(1, 40, 1710.0)]
+    assert seeded_db.execute('SELECT stock FROM products WHERE id = 1').fetchone()[0] == 10
+
+
+def test_pool_with_no_stock_left_fails(seeded_db):
+    pool_id = pledge(seeded_db, 1, 10)
+    seeded_db.execute('UPDATE products SET stock = 5 WHERE id = 1')
+    seeded_db.execute("UPDATE group_pools SET closes_at = datetime('now', '-1 minute')")
+    seeded_db.commit()
+    group_buy.close_expired_pools(seeded_db)
+
+    assert seeded_db.execute('SELECT status FROM group_pools WHERE id = ?', (pool_id,)).fetchone()[0] == 'failed'
+    assert seeded_db.execute('SELECT COUNT(*) FROM orders WHERE pool_id = ?', (pool_id,)).fetchone()[0] == 0
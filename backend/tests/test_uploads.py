@@ -0,0 +1,46 @@
+import io
+import os
+import sqlite3
+
+import pytest
+
+import uploads
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    folder = tmp_path / 'uploads'
+    (folder / 'tmp').mkdir(parents=True)
+    monkeypatch.setattr(uploads, 'UPLOAD_FOLDER', str(folder))
+    conn = sqlite3.connect(tmp_path / 'test.db')
+    conn.execute('CREATE TABLE products (id INTEGER PRIMARY KEY, wholesaler_id INTEGER, image_path TEXT)')
+    for statement in uploads.upload_statements():
+        conn.execute(statement)
+    conn.execute('INSERT INTO products (id, wholesaler_id) VALUES (1, 10)')
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def stored_files():
+    return [name for _, _, names in os.walk(uploads.UPLOAD_FOLDER) for name in names]
+
+
+@pytest.mark.parametrize('owner_id, product_id', [(11, 1), (10, 2)])
+def test_product_image_for_another_wholesalers_or_missing_product(conn, owner_id, product_id):
+    body = io.BytesIO(b'not really a png')
+    with pytest.raises(uploads.UploadError, match='Product not found'):
+        uploads.store(conn, 'product-image', owner_id, body, 'png', product_id)
+
+    assert body.tell() == 0
+    assert stored_files() == []
+    assert conn.execute('SELECT COUNT(*) FROM uploads').fetchone()[0] == 0
+
+
+def test_product_image_for_own_product(conn, monkeypatch):
+    monkeypatch.setattr(uploads, 'Image', None)
+    key, deduplicated = uploads.store(conn, 'product-image', 10, io.BytesIO(b'png bytes'), 'png', 1)
+
+    assert not deduplicated
+    assert stored_files() == [key]
+    assert conn.execute('SELECT image_path FROM products WHERE id = 1').fetchone()[0] == key
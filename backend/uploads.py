@@ -0,0 +1,303 @@
+"""
+Content-addressed store for wholesaler uploads.
+
+Request bodies are copied to a temporary file in READ_SIZE blocks while
+being hashed, so a 16MB photo never sits in memory. The file is then renamed
+to its SHA-256 (ab/<sha256>.jpg); uploading the same bytes again just drops
+the temporary copy. The key (<sha256>.<ext>) is what products.image_path and
+the wholesaler photo/document columns store, and one row per key in
+``uploads`` tracks its resized variants.
+
+Resizing runs on a small thread pool after the response has gone out. At
+most MAX_PENDING_RESIZES images are queued at once; anything that does not
+fit, or is left over from a restart, stays 'pending' and is picked up by the
+sweep job. Until a variant exists its URL serves the original, and since a
+key's bytes never change, originals and variants are cached as immutable.
+
+Identity and licence documents go to a separate private folder that no
+route serves. Resizing needs the optional Pillow package; without it images
+are stored and served at full size.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import send_file
+
+import db
+import jobs
+
+try:
+    from PIL import Image
+except ImportError:  # optional: no thumbnails without it
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_FOLDER = 'static/uploads'
+PRIVATE_UPLOAD_FOLDER = 'private_uploads'
+
+READ_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+DOCUMENT_EXTENSIONS = IMAGE_EXTENSIONS | {'pdf', 'doc', 'docx'}
+CONTENT_TYPE_EXTENSIONS = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/gif': 'gif',
+    'application/pdf': 'pdf',
+    'application/msword': 'doc',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 'docx',
+}
+
+# Longest edge in pixels; variants are always JPEG
+VARIANTS = {'thumb': 200, 'medium': 800}
+JPEG_QUALITY = 80
+
+RESIZE_WORKERS = 2
+MAX_PENDING_RESIZES = 32
+SWEEP_INTERVAL = 60
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+KEY_PATTERN = re.compile(r'^[0-9a-f]{64}\.[a-z]{2,4}$')
+
+# kind -> (UPDATE statement taking (key, owner id[, product id]), allowed
+# extensions, private)
+TARGETS = {
+    'product-image': ('UPDATE products SET image_path = ? WHERE wholesaler_id = ? AND id = ?',
+                      IMAGE_EXTENSIONS, False),
+    'profile-photo': ('UPDATE wholesalers SET profile_photo = ? WHERE id = ?',
+                      IMAGE_EXTENSIONS, False),
+    'id-doc': ('UPDATE wholesalers SET id_doc_path = ? WHERE id = ?',
+               DOCUMENT_EXTENSIONS, True),
+    'license-doc': ('UPDATE wholesalers SET license_doc_path = ? WHERE id = ?',
+                    DOCUMENT_EXTENSIONS, True),
+}
+
+
+def upload_statements():
+    """Migration steps for the uploads table."""
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS uploads (
+            key TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            variants TEXT NOT NULL DEFAULT 'none',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        ''',
+        # variants: 'pending' until resized, then 'ready' or 'failed';
+        # 'none' for documents and when Pillow is missing
+        '''
+        CREATE INDEX IF NOT EXISTS idx_uploads_pending
+        ON uploads (created_at) WHERE variants = 'pending'
+        ''',
+    ]
+
+
+class UploadError(Exception):
+    """An upload that cannot be stored, with a client-facing message."""
+
+
+def init_app(app):
+    global UPLOAD_FOLDER, PRIVATE_UPLOAD_FOLDER
+    UPLOAD_FOLDER = os.path.abspath(app.config.get('UPLOAD_FOLDER', UPLOAD_FOLDER))
+    PRIVATE_UPLOAD_FOLDER = os.path.abspath(
+        app.config.get('PRIVATE_UPLOAD_FOLDER', PRIVATE_UPLOAD_FOLDER))
+    for folder in (UPLOAD_FOLDER, PRIVATE_UPLOAD_FOLDER):
+        os.makedirs(os.path.join(folder, 'tmp'), exist_ok=True)
+
+
+def extension_for(filename, content_type):
+    """Lower-case extension from the filename, else from the content type."""
+    if filename and '.' in filename:
+        ext = filename.rsplit('.', 1)[1].lower()
+    else:
+        ext = CONTENT_TYPE_EXTENSIONS.get(content_type)
+    return 'jpg' if ext == 'jpeg' else ext
+
+
+def is_key(value):
+    return bool(value) and KEY_PATTERN.match(value) is not None
+
+
+def path_for(key, variant=None, private=False):
+    digest, ext = key.split('.')
+    name = f'{digest}-{variant}.jpg' if variant else key
+    return os.path.join(PRIVATE_UPLOAD_FOLDER if private else UPLOAD_FOLDER, digest[:2], name)
+
+
+def url_for_key(key, variant=None):
+    """Public URL for a stored image, or None for empty or legacy values."""
+    if not is_key(key):
+        return None
+    return f'/uploads/{variant}/{key}' if variant else f'/uploads/{key}'
+
+
+def _write_to_disk(stream, folder):
+    """Copy a stream to a temporary file; returns (sha256 hex, size, temp path)."""
+    sha = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.join(folder, 'tmp'))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for block in iter(lambda: stream.read(READ_SIZE), b''):
+                sha.update(block)
+                size += len(block)
+                f.write(block)
+    except BaseException:
+        # Includes the 413 raised once the body passes MAX_CONTENT_LENGTH
+        os.unlink(tmp_path)
+        raise
+    return sha.hexdigest(), size, tmp_path
+
+
+def store(conn, kind, owner_id, stream, ext, product_id=None):
+    """Save an upload and point the ``kind`` column at it.
+
+    Returns (key, deduplicated) where deduplicated is True if the same bytes
+    were already on disk.
+    """
+    statement, allowed, private = TARGETS[kind]
+    if ext not in allowed:
+        raise UploadError(f"File type must be one of: {', '.join(sorted(allowed))}")
+    # Checked before reading the body, so nothing is written for someone
+    # else's product
+    if product_id is not None and conn.execute(
+            'SELECT 1 FROM products WHERE id = ? AND wholesaler_id = ?',
+            (product_id, owner_id)).fetchone() is None:
+        raise UploadError('Product not found')
+
+    folder = PRIVATE_UPLOAD_FOLDER if private else UPLOAD_FOLDER
+    digest, size, tmp_path = _write_to_disk(stream, folder)
+    if size == 0:
+        os.unlink(tmp_path)
+        raise UploadError('Upload is empty')
+
+    key = f'{digest}.{ext}'
+    target = path_for(key, private=private)
+    deduplicated = os.path.exists(target)
+    if deduplicated:
+        os.unlink(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+
+    resize = not private and Image is not None and ext in IMAGE_EXTENSIONS
+    params = (key, owner_id, product_id) if product_id is not None else (key, owner_id)
+    created = 0
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        created = conn.execute('''
+            INSERT INTO uploads (key, size, variants) VALUES (?, ?, ?)
+            ON CONFLICT (key) DO NOTHING
+        ''', (key, size, 'pending' if resize else 'none')).rowcount
+        if conn.execute(statement, params).rowcount == 0:
+            raise UploadError('Product not found')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        # The product went away meanwhile; drop the file unless it was shared
+        if created and not deduplicated:
+            os.unlink(target)
+        raise
+
+    if created and resize:
+        schedule_resize(key)
+    return key, deduplicated
+
+
+def make_variants(key):
+    """Write every VARIANTS size of a stored image next to the original."""
+    with Image.open(path_for(key)) as original:
+        largest = max(VARIANTS.values())
+        # JPEG decoders can downscale while decoding, which is much cheaper
+        # than decoding full size and shrinking afterwards
+        original.draft('RGB', (largest, largest))
+        image = original.convert('RGB')
+    for variant, edge in sorted(VARIANTS.items(), key=lambda item: -item[1]):
+        image.thumbnail((edge, edge))
+        target = path_for(key, variant)
+        tmp = f'{target}.{os.getpid()}.tmp'
+        image.save(tmp, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        os.replace(tmp, target)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_PENDING_RESIZES)
+_in_flight = set()
+
+
+def _resize(key):
+    try:
+        try:
+            make_variants(key)
+            status = 'ready'
+        except Exception:
+            logger.exception('Could not resize upload %s', key)
+            status = 'failed'
+        with db.pool.connection() as conn:
+            conn.execute('UPDATE uploads SET variants = ? WHERE key = ?', (status, key))
+            conn.commit()
+    finally:
+        with _executor_lock:
+            _in_flight.discard(key)
+        _slots.release()
+
+
+def schedule_resize(key):
+    """Queue ``key`` for resizing; False if the queue is full or it is already queued."""
+    global _executor
+    if not _slots.acquire(blocking=False):
+        return False
+    with _executor_lock:
+        if key in _in_flight:
+            _slots.release()
+            return False
+        _in_flight.add(key)
+        # Created on first use so each pre-forked worker gets its own threads
+        if _executor is None:
+            _executor = ThreadPoolExecutor(RESIZE_WORKERS, thread_name_prefix='resize')
+    _executor.submit(_resize, key)
+    return True
+
+
+@jobs.every(SWEEP_INTERVAL, name='upload-variants')
+def scheduled_resize_sweep(conn):
+    if Image is None:
+        return
+    keys = conn.execute('''
+        SELECT key FROM uploads WHERE variants = 'pending'
+        ORDER BY created_at LIMIT ?
+    ''', (MAX_PENDING_RESIZES,)).fetchall()
+    for row in keys:
+        if not schedule_resize(row['key']):
+            break
+
+
+def send_upload(key, variant=None):
+    """Response for a public upload, or None if there is no such file.
+
+    A variant that has not been made yet falls back to the original without
+    the immutable header, so clients pick up the variant later.
+    """
+    if not is_key(key) or (variant is not None and variant not in VARIANTS):
+        return None
+    path = path_for(key, variant) if variant else path_for(key)
+    immutable = True
+    if variant and not os.path.exists(path):
+        path, immutable = path_for(key), False
+    if not os.path.exists(path):
+        return None
+
+    response = send_file(path, etag=os.path.basename(path), conditional=True)
+    if immutable:
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response